@@ -0,0 +1,79 @@
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from salon_mvp.metrics import BOOKING_ADMISSIONS
+from salons.models import Resource, Salon
+from . import travel
+from .models import Booking
+
+
+class SlotTaken(Exception):
+    pass
+
+
+def admit(salon, service, start, end, lat=None, lng=None):
+    """
+    Check that ``service`` can be booked at ``salon`` for [start, end) and
+    pick the resource (chair/staff) to put it on. lat/lng is the visit
+    address of a home service.
+
+    Must run inside transaction.atomic(). The salon row is locked first so
+    admissions at one salon are serialised; the check itself is a single
+    query (two at salons with home services, where the bookings around the
+    slot are first padded with travel time; see travel.py). Returns the
+    Resource, or None for salons without resources (which take one
+    booking at a time). Raises SlotTaken.
+
+    The lock stays a statement of its own: under READ COMMITTED a query
+    reads from the snapshot taken when it starts, so a check folded into
+    the locking SELECT would miss the booking committed by the admission
+    it waited for.
+    """
+    capacity, has_home_service = (
+        Salon.objects.select_for_update().filter(pk=salon.pk)
+        .values_list("capacity", "has_home_service").get()
+    )
+    if has_home_service:
+        overlapping = Booking.objects.filter(pk__in=travel.conflicting_ids(
+            salon, start, end, travel.location(salon, service, lat, lng)
+        ))
+    else:
+        overlapping = Booking.objects.filter(
+            salon=salon,
+            status__in=Booking.ACTIVE_STATUSES,
+            start_time__lt=end,
+            end_time__gt=start,
+        )
+
+    if not capacity:
+        if overlapping.exists():
+            BOOKING_ADMISSIONS.labels("overlap_rejected").inc()
+            raise SlotTaken("Time overlaps with another booking")
+        BOOKING_ADMISSIONS.labels("accepted").inc()
+        return None
+
+    # every eligible resource, whether it's busy, and (same value on every
+    # row) how many overlapping bookings predate resources and hold an
+    # unknown chair
+    unassigned = (
+        overlapping.filter(resource__isnull=True)
+        .order_by().values("salon").annotate(n=Count("pk")).values("n")
+    )
+    candidates = list(
+        Resource.objects.filter(salon=salon, is_active=True)
+        .filter(Q(services=service) | Q(services__isnull=True))
+        .annotate(
+            busy=Exists(overlapping.filter(resource=OuterRef("pk"))),
+            unassigned=Coalesce(Subquery(unassigned), 0),
+        )
+        .order_by("pk")
+    )
+    if not candidates:
+        BOOKING_ADMISSIONS.labels("no_resource").inc()
+        raise SlotTaken("No staff or chair at this salon offers this service")
+    free = [resource for resource in candidates if not resource.busy]
+    if len(free) <= candidates[0].unassigned:
+        BOOKING_ADMISSIONS.labels("overlap_rejected").inc()
+        raise SlotTaken("Time overlaps with another booking")
+    BOOKING_ADMISSIONS.labels("accepted").inc()
+    return free[0]
@@ -0,0 +1,148 @@
+"""
+Utilization analytics on flat NumPy arrays.
+
+Bookings come out of the database as three columns (start, end,
+service) and are never turned into model instances. Occupancy is built
+on a minute grid over the whole window with a difference array: +1 at
+every start, -1 at every end, then a cumulative sum. That gives the
+number of chairs in use for every minute. Minutes are then summed into
+hours and bincounted into hour-of-week cells.
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+from django.utils import timezone
+
+from .availability import DEFAULT_CLOSE, DEFAULT_OPEN
+
+MINUTES_PER_DAY = 24 * 60
+
+
+@lru_cache(maxsize=8)
+def _grid(days, first_weekday, open_minute, close_minute):
+    """
+    For a window: hour-of-week cell of every hour, the per-minute open
+    flag, and open minutes per cell. Cached - it depends only on the window
+    and opening hours, not on the bookings.
+    """
+    hour = np.arange(days * 24, dtype=np.int64)
+    cell = ((first_weekday + hour // 24) % 7) * 24 + hour % 24
+    minute_of_day = np.arange(days * MINUTES_PER_DAY, dtype=np.int64) % MINUTES_PER_DAY
+    is_open = (minute_of_day >= open_minute) & (minute_of_day < close_minute)
+    open_per_cell = np.bincount(
+        cell, weights=is_open.reshape(-1, 60).sum(axis=1), minlength=7 * 24
+    )
+    for array in (cell, is_open, open_per_cell):
+        array.flags.writeable = False
+    return cell, is_open, open_per_cell
+
+
+def utilization(starts, ends, services, days, first_weekday,
+                open_minute, close_minute, capacity=1, n_services=None):
+    """
+    starts/ends: int arrays of minutes since the window's first local
+    midnight (clipped to the window). services: int array of dense service
+    indexes. Returns numpy arrays:
+
+    occupied[7, 24]     booked chair-minutes per weekday/hour
+    available[7, 24]    open chair-minutes per weekday/hour
+    idle[7, 24]         open minutes with no chair in use
+    service_minutes[n]  booked minutes per service index
+    service_counts[n]   bookings per service index
+    """
+    total = days * MINUTES_PER_DAY
+    starts = np.clip(np.asarray(starts, dtype=np.int64), 0, total)
+    ends = np.clip(np.asarray(ends, dtype=np.int64), 0, total)
+    services = np.asarray(services, dtype=np.int64)
+
+    delta = np.bincount(starts, minlength=total + 1) - np.bincount(ends, minlength=total + 1)
+    in_use = np.cumsum(delta[:total])
+
+    # fold minutes into hours first, then hours into hour-of-week cells
+    cell, is_open, open_per_cell = _grid(days, first_weekday, open_minute, close_minute)
+    occupied = np.bincount(cell, weights=in_use.reshape(-1, 60).sum(axis=1), minlength=7 * 24)
+    idle_minutes = (is_open & (in_use == 0)).reshape(-1, 60).sum(axis=1)
+    idle = np.bincount(cell, weights=idle_minutes, minlength=7 * 24)
+
+    n_services = n_services or (int(services.max()) + 1 if services.size else 0)
+    service_minutes = np.bincount(services, weights=ends - starts, minlength=n_services)
+    service_counts = np.bincount(services, minlength=n_services)
+
+    return {
+        "occupied": occupied.reshape(7, 24),
+        "available": (open_per_cell * capacity).reshape(7, 24),
+        "idle": idle.reshape(7, 24),
+        "service_minutes": service_minutes,
+        "service_counts": service_counts,
+    }
+
+
+def to_window_minutes(values, window_start, days):
+    """
+    Aware datetimes -> int64 minutes since ``window_start`` (an aware local
+    midnight), on the local wall clock. The UTC offset is looked up once
+    per day rather than per booking, so only the hour around a DST change
+    can land in the neighbouring cell.
+    """
+    epoch = np.fromiter((value.timestamp() for value in values), dtype=np.float64, count=len(values))
+    base = window_start.timestamp()
+    day_offsets = np.array([
+        (window_start + timedelta(days=day)).utcoffset().total_seconds() -
+        window_start.utcoffset().total_seconds()
+        for day in range(days + 1)
+    ])
+    day_index = np.clip(((epoch - base) // 86400).astype(np.int64), 0, days)
+    return ((epoch - base + day_offsets[day_index]) // 60).astype(np.int64)
+
+
+def salon_utilization(salon, rows, services, first_day, days):
+    """
+    rows: values_list("start_time", "end_time", "service_id") for the
+    salon's bookings overlapping the window. services: [(id, name), ...].
+    Returns the JSON-ready report.
+    """
+    window_start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+    starts, ends, service_ids = zip(*rows) if rows else ((), (), ())
+    index = {service_id: i for i, (service_id, _) in enumerate(services)}
+
+    open_time = salon.open_time or DEFAULT_OPEN
+    close_time = salon.close_time or DEFAULT_CLOSE
+
+    result = utilization(
+        to_window_minutes(starts, window_start, days),
+        to_window_minutes(ends, window_start, days),
+        np.fromiter((index[s] for s in service_ids), dtype=np.int64, count=len(service_ids)),
+        days,
+        first_day.weekday(),
+        open_time.hour * 60 + open_time.minute,
+        close_time.hour * 60 + close_time.minute,
+        capacity=max(salon.capacity, 1),
+        n_services=len(services),
+    )
+
+    occupied, available = result["occupied"], result["available"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hourly = np.where(available > 0, occupied / available, 0.0)
+        weekday = np.where(
+            available.sum(axis=1) > 0, occupied.sum(axis=1) / available.sum(axis=1), 0.0
+        )
+    booked_total = result["service_minutes"].sum() or 1
+
+    return {
+        "capacity": max(salon.capacity, 1),
+        # rows are Monday..Sunday, columns are hours 0..23
+        "utilization": np.round(hourly, 3).tolist(),
+        "idle_minutes": result["idle"].astype(int).tolist(),
+        "weekday_utilization": np.round(weekday, 3).tolist(),
+        "services": [
+            {
+                "service_id": service_id,
+                "name": name,
+                "bookings": int(result["service_counts"][i]),
+                "booked_minutes": int(result["service_minutes"][i]),
+                "share": round(float(result["service_minutes"][i]) / booked_total, 3),
+            }
+            for i, (service_id, name) in enumerate(services)
+        ],
+    }
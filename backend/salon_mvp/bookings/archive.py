@@ -0,0 +1,96 @@
+"""
+Hot/cold tiers for booking history.
+
+Finished bookings (completed, cancelled, no-show) that ended before a
+cutoff are moved with their payments into ArchivedBooking and
+ArchivedPayment, so the hot tables - and every overlap check, list and
+admin page on them - only carry recent and upcoming rows. Moved rows
+keep their ids.
+
+``both_tiers`` unions the two for the few readers that need all of
+history (history, export, utilization).
+"""
+from django.db import connection, transaction
+from django.db.models import BooleanField, Value
+
+from payments.models import ArchivedPayment, Payment
+from .models import ArchivedBooking, Booking, WaitlistEntry
+
+ARCHIVABLE_STATUSES = ("completed", "cancelled", "no_show")
+
+
+def _columns(model, archived_model):
+    """Columns copied to the archive: those the cold model has too (not change_seq)."""
+    kept = {field.attname for field in archived_model._meta.concrete_fields}
+    return [field.attname for field in model._meta.concrete_fields if field.attname in kept]
+
+
+BOOKING_COLUMNS = _columns(Booking, ArchivedBooking)
+PAYMENT_COLUMNS = _columns(Payment, ArchivedPayment)
+
+
+def archive_batch(cutoff, batch_size=1000):
+    """
+    Move up to ``batch_size`` finished bookings that ended before
+    ``cutoff``, and their payments, to the archive in one transaction.
+    Returns (bookings moved, payments moved).
+
+    Rows are copied with bulk_create and removed with plain DELETEs: no
+    delete signals run, so no sync tombstones are written - the rows
+    still exist, just in the cold tier.
+    """
+    with transaction.atomic():
+        candidates = Booking.objects.filter(
+            status__in=ARCHIVABLE_STATUSES, end_time__lt=cutoff
+        ).order_by("pk")
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True, of=("self",))
+        ids = list(candidates.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return 0, 0
+
+        bookings = Booking.objects.filter(pk__in=ids)
+        payments = Payment.objects.filter(booking_id__in=ids)
+        ArchivedBooking.objects.bulk_create(
+            ArchivedBooking(**row) for row in bookings.values(*BOOKING_COLUMNS)
+        )
+        moved_payments = ArchivedPayment.objects.bulk_create(
+            ArchivedPayment(**row) for row in payments.values(*PAYMENT_COLUMNS)
+        )
+        # _raw_delete doesn't run on_delete handlers; do SET_NULL by hand
+        WaitlistEntry.objects.filter(booking_id__in=ids).update(booking=None)
+        payments._raw_delete(payments.db)
+        bookings._raw_delete(bookings.db)
+    return len(ids), len(moved_payments)
+
+
+def archive_bookings(cutoff, batch_size=1000):
+    """Archive everything eligible, batch by batch. Returns total counts."""
+    total_bookings = total_payments = 0
+    while True:
+        moved, moved_payments = archive_batch(cutoff, batch_size)
+        total_bookings += moved
+        total_payments += moved_payments
+        if moved < batch_size:
+            return total_bookings, total_payments
+
+
+def both_tiers(q, *fields, flat=False, **expressions):
+    """
+    Hot and archived bookings matching ``q`` as one UNION ALL query of
+    ``values(*fields, **expressions)`` dicts with an ``archived`` flag, or
+    of ``values_list(*fields)`` tuples when ``flat`` is set. Both models
+    have the same field names, so ``q``, ``fields`` and ``expressions``
+    (including payment__... lookups) apply to either.
+    """
+    if flat:
+        hot = Booking.objects.filter(q).order_by().values_list(*fields)
+        cold = ArchivedBooking.objects.filter(q).order_by().values_list(*fields)
+    else:
+        hot = Booking.objects.filter(q).order_by().values(
+            *fields, **expressions, archived=Value(False, output_field=BooleanField())
+        )
+        cold = ArchivedBooking.objects.filter(q).order_by().values(
+            *fields, **expressions, archived=Value(True, output_field=BooleanField())
+        )
+    return hot.union(cold, all=True)
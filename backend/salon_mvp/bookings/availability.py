@@ -0,0 +1,119 @@
+import heapq
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from salons.models import Resource
+from .models import Booking
+
+# used when a salon hasn't set its hours
+DEFAULT_OPEN = time(10, 0)
+DEFAULT_CLOSE = time(18, 0)
+
+
+def to_local(value):
+    """Aware DB datetime -> naive local time, the form slots are built in."""
+    return timezone.localtime(value).replace(tzinfo=None)
+
+
+def day_window(salon, date):
+    """Naive local (open, close) datetimes for ``salon`` on ``date``."""
+    return (
+        datetime.combine(date, salon.open_time or DEFAULT_OPEN),
+        datetime.combine(date, salon.close_time or DEFAULT_CLOSE),
+    )
+
+
+def day_bookings(salon, date):
+    """
+    Active bookings overlapping the salon's hours on ``date`` as naive
+    local (start, end, resource_id, pk) tuples sorted by start. One query.
+    """
+    open_dt, close_dt = day_window(salon, date)
+    rows = Booking.objects.filter(
+        salon=salon,
+        status__in=Booking.ACTIVE_STATUSES,
+        start_time__lt=timezone.make_aware(close_dt),
+        end_time__gt=timezone.make_aware(open_dt),
+    ).values_list("start_time", "end_time", "resource_id", "pk")
+    return sorted(
+        ((to_local(start), to_local(end), resource_id, pk)
+         for start, end, resource_id, pk in rows),
+        key=lambda row: row[0],
+    )
+
+
+def eligible_resource_ids(salon, service):
+    """
+    Ids of the salon's active resources that can do ``service`` (those
+    linked to it plus those linked to nothing), or None when the salon has
+    no resources and takes one booking at a time.
+    """
+    if not salon.capacity:
+        return None
+    return set(
+        Resource.objects.filter(salon=salon, is_active=True)
+        .filter(Q(services=service) | Q(services__isnull=True))
+        .values_list("pk", flat=True)
+    )
+
+
+def busy_for(bookings, eligible):
+    """
+    Turn day_bookings() rows into (start, end, key) intervals for one
+    service plus the capacity they compete for. Bookings on resources that
+    can't do the service don't matter; unassigned ones (made before the
+    salon had resources) each hold some chair.
+    """
+    if eligible is None:
+        return [(start, end, None) for start, end, _, _ in bookings], 1
+    busy = []
+    for start, end, resource_id, pk in bookings:
+        if resource_id is None:
+            busy.append((start, end, ("unassigned", pk)))
+        elif resource_id in eligible:
+            busy.append((start, end, resource_id))
+    return busy, len(eligible)
+
+
+def iter_slots(open_dt, close_dt, duration_minutes, busy, capacity=1):
+    """
+    Yield (start, end, available) for back-to-back slots between open and
+    close. ``busy`` is a start-sorted list of (start, end, key) where key
+    is the resource a booking holds.
+
+    Counting sweep: bookings are pushed onto a heap of end times as slots
+    reach them and popped once they've ended, while a per-key counter
+    tracks how many distinct resources are held during the slot. A slot is
+    free while that's below ``capacity``. O((slots + bookings) log bookings)
+    no matter how many resources the salon has.
+    """
+    length = timedelta(minutes=duration_minutes)
+    ends = []
+    in_use = {}
+    i = 0
+    current = open_dt
+    while current + length <= close_dt:
+        slot_end = current + length
+        while i < len(busy) and busy[i][0] < slot_end:
+            _, end, key = busy[i]
+            heapq.heappush(ends, (end, i, key))
+            in_use[key] = in_use.get(key, 0) + 1
+            i += 1
+        while ends and ends[0][0] <= current:
+            _, _, key = heapq.heappop(ends)
+            in_use[key] -= 1
+            if not in_use[key]:
+                del in_use[key]
+        yield current, slot_end, len(in_use) < capacity
+        current = slot_end
+
+
+def slot_list(open_dt, close_dt, duration_minutes, busy, capacity=1):
+    return [
+        {"start": start.isoformat(), "end": end.isoformat(), "available": available}
+        for start, end, available in iter_slots(
+            open_dt, close_dt, duration_minutes, busy, capacity
+        )
+    ]
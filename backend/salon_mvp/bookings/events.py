@@ -0,0 +1,282 @@
+"""
+Live slot events (slot_taken / slot_freed) per salon and day.
+
+Views publish through ``publish_slot_event``; the SSE view in
+``bookings.stream`` subscribes. The broker backend is chosen by
+BOOKING_EVENTS_BACKEND:
+
+- ``InProcessBackend`` fans out to subscribers in this process only
+  (one process, or development).
+- ``DatabaseBackend`` passes events through the SlotEvent table, so it
+  crosses processes on any database; gunicorn.conf.py picks it for the
+  forked workers.
+- ``PostgresNotifyBackend`` sends events through NOTIFY/LISTEN so every
+  process sees every event.
+
+Subscribers are asyncio queues under ASGI and blocking queues for a WSGI
+request thread (``blocking=True``).
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def channel_for(salon_id, day):
+    return f"salon:{salon_id}:{day.isoformat()}"
+
+
+class Subscription:
+    """One listener's queue, bound to the event loop that created it."""
+
+    def __init__(self, backend, channel, maxsize=100):
+        self.backend = backend
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def push(self, event):
+        # called from any thread
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # slow reader: drop the backlog, tell it to refetch availability
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class BlockingSubscription(Subscription):
+    """One listener's queue for a WSGI request thread; get() blocks it."""
+
+    def __init__(self, backend, channel, maxsize=100):
+        self.backend = backend
+        self.channel = channel
+        self.queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+
+    def push(self, event):
+        with self._lock:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait({"type": "resync"})
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError from None
+
+
+class InProcessBackend:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, blocking=False):
+        sub = (BlockingSubscription if blocking else Subscription)(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub.push(event)
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+
+class DatabaseBackend(InProcessBackend):
+    """
+    Publishes by inserting a SlotEvent row. While this process has
+    subscribers, one thread polls for new rows (from any process, this
+    one included) and feeds the local fan-out. Rows are read back for
+    ``lookback`` so one that commits out of id order isn't missed, and
+    deleted after ``retention``.
+    """
+
+    poll_interval = 0.5  # seconds
+    lookback = timedelta(seconds=10)
+    retention = timedelta(seconds=60)
+
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+        self._since = None
+        self._seen = {}  # SlotEvent id -> created_at, within the lookback
+
+    def subscribe(self, channel, blocking=False):
+        sub = super().subscribe(channel, blocking)
+        with self._lock:
+            if self._poller is None:
+                self._since = timezone.now()
+                self._poller = threading.Thread(
+                    target=self._poll_loop, name="booking-events", daemon=True
+                )
+                self._poller.start()
+        return sub
+
+    def publish(self, channel, event):
+        from .models import SlotEvent
+
+        row = SlotEvent.objects.create(channel=channel, event=event)
+        if row.pk % 100 == 0:
+            SlotEvent.objects.filter(created_at__lt=row.created_at - self.retention).delete()
+
+    def poll(self):
+        """Deliver the rows not seen yet; returns how many."""
+        from .models import SlotEvent
+
+        now = timezone.now()
+        rows = SlotEvent.objects.filter(
+            created_at__gte=max(self._since, now - self.lookback)
+        ).order_by("pk")
+        delivered = 0
+        for pk, channel, event, created_at in rows.values_list(
+            "pk", "channel", "event", "created_at"
+        ):
+            if pk not in self._seen:
+                self._seen[pk] = created_at
+                self.deliver(channel, event)
+                delivered += 1
+        for pk, created_at in list(self._seen.items()):
+            if created_at < now - self.lookback:
+                del self._seen[pk]
+        return delivered
+
+    def _poll_loop(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._poller = None
+                        return
+                try:
+                    self.poll()
+                except Exception:
+                    logger.exception("booking event poll failed")
+                time.sleep(self.poll_interval)
+        finally:
+            connection.close()
+
+
+class PostgresNotifyBackend(InProcessBackend):
+    """
+    Publishes with NOTIFY on the default connection and runs one LISTEN
+    thread per process that feeds the local fan-out.
+    """
+
+    pg_channel = "booking_slots"
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, channel, blocking=False):
+        self._ensure_listener()
+        return super().subscribe(channel, blocking)
+
+    def publish(self, channel, event):
+        message = json.dumps({"channel": channel, "event": event})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.pg_channel, message])
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name="booking-events", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        import select
+
+        import psycopg2
+
+        params = connection.get_connection_params()
+        while True:
+            try:
+                conn = psycopg2.connect(**params)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.pg_channel}")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        message = json.loads(conn.notifies.pop(0).payload)
+                        self.deliver(message["channel"], message["event"])
+            except Exception:
+                logger.exception("booking event listener failed, reconnecting")
+                threading.Event().wait(1)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.BOOKING_EVENTS_BACKEND)()
+
+
+def _local_iso(value):
+    return timezone.localtime(value).replace(tzinfo=None).isoformat()
+
+
+def publish_slot_event(kind, booking):
+    """
+    Announce that ``booking``'s interval was taken or freed, once the
+    surrounding transaction commits. ``booking`` is a Booking or a dict
+    with salon_id, service_id, start_time and end_time.
+    """
+    if not isinstance(booking, dict):
+        booking = {
+            "pk": booking.pk,
+            "salon_id": booking.salon_id,
+            "service_id": booking.service_id,
+            "start_time": booking.start_time,
+            "end_time": booking.end_time,
+        }
+    channel = channel_for(booking["salon_id"], timezone.localtime(booking["start_time"]).date())
+    event = {
+        "type": kind,
+        "booking_id": booking["pk"],
+        "service_id": booking["service_id"],
+        "start": _local_iso(booking["start_time"]),
+        "end": _local_iso(booking["end_time"]),
+    }
+    transaction.on_commit(lambda: get_broker().publish(channel, event), robust=True)
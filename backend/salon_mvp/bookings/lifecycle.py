@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from payments.models import Payment
+from salon_mvp.metrics import PAYMENT_TRANSITIONS
+from salons.cache import bump_salon_version
+from .events import publish_slot_event
+from .models import Booking, SyncSequence
+from .waitlist import queue_backfill
+
+
+# target status -> statuses a booking may move from
+TRANSITIONS = {
+    "confirmed": ("pending",),
+    "cancelled": ("pending", "confirmed"),
+    "completed": ("confirmed",),
+    "no_show": ("confirmed",),
+}
+
+# moves that give the booking's interval back to the salon
+FREES_SLOT = {"cancelled"}
+
+# what happens to a still-pending payment when its booking moves
+PAYMENT_EFFECTS = {
+    "cancelled": "failed",
+    "no_show": "failed",
+}
+
+
+def _apply_payment_effect(booking_ids, to_status):
+    payment_status = PAYMENT_EFFECTS.get(to_status)
+    if not payment_status or not booking_ids:
+        return
+    # .update() skips auto_now and save(), so stamp both ourselves
+    changed = Payment.objects.filter(booking_id__in=booking_ids, status="pending").update(
+        status=payment_status, updated_at=timezone.now(), change_seq=SyncSequence.take()
+    )
+    if changed:
+        PAYMENT_TRANSITIONS.labels("pending", payment_status).inc(changed)
+
+
+def transition(booking, to_status):
+    """
+    Move one booking to ``to_status`` with a single conditional UPDATE.
+
+    Returns False when the booking was no longer in an allowed source
+    status (someone else got there first), True otherwise.
+    """
+    sources = TRANSITIONS[to_status]
+    with transaction.atomic():
+        updated = Booking.objects.filter(pk=booking.pk, status__in=sources).update(
+            status=to_status, updated_at=timezone.now(), change_seq=SyncSequence.take()
+        )
+        if updated:
+            _apply_payment_effect([booking.pk], to_status)
+            if to_status in FREES_SLOT:
+                publish_slot_event("slot_freed", booking)
+                bump_salon_version(booking.salon_id)
+                queue_backfill(booking.salon_id, booking.start_time, booking.end_time)
+    if updated:
+        booking.status = to_status
+    return bool(updated)
+
+
+def bulk_transition(queryset, to_status, limit=None, skip_locked=False):
+    """
+    Move every booking in ``queryset`` that is eligible to ``to_status``.
+
+    Returns the ids that actually changed; rows in any other status are
+    left untouched. ``limit`` caps the batch and ``skip_locked`` lets
+    concurrent callers skip rows another transaction already holds (on
+    backends that support it).
+    """
+    sources = TRANSITIONS[to_status]
+    skip_locked = skip_locked and connection.features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        ids = (
+            queryset.filter(status__in=sources)
+            .select_for_update(skip_locked=skip_locked, of=("self",))
+            .values_list("pk", flat=True)
+        )
+        ids = list(ids[:limit] if limit else ids.order_by())
+        if not ids:
+            return []
+        Booking.objects.filter(pk__in=ids, status__in=sources).update(
+            status=to_status, updated_at=timezone.now(), change_seq=SyncSequence.take()
+        )
+        _apply_payment_effect(ids, to_status)
+        if to_status in FREES_SLOT:
+            # only future intervals matter to anyone watching availability
+            freed = Booking.objects.filter(pk__in=ids, end_time__gt=timezone.now()).values(
+                "pk", "salon_id", "service_id", "start_time", "end_time"
+            )
+            for row in freed:
+                publish_slot_event("slot_freed", row)
+                queue_backfill(row["salon_id"], row["start_time"], row["end_time"])
+            bump_salon_version(*{row["salon_id"] for row in freed})
+    return ids
+
+
+# past bookings still in these statuses are moved by the sweeper
+SWEEP_MOVES = (
+    ("confirmed", "completed"),
+    ("pending", "cancelled"),  # never confirmed, so it never happened
+)
+
+
+def sweep_past_bookings(now=None, grace=timedelta(0), batch_size=500):
+    """
+    Close out bookings whose end_time has passed, in short batches.
+
+    Each batch is its own transaction, so locks are held only for one
+    batch. Safe to run from several processes at once: rows locked by
+    another sweeper are skipped and every UPDATE is conditional on status.
+    Returns {to_status: count}.
+    """
+    cutoff = (now or timezone.now()) - grace
+    moved = {}
+    for from_status, to_status in SWEEP_MOVES:
+        queryset = Booking.objects.filter(
+            status=from_status, end_time__lt=cutoff
+        ).order_by("end_time")
+        count = 0
+        while True:
+            ids = bulk_transition(queryset, to_status, limit=batch_size, skip_locked=True)
+            count += len(ids)
+            if len(ids) < batch_size:
+                break
+        moved[to_status] = count
+    return moved
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookings.archive import archive_bookings
+
+
+class Command(BaseCommand):
+    help = "Move finished bookings (and their payments) older than a cutoff to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.BOOKING_ARCHIVE_AFTER_DAYS,
+            help="Archive completed/cancelled/no-show bookings that ended this many days ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        bookings, payments = archive_bookings(cutoff, options["batch_size"])
+        self.stdout.write(
+            f"archived {bookings} bookings and {payments} payments that ended before "
+            f"{cutoff:%Y-%m-%d %H:%M}"
+        )
@@ -0,0 +1,74 @@
+import random
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand
+
+from bookings.availability import busy_for, day_window, iter_slots
+from bookings.search import earliest_slots
+from salons.models import Salon, Service
+
+
+class Command(BaseCommand):
+    help = "Benchmark the earliest-slot merge over synthetic salons (no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--salons", type=int, default=5000)
+        parser.add_argument("--days", type=int, default=3, help="Length of the search window")
+        parser.add_argument("--per-day", type=int, default=8, help="Bookings per salon per day")
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        day = datetime(2030, 1, 7).date()
+        window_start = datetime.combine(day, dtime(9, 0))
+        window_end = datetime.combine(day + timedelta(days=options["days"] - 1), dtime(22, 0))
+
+        # unsaved instances with pks: the merge never touches the database
+        candidates, bookings = [], {}
+        for pk in range(1, options["salons"] + 1):
+            opens = rng.choice([8, 9, 10])
+            salon = Salon(pk=pk, name=f"Salon {pk}", capacity=0,
+                          open_time=dtime(opens, 0), close_time=dtime(opens + 9, 0))
+            service = Service(pk=pk, salon=salon, name="Haircut",
+                              duration_minutes=rng.choice([30, 45, 60]), price=10)
+            candidates.append(service)
+            # busy mornings: back-to-back bookings from opening, so first gaps vary
+            rows = []
+            for offset in range(options["days"]):
+                start = datetime.combine(day + timedelta(days=offset), salon.open_time)
+                for i in range(options["per_day"]):
+                    end = start + timedelta(minutes=rng.choice([30, 45, 60]))
+                    rows.append((start, end, None, len(rows)))
+                    start = end + timedelta(minutes=rng.choice([0, 0, 0, 30]))
+            bookings[pk] = rows
+
+        began = time.perf_counter()
+        found = earliest_slots(candidates, bookings, {}, window_start, window_end,
+                               options["limit"])
+        merged = time.perf_counter() - began
+
+        # baseline: full availability for every salon, then sort
+        began = time.perf_counter()
+        every = []
+        for service in candidates:
+            busy, capacity = busy_for(bookings[service.pk], None)
+            for offset in range(options["days"]):
+                open_dt, close_dt = day_window(service.salon, day + timedelta(days=offset))
+                every.extend(
+                    (start, service.pk)
+                    for start, _, available in iter_slots(
+                        open_dt, close_dt, service.duration_minutes, busy, capacity
+                    )
+                    if available and start >= window_start
+                )
+        every.sort()
+        full = time.perf_counter() - began
+
+        assert [s for s, _, _ in found] == [s for s, _ in every[:options["limit"]]]
+        self.stdout.write(
+            f"{options['salons']} salons, first {options['limit']} slots from "
+            f"{found[0][0]:%H:%M}: merge {merged * 1000:.1f}ms, "
+            f"full availability {full * 1000:.1f}ms"
+        )
@@ -0,0 +1,65 @@
+import time
+from datetime import datetime, time as dtime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from bookings.models import Booking
+from bookings.serializers import BookingSerializer
+from payments.models import Payment
+from salon_mvp.renderers import ORJSONRenderer, MessagePackRenderer, msgpack
+from salons.models import Salon, Service
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON/MessagePack rendering of a BookingSerializer list (no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=20)
+
+    def handle(self, *args, **options):
+        owner = User(pk=1, username="owner", email="owner@example.com", role="salon_owner")
+        start = timezone.make_aware(datetime(2030, 1, 7, 10, 0))
+        bookings = []
+        for i in range(options["bookings"]):
+            customer = User(pk=100 + i % 50, username=f"customer{i % 50}", role="customer")
+            salon = Salon(pk=1 + i % 20, owner=owner, name=f"Salon {i % 20}",
+                          address="12 Main Road", lat=Decimal("24.860734000000000"),
+                          lng=Decimal("67.001136000000000"),
+                          open_time=dtime(9), close_time=dtime(21), capacity=3)
+            service = Service(pk=1 + i % 60, salon=salon, name="Haircut",
+                              price=Decimal("1500.00"), duration_minutes=30)
+            booking = Booking(pk=i + 1, customer=customer, salon=salon, service=service,
+                              start_time=start + timedelta(minutes=30 * i),
+                              end_time=start + timedelta(minutes=30 * i + 30),
+                              status="confirmed", created_at=start, updated_at=start)
+            booking.payment = Payment(pk=i + 1, booking=booking, customer=customer,
+                                      salon_owner=owner, amount=Decimal("1500.00"),
+                                      created_at=start, updated_at=start)
+            bookings.append(booking)
+        data = BookingSerializer(bookings, many=True).data
+
+        renderers = [("DRF JSONRenderer", JSONRenderer()), ("ORJSONRenderer", ORJSONRenderer())]
+        if msgpack is not None:
+            renderers.append(("MessagePackRenderer", MessagePackRenderer()))
+
+        # wire-compatible: byte-for-byte the stock output
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+        timings = {}
+        for name, renderer in renderers:
+            began = time.perf_counter()
+            for _ in range(options["rounds"]):
+                body = renderer.render(data)
+            timings[name] = (time.perf_counter() - began) / options["rounds"]
+            self.stdout.write(
+                f"{name:20s} {timings[name] * 1000:7.2f}ms per render, {len(body):,} bytes"
+            )
+        self.stdout.write(
+            f"{options['bookings']} bookings: orjson is "
+            f"{timings['DRF JSONRenderer'] / timings['ORJSONRenderer']:.1f}x the stock renderer"
+        )
@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from bookings.analytics import utilization
+
+
+class Command(BaseCommand):
+    help = "Benchmark the utilization heatmap on synthetic bookings (no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--salons", type=int, default=1000)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--per-day", type=int, default=12, help="Bookings per salon per day")
+        parser.add_argument("--services", type=int, default=8)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        days, per_day = options["days"], options["per_day"]
+        open_minute, close_minute = 10 * 60, 18 * 60
+        n = days * per_day
+
+        # generate every salon's columns up front so only the analytics is timed
+        salons = []
+        for _ in range(options["salons"]):
+            day = np.repeat(np.arange(days), per_day)
+            starts = day * 1440 + rng.integers(open_minute, close_minute - 30, n)
+            ends = starts + rng.choice([30, 45, 60, 90], n)
+            salons.append((starts, ends, rng.integers(0, options["services"], n)))
+
+        began = time.perf_counter()
+        for starts, ends, services in salons:
+            utilization(
+                starts, ends, services, days, 0, open_minute, close_minute,
+                capacity=4, n_services=options["services"],
+            )
+        elapsed = time.perf_counter() - began
+
+        total = options["salons"] * n
+        self.stdout.write(
+            f"{options['salons']} salons x {days} days, {total:,} bookings: "
+            f"{elapsed:.2f}s total, {elapsed / options['salons'] * 1000:.2f}ms per salon, "
+            f"{total / elapsed:,.0f} bookings/s"
+        )
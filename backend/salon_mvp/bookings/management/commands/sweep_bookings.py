@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bookings.lifecycle import sweep_past_bookings
+from bookings.sync import purge_tombstones
+from bookings.waitlist import expire_entries
+from idempotency.decorators import purge_keys
+
+
+class Command(BaseCommand):
+    help = "Complete (or cancel) bookings whose end_time has passed and purge old sync tombstones and idempotency keys and expire waitlist entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            default=settings.BOOKING_SWEEP_GRACE_MINUTES,
+            help="Leave bookings alone this long after they end (owners may still mark no-shows).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running, sweeping every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        grace = timedelta(minutes=options["grace_minutes"])
+        while True:
+            moved = sweep_past_bookings(grace=grace, batch_size=options["batch_size"])
+            moved["tombstones purged"] = purge_tombstones()
+            moved["idempotency keys purged"] = purge_keys()
+            moved["waitlist entries expired"] = expire_entries()
+            self.stdout.write(
+                ", ".join(f"{name}: {count}" for name, count in moved.items())
+            )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_no_show_status'),
+        ('salons', '0004_alter_salon_lat_alter_salon_lng'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'end_time'], name='booking_status_end_idx'),
+        ),
+    ]
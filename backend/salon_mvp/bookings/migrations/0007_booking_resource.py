@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_booking_updated_at_tombstone'),
+        ('salons', '0005_salon_capacity_resource'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='resource',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='salons.resource'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['salon', 'start_time'], name='booking_salon_start_idx'),
+        ),
+    ]
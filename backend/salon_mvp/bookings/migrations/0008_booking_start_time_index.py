@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_resource'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='start_time',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
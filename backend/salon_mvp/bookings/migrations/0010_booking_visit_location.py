@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_archivedbooking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='lat',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='lng',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='lat',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='lng',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=18, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_booking_visit_location'),
+        ('salons', '0008_backfill_service_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('earliest_start', models.DateTimeField()),
+                ('latest_start', models.DateTimeField()),
+                ('lat', models.DecimalField(blank=True, decimal_places=15, max_digits=18, null=True)),
+                ('lng', models.DecimalField(blank=True, decimal_places=15, max_digits=18, null=True)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('booked', 'Booked'), ('expired', 'Expired'), ('withdrawn', 'Withdrawn')], default='waiting', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bookings.booking')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+                ('salon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='salons.salon')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='salons.service')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['salon', 'status', 'earliest_start'], name='waitlist_match_idx'), models.Index(fields=['status', 'latest_start'], name='waitlist_status_latest_idx'), models.Index(fields=['customer', 'status'], name='waitlist_customer_idx')],
+            },
+        ),
+    ]
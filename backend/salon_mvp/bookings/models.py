@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
-from salons.models import Salon, Service
+from salons.models import Resource, Salon, Service
 from datetime import timedelta
 
 
@@ -10,7 +11,10 @@ class Booking(models.Model):
         ("confirmed", "Confirmed"),
         ("cancelled", "Cancelled"),
         ("completed", "Completed"),
+        ("no_show", "No-show"),
     )
+    # statuses that still occupy their time slot
+    ACTIVE_STATUSES = ("pending", "confirmed")
 
     customer = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -23,13 +27,35 @@ class Booking(models.Model):
         related_name="bookings",
     )
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
-    start_time = models.DateTimeField()
+    # chair/staff assigned at booking time; null for salons without resources
+    resource = models.ForeignKey(
+        Resource,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="bookings",
+    )
+    start_time = models.DateTimeField(db_index=True)
     end_time = models.DateTimeField(blank=True, null=True)
+    # visit address of a home service; travel buffers are worked out from it
+    lat = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
+    lng = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped on every write (set it explicitly in .update() calls)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # SyncSequence number of the last write; drives the delta-sync
+    # endpoint (set change_seq=SyncSequence.take() in .update() calls)
+    change_seq = models.BigIntegerField(default=0, db_index=True)
 
     class Meta:
         ordering = ["-start_time"]
+        indexes = [
+            # overlap checks and day availability
+            models.Index(fields=["salon", "start_time"], name="booking_salon_start_idx"),
+            # sweeper: "confirmed bookings that ended before X"
+            models.Index(fields=["status", "end_time"], name="booking_status_end_idx"),
+        ]
 
     def __str__(self):
         return f"{self.service.name} @ {self.start_time}"
@@ -40,4 +66,168 @@ class Booking(models.Model):
             self.end_time = self.start_time + timedelta(
                 minutes=self.service.duration_minutes
             )
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            self.change_seq = SyncSequence.take()
+            super().save(*args, **kwargs)
+
+
+class WaitlistEntry(models.Model):
+    """
+    A customer waiting for any start between earliest_start and
+    latest_start for a service. When a booking at the salon is cancelled
+    the waiting entries whose window touches the freed interval are tried
+    oldest first and the first that fits is booked (bookings/waitlist.py).
+    """
+    STATUS_CHOICES = (
+        ("waiting", "Waiting"),
+        ("booked", "Booked"),
+        ("expired", "Expired"),
+        ("withdrawn", "Withdrawn"),
+    )
+
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="waitlist_entries",
+    )
+    salon = models.ForeignKey(Salon, on_delete=models.CASCADE, related_name="waitlist_entries")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="+")
+    earliest_start = models.DateTimeField()
+    latest_start = models.DateTimeField()
+    # visit address for home services
+    lat = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
+    lng = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="waiting")
+    # the booking it turned into; cleared when that booking is archived
+    booking = models.ForeignKey(
+        Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            # backfill: waiting entries at a salon whose window starts in a range
+            models.Index(
+                fields=["salon", "status", "earliest_start"], name="waitlist_match_idx"
+            ),
+            # expiry sweep and "my waitlist"
+            models.Index(fields=["status", "latest_start"], name="waitlist_status_latest_idx"),
+            models.Index(fields=["customer", "status"], name="waitlist_customer_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.customer} waiting for {self.service.name} ({self.status})"
+
+
+class SyncSequence(models.Model):
+    """
+    The one-row counter behind delta-sync cursors. take() increments it
+    in the caller's transaction, which keeps the row locked until that
+    transaction commits, so change numbers become visible in the order
+    their transactions commit: once a reader sees value N, every write
+    numbered N or less is visible too.
+    """
+    value = models.BigIntegerField(default=0)
+    # highest change_seq of a purged tombstone; older cursors must resync
+    purged_through = models.BigIntegerField(default=0)
+
+    @classmethod
+    def take(cls):
+        """The next change number; call inside the writing transaction."""
+        if not cls.objects.filter(pk=1).update(value=F("value") + 1):
+            # the row is seeded by a migration, but `flush` empties it
+            cls.objects.get_or_create(pk=1)
+            cls.objects.filter(pk=1).update(value=F("value") + 1)
+        return cls.objects.values_list("value", flat=True).get(pk=1)
+
+    @classmethod
+    def current(cls):
+        """(value, purged_through)"""
+        return cls.objects.filter(pk=1).values_list("value", "purged_through").first() or (0, 0)
+
+
+class Tombstone(models.Model):
+    """
+    Marker left behind when a Booking or Payment row is deleted, so sync
+    clients can drop it. Purged after SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    MODEL_CHOICES = (
+        ("booking", "Booking"),
+        ("payment", "Payment"),
+    )
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    # who may see it; plain ids because the rows they point at may be gone
+    customer_id = models.BigIntegerField(null=True)
+    salon_owner_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.change_seq = SyncSequence.take()
+            super().save(*args, **kwargs)
+
+
+class SlotEvent(models.Model):
+    """
+    A slot_taken / slot_freed event on its way to the SSE streams of other
+    processes (bookings.events.DatabaseBackend). Kept for about a minute.
+    """
+    channel = models.CharField(max_length=64)
+    event = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.event.get('type')} on {self.channel}"
+
+
+class ArchivedBooking(models.Model):
+    """
+    Cold copy of a finished Booking, moved out of the hot table by
+    ``manage.py archive_bookings``. Keeps the original id and timestamps;
+    read through the history and export endpoints only.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings",
+    )
+    salon = models.ForeignKey(
+        Salon,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings",
+    )
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="+")
+    resource = models.ForeignKey(
+        Resource,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField(blank=True, null=True)
+    lat = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
+    lng = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-start_time"]
+        indexes = [
+            models.Index(fields=["salon", "start_time"], name="archived_salon_start_idx"),
+            models.Index(fields=["customer", "start_time"], name="archived_customer_start_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.id} @ {self.start_time}"
@@ -0,0 +1,184 @@
+"""
+Earliest free slot for a service across many salons.
+
+All candidate salons' bookings for the window come back in one query
+and are grouped per salon. Each candidate then gets a lazy generator of
+its slots in time order (the same counting sweep as availability) and a
+heap merges them, so slots are examined in global time order and the
+search stops at the Nth free one. No salon is swept past that point, so
+the cost follows how far into the window the answer is, not the full
+availability of every salon.
+"""
+import heapq
+import math
+from datetime import timedelta
+
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from salons.geo import bounding_box, haversine_km
+from salons.models import Resource, Service
+from .availability import DEFAULT_OPEN, busy_for, day_window, iter_slots, to_local
+from .models import Booking
+
+MAX_CANDIDATES = 5000
+
+
+def window_slots(salon, service, busy, capacity, window_start, window_end):
+    """Yield (start, end, available) for one salon/service inside the window."""
+    day = window_start.date()
+    while day <= window_end.date():
+        open_dt, close_dt = day_window(salon, day)
+        for start, end, available in iter_slots(
+            open_dt, close_dt, service.duration_minutes, busy, capacity
+        ):
+            if end > window_end:
+                break
+            if start >= window_start:
+                yield start, end, available
+        day += timedelta(days=1)
+
+
+def earliest_slots(candidates, bookings, eligible, window_start, window_end, limit):
+    """
+    candidates: Service instances with .salon loaded.
+    bookings: {salon_id: start-sorted [(start, end, resource_id, pk)]}.
+    eligible: {service_id: set of resource ids} for salons with capacity.
+    Returns up to ``limit`` (start, end, service) tuples in time order.
+
+    K-way merge over the per-candidate slot streams. Candidates join the
+    heap only once the merge reaches the earliest time they could open a
+    slot, so a salon that opens after the answer is found is never swept.
+    """
+    def stream(service):
+        salon = service.salon
+        busy, capacity = busy_for(
+            bookings.get(salon.pk, ()),
+            eligible.get(service.pk, set()) if salon.capacity else None,
+        )
+        return window_slots(salon, service, busy, capacity, window_start, window_end)
+
+    # (lower bound on first slot, index, service); index breaks ties
+    waiting = sorted(
+        (max(window_start, day_window(service.salon, window_start.date())[0]), index, service)
+        for index, service in enumerate(candidates)
+    )
+    heap, found, j = [], [], 0
+    while len(found) < limit:
+        while j < len(waiting) and (not heap or waiting[j][0] <= heap[0][0]):
+            _, index, service = waiting[j]
+            j += 1
+            slots = stream(service)
+            slot = next(slots, None)
+            if slot is not None:
+                heapq.heappush(heap, (slot[0], index, slot, slots, service))
+        if not heap:
+            break
+        _, index, (start, end, available), slots, service = heap[0]
+        if available:
+            found.append((start, end, service))
+        slot = next(slots, None)
+        if slot is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (slot[0], index, slot, slots, service))
+    return found
+
+
+def by_search_key(services, lat=None, lng=None):
+    """
+    Order candidate services so that cutting at MAX_CANDIDATES keeps the
+    ones the search would rank first: nearest salons when searching around
+    a point (squared equirectangular distance, which orders like the
+    haversine distance at search radii), otherwise salons that open
+    earliest - the merge's own lower bound on a candidate's first slot.
+    """
+    if lat is not None and lng is not None:
+        scale = math.cos(math.radians(lat))
+        d_lat = Cast("salon__lat", FloatField()) - Value(lat)
+        d_lng = (Cast("salon__lng", FloatField()) - Value(lng)) * Value(scale)
+        return services.alias(distance=d_lat * d_lat + d_lng * d_lng).order_by("distance", "pk")
+    return services.alias(
+        opens=Coalesce("salon__open_time", Value(DEFAULT_OPEN))
+    ).order_by("opens", "pk")
+
+
+def find_earliest(name, window_start, window_end, limit=10,
+                  lat=None, lng=None, radius_km=5.0, area=None):
+    """
+    Search entry point: naive local window; returns a JSON-ready list.
+    At most three queries whatever the number of candidates: services
+    (with salons), resources of salons that have any, and every
+    candidate's bookings.
+    """
+    services = Service.objects.select_related("salon").filter(name__icontains=name)
+    if area:
+        services = services.filter(salon__address__icontains=area)
+    if lat is not None and lng is not None:
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        services = services.filter(
+            salon__lat__range=(min_lat, max_lat), salon__lng__range=(min_lng, max_lng)
+        )
+    candidates = list(by_search_key(services, lat, lng)[:MAX_CANDIDATES])
+
+    distances = {}
+    if lat is not None and lng is not None and candidates:
+        km = haversine_km(
+            lat, lng,
+            [float(s.salon.lat) for s in candidates],
+            [float(s.salon.lng) for s in candidates],
+        )
+        distances = {s.pk: float(d) for s, d in zip(candidates, km)}
+        # nearer salons win ties on start time
+        candidates = sorted(
+            (s for s in candidates if distances[s.pk] <= radius_km), key=lambda s: distances[s.pk]
+        )
+    if not candidates:
+        return []
+
+    salon_ids = {s.salon_id for s in candidates}
+    eligible = {}
+    with_capacity = {s.salon_id for s in candidates if s.salon.capacity}
+    if with_capacity:
+        rows = Resource.objects.filter(salon_id__in=with_capacity, is_active=True).values_list(
+            "salon_id", "pk", "services"
+        )
+        by_salon = {}
+        for salon_id, resource_id, linked in rows:
+            by_salon.setdefault(salon_id, {}).setdefault(resource_id, set())
+            if linked is not None:
+                by_salon[salon_id][resource_id].add(linked)
+        for s in candidates:
+            resources = by_salon.get(s.salon_id, {})
+            eligible[s.pk] = {
+                rid for rid, linked in resources.items() if not linked or s.pk in linked
+            }
+
+    bookings = {}
+    rows = Booking.objects.filter(
+        salon_id__in=salon_ids,
+        status__in=Booking.ACTIVE_STATUSES,
+        start_time__lt=timezone.make_aware(window_end),
+        end_time__gt=timezone.make_aware(window_start),
+    ).values_list("salon_id", "start_time", "end_time", "resource_id", "pk")
+    for salon_id, start, end, resource_id, pk in rows:
+        bookings.setdefault(salon_id, []).append((to_local(start), to_local(end), resource_id, pk))
+    for rows in bookings.values():
+        rows.sort(key=lambda row: row[0])
+
+    return [
+        {
+            "salon_id": service.salon_id,
+            "salon_name": service.salon.name,
+            "service_id": service.pk,
+            "service_name": service.name,
+            "price": str(service.price),
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "distance_km": round(distances[service.pk], 2) if distances else None,
+        }
+        for start, end, service in earliest_slots(
+            candidates, bookings, eligible, window_start, window_end, limit
+        )
+    ]
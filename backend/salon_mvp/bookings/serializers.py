@@ -1,10 +1,20 @@
 from rest_framework import serializers
-from .models import Booking
+from .models import Booking, WaitlistEntry
 from payments.serializers import PaymentSerializer
+from salons.geo import valid_point
 from salons.serializers import ServiceSerializer, SalonSerializer
 from users.serializers import UserRegisterSerializer
 
 
+def validate_point(attrs):
+    """A visit address is both lat and lng, on the globe."""
+    lat, lng = attrs.get("lat"), attrs.get("lng")
+    if (lat is None) != (lng is None):
+        raise serializers.ValidationError("lat and lng go together")
+    if lat is not None and not valid_point(float(lat), float(lng)):
+        raise serializers.ValidationError("lat must be between -90 and 90 and lng between -180 and 180")
+
+
 class BookingSerializer(serializers.ModelSerializer):
     customer = UserRegisterSerializer(read_only=True)
     service = ServiceSerializer(read_only=True)
@@ -24,17 +34,80 @@ class BookingSerializer(serializers.ModelSerializer):
             "salon",
             "service_id",
             "salon_id",
+            "resource",
             "start_time",
             "end_time",
+            "lat",
+            "lng",
             "status",
             "created_at",
+            "updated_at",
             "payment",
         ]
         read_only_fields = (
             "id",
             "customer",
+            "resource",
             "end_time",
             "status",
             "created_at",
+            "updated_at",
             "payment",
         )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # admission checked travel from this address; it can't move later
+            for name in ("lat", "lng"):
+                fields[name].read_only = True
+        return fields
+
+    def validate(self, attrs):
+        validate_point(attrs)
+        return attrs
+
+
+class BulkCancelSerializer(serializers.Serializer):
+    """{"ids": [...]} or {"salon_id": ..., "date": "YYYY-MM-DD"}."""
+    LIMIT = 500
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=LIMIT
+    )
+    salon_id = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False, input_formats=["%Y-%m-%d"])
+
+    def validate(self, attrs):
+        if not attrs.get("ids") and not (attrs.get("salon_id") and attrs.get("date")):
+            raise serializers.ValidationError("Provide ids, or salon_id and date")
+        return attrs
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    service_id = serializers.IntegerField(write_only=True, required=True)
+    salon_id = serializers.IntegerField(write_only=True, required=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = [
+            "id",
+            "salon",
+            "service",
+            "salon_id",
+            "service_id",
+            "earliest_start",
+            "latest_start",
+            "lat",
+            "lng",
+            "status",
+            "booking",
+            "created_at",
+        ]
+        read_only_fields = ("id", "salon", "service", "status", "booking", "created_at")
+
+    def validate(self, attrs):
+        if attrs["latest_start"] < attrs["earliest_start"]:
+            raise serializers.ValidationError("latest_start must not be before earliest_start")
+        validate_point(attrs)
+        return attrs
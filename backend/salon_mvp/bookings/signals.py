@@ -0,0 +1,45 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from payments.models import Payment
+from salons.cache import bump_salon_version
+from salons.models import Resource, Salon
+from .models import Booking, SyncSequence, Tombstone
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    bump_salon_version(instance.salon_id)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_tombstone(sender, instance, **kwargs):
+    owner_id = (
+        Salon.objects.filter(pk=instance.salon_id).values_list("owner_id", flat=True).first()
+    )
+    Tombstone.objects.create(
+        model="booking",
+        object_id=instance.pk,
+        customer_id=instance.customer_id,
+        salon_owner_id=owner_id,
+    )
+
+
+@receiver(post_delete, sender=Payment)
+def payment_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        model="payment",
+        object_id=instance.pk,
+        customer_id=instance.customer_id,
+        salon_owner_id=instance.salon_owner_id,
+    )
+
+
+@receiver(pre_delete, sender=Resource)
+def resource_unassigned(sender, instance, **kwargs):
+    # on_delete=SET_NULL writes Booking.resource without save(); stamp
+    # the bookings it is about to touch so sync clients see the change
+    Booking.objects.filter(resource=instance).update(
+        updated_at=timezone.now(), change_seq=SyncSequence.take()
+    )
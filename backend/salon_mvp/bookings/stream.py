@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .events import channel_for, get_broker
+
+KEEPALIVE_SECONDS = 15
+
+
+def _token_from(request):
+    # EventSource can't send headers, so the token may come in the query
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return header[len("Bearer "):]
+    return request.GET.get("token")
+
+
+def _format(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _events(channel):
+    sub = get_broker().subscribe(channel)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await sub.get(KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield _format(event)
+    finally:
+        sub.close()
+
+
+def _blocking_events(channel):
+    # ends after BOOKING_STREAM_MAX_SECONDS to give the thread back;
+    # EventSource reconnects on its own
+    sub = get_broker().subscribe(channel, blocking=True)
+    deadline = time.monotonic() + settings.BOOKING_STREAM_MAX_SECONDS
+    try:
+        yield "retry: 3000\n\n"
+        while (left := deadline - time.monotonic()) > 0:
+            try:
+                event = sub.get(min(KEEPALIVE_SECONDS, left))
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield _format(event)
+    finally:
+        sub.close()
+
+
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+
+class _ThreadStream:
+    """
+    A WSGI stream holding one of this process's BOOKING_STREAM_MAX_THREADS
+    places until the server closes it, whether or not it was iterated.
+    """
+
+    def __init__(self, channel):
+        self._events = _blocking_events(channel)
+        self._open = True
+
+    @classmethod
+    def open(cls, channel):
+        global _open_streams
+        with _open_streams_lock:
+            if _open_streams >= settings.BOOKING_STREAM_MAX_THREADS:
+                return None
+            _open_streams += 1
+        return cls(channel)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def close(self):
+        global _open_streams
+        self._events.close()
+        with _open_streams_lock:
+            if self._open:
+                self._open = False
+                _open_streams -= 1
+
+
+def slot_stream(request, salon_id):
+    """
+    GET /api/bookings/stream/<salon_id>/?date=YYYY-MM-DD&token=<access>
+
+    Server-Sent Events: slot_taken / slot_freed for that salon and day.
+    Under ASGI (salon_mvp.asgi) each open stream is a parked coroutine.
+    Under WSGI (the gunicorn launcher) it holds a worker thread, so each
+    process serves at most BOOKING_STREAM_MAX_THREADS at a time, answers
+    503 beyond that (clients poll availability instead) and ends each
+    stream after BOOKING_STREAM_MAX_SECONDS. With several processes,
+    BOOKING_EVENTS_BACKEND must cross them (DatabaseBackend or
+    PostgresNotifyBackend).
+    """
+    raw = _token_from(request)
+    if not raw:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    try:
+        JWTAuthentication().get_validated_token(raw)
+    except (InvalidToken, TokenError):
+        return JsonResponse({"detail": "Invalid token"}, status=401)
+
+    try:
+        date = datetime.strptime(request.GET.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse({"detail": "Invalid date format"}, status=400)
+
+    channel = channel_for(salon_id, date)
+    if isinstance(request, ASGIRequest):
+        events = _events(channel)
+    else:
+        events = _ThreadStream.open(channel)
+        if events is None:
+            response = JsonResponse(
+                {"detail": "Too many live streams; poll availability instead."},
+                status=503,
+            )
+            response["Retry-After"] = "30"
+            return response
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let proxies buffer the stream
+    return response
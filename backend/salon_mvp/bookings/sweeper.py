@@ -0,0 +1,55 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .lifecycle import sweep_past_bookings
+from .sync import purge_tombstones
+from .waitlist import expire_entries
+from idempotency.decorators import purge_keys
+from payments.gateway import expire_processing
+
+logger = logging.getLogger(__name__)
+
+_thread = None
+_lock = threading.Lock()
+
+
+def _run(interval, grace):
+    stop = threading.Event()
+    while not stop.wait(interval):
+        close_old_connections()
+        try:
+            moved = sweep_past_bookings(grace=grace)
+            moved["tombstones purged"] = purge_tombstones()
+            moved["idempotency keys purged"] = purge_keys()
+            moved["waitlist entries expired"] = expire_entries()
+            moved["card payments expired"] = expire_processing()
+            logger.info("booking sweep: %s", moved)
+        except Exception:
+            logger.exception("booking sweep failed")
+        finally:
+            close_old_connections()
+
+
+def start_sweeper():
+    """
+    Start the in-process sweeper thread if BOOKING_SWEEPER_INTERVAL is set.
+
+    Called from the WSGI/ASGI entry points so management commands never
+    spawn it. Running it in every worker is fine; see sweep_past_bookings.
+    """
+    global _thread
+    interval = settings.BOOKING_SWEEPER_INTERVAL
+    if not interval:
+        return None
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            grace = timedelta(minutes=settings.BOOKING_SWEEP_GRACE_MINUTES)
+            _thread = threading.Thread(
+                target=_run, args=(interval, grace), name="booking-sweeper", daemon=True
+            )
+            _thread.start()
+    return _thread
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import SyncSequence, Tombstone
+
+
+def encode_cursor(change_seq):
+    return str(change_seq)
+
+
+def decode_cursor(raw):
+    """Returns the change number, or None if ``raw`` isn't a cursor."""
+    try:
+        change_seq = int(raw)
+    except (TypeError, ValueError):
+        return None
+    return change_seq if change_seq >= 0 else None
+
+
+def tombstone_horizon():
+    """Tombstones older than this are purged."""
+    return timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def purge_tombstones():
+    """
+    Delete old tombstones and remember the newest change number purged:
+    cursors before it may have missed a deletion and must resync.
+    """
+    old = Tombstone.objects.filter(deleted_at__lt=tombstone_horizon())
+    with transaction.atomic():
+        through = old.aggregate(through=Max("change_seq"))["through"]
+        if through is None:
+            return 0
+        SyncSequence.objects.filter(pk=1).update(
+            purged_through=Greatest("purged_through", through)
+        )
+        deleted, _ = old.filter(change_seq__lte=through).delete()
+    return deleted
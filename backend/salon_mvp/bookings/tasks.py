@@ -0,0 +1,10 @@
+from jobs.queue import task
+from .waitlist import backfill, merge_intervals
+
+
+@task("bookings.backfill_waitlist", batch=True)
+def backfill_waitlist(payloads):
+    """Offer freed intervals to waiting customers; overlapping ones are tried once."""
+    for salon_id, intervals in merge_intervals(payloads).items():
+        for start, end in intervals:
+            backfill(salon_id, start, end)
@@ -1,3 +1,757 @@
-from django.test import TestCase
+import json
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from payments.models import ArchivedPayment, Payment
+from salons import catalog
+from salons.models import Resource, Salon, Service
+from users.models import User
+from .admission import SlotTaken, admit
+from .archive import archive_batch
+from .analytics import utilization
+from .events import DatabaseBackend
+from .lifecycle import bulk_transition, transition
+from .models import ArchivedBooking, Booking, SyncSequence, Tombstone, WaitlistEntry
+from . import search
+from .search import find_earliest
+from .sync import encode_cursor, purge_tombstones
+from .views import BookingViewSet
+from .waitlist import backfill
+
+
+def local(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+class BookingTestCase(TestCase):
+    """An owner, a customer and a 10:00-18:00 salon with one 30-minute service."""
+
+    def setUp(self):
+        cache.clear()
+        catalog.clear()  # its version stamps outlive the cache for a few seconds
+        self.owner = User.objects.create_user("owner", password="x", role="salon_owner")
+        self.customer = User.objects.create_user("customer", password="x", role="customer")
+        self.salon = Salon.objects.create(
+            owner=self.owner, name="Salon", open_time=time(10), close_time=time(18)
+        )
+        self.service = Service.objects.create(
+            salon=self.salon, name="Cut", duration_minutes=30, price="10.00"
+        )
+        self.day = timezone.localdate() + timedelta(days=7)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def make_booking(self, hour, minute=0, status="confirmed", service=None, **fields):
+        service = service or self.service
+        start = local(self.day, hour, minute)
+        return Booking.objects.create(
+            customer=self.customer, salon=self.salon, service=service, start_time=start,
+            end_time=start + timedelta(minutes=service.duration_minutes), status=status,
+            **fields,
+        )
+
+    def make_payment(self, booking, status="pending"):
+        return Payment.objects.create(
+            booking=booking, customer=self.customer, salon_owner=self.owner,
+            amount="10.00", status=status,
+        )
+
+
+class TransitionTests(BookingTestCase):
+    def test_cancel_fails_pending_payment(self):
+        booking = self.make_booking(10)
+        payment = self.make_payment(booking)
+
+        self.assertTrue(transition(booking, "cancelled"))
+
+        self.assertEqual(booking.status, "cancelled")
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "failed")
+
+    def test_completed_payment_is_left_alone(self):
+        booking = self.make_booking(10)
+        payment = self.make_payment(booking, status="completed")
+
+        self.assertTrue(transition(booking, "no_show"))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "completed")
+
+    def test_complete_keeps_payment_pending(self):
+        booking = self.make_booking(10)
+        payment = self.make_payment(booking)
+
+        self.assertTrue(transition(booking, "completed"))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "pending")
+
+    def test_stale_source_status_loses(self):
+        booking = self.make_booking(10)
+        stale = Booking.objects.get(pk=booking.pk)
+        self.assertTrue(transition(booking, "cancelled"))
+
+        self.assertFalse(transition(stale, "completed"))
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, "cancelled")
+
+    def test_bulk_transition_moves_only_eligible_rows(self):
+        confirmed = self.make_booking(10)
+        pending = self.make_booking(11, status="pending")
+        completed = self.make_booking(12, status="completed")
+        payments = [self.make_payment(b) for b in (confirmed, pending, completed)]
+
+        moved = bulk_transition(Booking.objects.all(), "cancelled")
+
+        self.assertCountEqual(moved, [confirmed.pk, pending.pk])
+        statuses = dict(Payment.objects.values_list("booking_id", "status"))
+        self.assertEqual(statuses[confirmed.pk], "failed")
+        self.assertEqual(statuses[pending.pk], "failed")
+        self.assertEqual(statuses[completed.pk], "pending")
+        self.assertEqual(len(payments), Payment.objects.count())
+
+    def test_bulk_transition_limit(self):
+        for hour in (10, 11, 12):
+            self.make_booking(hour)
+        self.assertEqual(len(bulk_transition(Booking.objects.all(), "cancelled", limit=2)), 2)
+        self.assertEqual(Booking.objects.filter(status="confirmed").count(), 1)
+
+
+class AdmitTests(BookingTestCase):
+    def admit(self, hour, minute=0, service=None):
+        service = service or self.service
+        start = local(self.day, hour, minute)
+        return admit(self.salon, service, start, start + timedelta(minutes=service.duration_minutes))
+
+    def test_without_resources_one_booking_at_a_time(self):
+        self.make_booking(10)
+        with self.assertRaises(SlotTaken):
+            self.admit(10, 15)
+        self.assertIsNone(self.admit(10, 30))
+
+    def test_fills_each_chair_then_refuses(self):
+        chairs = [Resource.objects.create(salon=self.salon, name=f"Chair {n}") for n in (1, 2)]
+        first = self.admit(10)
+        self.make_booking(10, resource=first)
+        second = self.admit(10)
+        self.make_booking(10, resource=second)
+
+        self.assertEqual({first, second}, set(chairs))
+        with self.assertRaises(SlotTaken):
+            self.admit(10, 15)
+
+    def test_cancelled_bookings_free_their_chair(self):
+        chair = Resource.objects.create(salon=self.salon, name="Chair")
+        self.make_booking(10, resource=chair, status="cancelled")
+        self.assertEqual(self.admit(10), chair)
+
+    def test_only_qualified_resources(self):
+        colour = Service.objects.create(salon=self.salon, name="Colour", price="30.00")
+        stylist = Resource.objects.create(salon=self.salon, name="Stylist", kind="staff")
+        stylist.services.add(colour)
+        with self.assertRaises(SlotTaken):
+            self.admit(10)
+        self.assertEqual(self.admit(10, service=colour), stylist)
+
+    def test_bookings_without_a_chair_count_against_capacity(self):
+        self.make_booking(10)  # made before the salon had resources
+        Resource.objects.create(salon=self.salon, name="Chair")
+        with self.assertRaises(SlotTaken):
+            self.admit(10)
+
+    def test_lock_and_one_check(self):
+        self.make_booking(10)
+        with self.assertNumQueries(2):
+            self.assertIsNone(self.admit(11))
+        Resource.objects.create(salon=self.salon, name="Chair")
+        with self.assertNumQueries(2):
+            with self.assertRaises(SlotTaken):
+                self.admit(10)
+
+
+@override_settings(
+    HOME_SERVICE_SPEED_KMH=30, HOME_SERVICE_BUFFER_MINUTES=10, HOME_SERVICE_MAX_TRAVEL_MINUTES=120
+)
+class TravelTests(BookingTestCase):
+    # about 11.1 km apart: 23 minutes at 30 km/h, plus the 10 minute buffer
+    HOME = ("24.900000", "67.000000")
+    FAR = ("25.000000", "67.000000")
+
+    def setUp(self):
+        super().setUp()
+        Salon.objects.filter(pk=self.salon.pk).update(lat="24.900000", lng="67.100000")
+        self.salon.refresh_from_db()
+        self.home = Service.objects.create(
+            salon=self.salon, name="Home cut", duration_minutes=30, price="20.00",
+            is_home_service=True,
+        )
+        self.salon.refresh_from_db()
+
+    def admit_home(self, hour, minute, point):
+        start = local(self.day, hour, minute)
+        return admit(self.salon, self.home, start, start + timedelta(minutes=30), *point)
+
+    def test_next_visit_leaves_time_to_get_there(self):
+        self.assertTrue(self.salon.has_home_service)
+        self.make_booking(10, service=self.home, lat=self.HOME[0], lng=self.HOME[1])
+
+        with self.assertRaises(SlotTaken):
+            self.admit_home(10, 45, self.FAR)  # 15 minutes after, 33 needed
+        self.assertIsNone(self.admit_home(11, 5, self.FAR))
+
+    def test_travel_costs_one_more_query(self):
+        self.make_booking(10, service=self.home, lat=self.HOME[0], lng=self.HOME[1])
+        Resource.objects.create(salon=self.salon, name="Van")
+        with self.assertNumQueries(3):  # lock, bookings around the slot, check
+            self.assertIsNotNone(self.admit_home(11, 5, self.FAR))
+
+    def test_same_address_only_needs_the_buffer(self):
+        self.make_booking(10, service=self.home, lat=self.HOME[0], lng=self.HOME[1])
+        with self.assertRaises(SlotTaken):
+            self.admit_home(10, 35, self.HOME)
+        self.assertIsNone(self.admit_home(10, 40, self.HOME))
+
+    def test_in_salon_bookings_are_not_padded_against_each_other(self):
+        self.make_booking(10)
+        start = local(self.day, 10, 30)
+        self.assertIsNone(admit(self.salon, self.service, start, start + timedelta(minutes=30)))
+
+    def test_visit_address_is_validated_and_fixed(self):
+        client = self.client_for(self.customer)
+        body = {
+            "salon_id": self.salon.pk, "service_id": self.home.pk,
+            "start_time": f"{self.day.isoformat()}T10:00:00",
+        }
+        for lat, lng in (("NaN", "67"), ("Infinity", "67"), ("95", "67"), ("24.9", "-181")):
+            with self.subTest(lat=lat, lng=lng):
+                response = client.post(
+                    "/api/bookings/bookings/", {**body, "lat": lat, "lng": lng}, format="json"
+                )
+                self.assertEqual(response.status_code, 400)
+
+        response = client.post(
+            "/api/bookings/bookings/", {**body, "lat": "24.9", "lng": "67"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        url = f"/api/bookings/bookings/{response.json()['id']}/"
+        client.patch(url, {"lat": "25.5", "lng": "66"}, format="json")
+        booking = Booking.objects.get()
+        self.assertEqual((float(booking.lat), float(booking.lng)), (24.9, 67.0))
+
+    def test_availability_rejects_bad_coordinates(self):
+        params = {"salon_id": self.salon.pk, "service_id": self.home.pk,
+                  "date": self.day.isoformat()}
+        client = self.client_for(self.customer)
+        for lat, lng in (("nan", "67"), ("inf", "67"), ("500", "67"), ("24.9", None)):
+            with self.subTest(lat=lat, lng=lng):
+                query = {**params, "lat": lat, **({"lng": lng} if lng else {})}
+                response = client.get("/api/bookings/bookings/availability/", query)
+                self.assertEqual(response.status_code, 400)
+
+
+class WaitlistTests(BookingTestCase):
+    def wait_for(self, first, last, customer=None):
+        return WaitlistEntry.objects.create(
+            customer=customer or self.customer, salon=self.salon, service=self.service,
+            earliest_start=first, latest_start=last,
+        )
+
+    def test_freed_interval_is_booked(self):
+        taken = self.make_booking(11)
+        entry = self.wait_for(local(self.day, 11), local(self.day, 11))
+        transition(taken, "cancelled")
+
+        booked = backfill(self.salon.pk, taken.start_time, taken.end_time)
+
+        self.assertEqual([b.start_time for b in booked], [local(self.day, 11)])
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.booking), ("booked", booked[0]))
+
+    def test_takes_a_later_start_when_the_first_is_taken(self):
+        self.make_booking(10)
+        self.make_booking(10, 30)
+        entry = self.wait_for(local(self.day, 10), local(self.day, 12))
+
+        # what joining queues: the whole window
+        booked = backfill(self.salon.pk, entry.earliest_start, local(self.day, 12, 30))
+
+        self.assertEqual([b.start_time for b in booked], [local(self.day, 11)])
+
+    def test_off_grid_freed_start_is_tried_first(self):
+        # 10:15-10:45 is free, but the 10:00 and 10:30 grid slots aren't
+        trim = Service.objects.create(
+            salon=self.salon, name="Trim", duration_minutes=15, price="5.00"
+        )
+        self.make_booking(10, service=trim)
+        self.make_booking(10, 45)
+        entry = self.wait_for(local(self.day, 10), local(self.day, 12))
+
+        booked = backfill(self.salon.pk, local(self.day, 10, 15), local(self.day, 10, 45))
+
+        self.assertEqual([b.start_time for b in booked], [local(self.day, 10, 15)])
+        self.assertEqual(WaitlistEntry.objects.get(pk=entry.pk).status, "booked")
+
+    def test_nothing_fits(self):
+        for hour in (10, 11):
+            self.make_booking(hour)
+            self.make_booking(hour, 30)
+        entry = self.wait_for(local(self.day, 10), local(self.day, 11, 30))
+
+        self.assertEqual(backfill(self.salon.pk, local(self.day, 10), local(self.day, 12)), [])
+        self.assertEqual(WaitlistEntry.objects.get(pk=entry.pk).status, "waiting")
+
+    def test_oldest_entry_gets_the_slot(self):
+        other = User.objects.create_user("other", password="x", role="customer")
+        first = self.wait_for(local(self.day, 10), local(self.day, 10))
+        self.wait_for(local(self.day, 10), local(self.day, 10), customer=other)
+
+        booked = backfill(self.salon.pk, local(self.day, 10), local(self.day, 10, 30))
+
+        self.assertEqual([b.customer_id for b in booked], [first.customer_id])
+
+    def test_only_the_customer_withdraws(self):
+        entry = self.wait_for(local(self.day, 10), local(self.day, 12))
+        url = f"/api/bookings/waitlist/{entry.pk}/"
+
+        self.assertEqual(self.client_for(self.owner).delete(url).status_code, 403)
+        self.assertEqual(WaitlistEntry.objects.get(pk=entry.pk).status, "waiting")
+        self.assertEqual(self.client_for(self.customer).delete(url).status_code, 204)
+        self.assertEqual(WaitlistEntry.objects.get(pk=entry.pk).status, "withdrawn")
+
+
+class CancelViewTests(BookingTestCase):
+    url = "/api/bookings/bookings/"
+
+    def test_cancel_twice(self):
+        booking = self.make_booking(10)
+        client = self.client_for(self.customer)
+
+        self.assertEqual(client.post(f"{self.url}{booking.pk}/cancel/").status_code, 200)
+        response = client.post(f"{self.url}{booking.pk}/cancel/")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Booking already cancelled")
+
+    def test_bulk_cancel_by_day(self):
+        self.make_booking(10)
+        self.make_booking(11)
+        response = self.client_for(self.owner).post(
+            f"{self.url}bulk-cancel/",
+            {"salon_id": self.salon.pk, "date": self.day.isoformat()},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 2)
+
+    def test_bulk_cancel_rejects_bad_input(self):
+        client = self.client_for(self.owner)
+        for body in (
+            {"ids": ["x"]},
+            {"ids": "1,2"},
+            {"salon_id": "x", "date": self.day.isoformat()},
+            {"salon_id": self.salon.pk, "date": "tomorrow"},
+            {"salon_id": self.salon.pk},
+            {},
+        ):
+            with self.subTest(body=body):
+                response = client.post(f"{self.url}bulk-cancel/", body, format="json")
+                self.assertEqual(response.status_code, 400)
+
+    def test_bulk_cancel_is_for_owners(self):
+        booking = self.make_booking(10)
+        response = self.client_for(self.customer).post(
+            f"{self.url}bulk-cancel/", {"ids": [booking.pk]}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class UtilizationTests(BookingTestCase):
+    url = "/api/bookings/bookings/utilization/"
+
+    def get(self, user, **params):
+        params = {"salon_id": self.salon.pk, "from": self.day.isoformat(),
+                  "to": self.day.isoformat(), **params}
+        return self.client_for(user).get(self.url, params)
+
+    def test_minute_grid(self):
+        # Monday, open 10-18: 10:00-11:00 and 10:30-11:00, then 23:30 to past the window
+        result = utilization(
+            [600, 630, 1410], [660, 660, 1500], [0, 0, 1], days=1, first_weekday=0,
+            open_minute=600, close_minute=1080, capacity=2,
+        )
+        self.assertEqual(result["occupied"][0, 10], 90)
+        self.assertEqual(result["available"][0, 10], 120)
+        self.assertEqual(result["available"][0, 9], 0)
+        self.assertEqual(result["idle"][0, 10], 0)
+        self.assertEqual(result["idle"][0, 11], 60)
+        self.assertEqual(result["occupied"][0, 23], 30)  # clipped at midnight
+        self.assertEqual(result["service_minutes"].tolist(), [90, 30])
+        self.assertEqual(result["service_counts"].tolist(), [2, 1])
+
+    def test_weekday_wraps(self):
+        # two days from a Sunday: the second lands on Monday's row
+        result = utilization([1440 + 600], [1440 + 660], [0], days=2, first_weekday=6,
+                             open_minute=600, close_minute=1080)
+        self.assertEqual(result["occupied"][0, 10], 60)
+        self.assertEqual(result["occupied"][6].sum(), 0)
+
+    def test_report(self):
+        self.make_booking(10)
+        self.make_booking(11, status="cancelled")
+        report = self.get(self.owner).json()
+
+        weekday = self.day.weekday()
+        self.assertEqual(report["capacity"], 1)
+        self.assertEqual(report["utilization"][weekday][10], 0.5)
+        self.assertEqual(report["utilization"][weekday][11], 0)
+        self.assertEqual(report["idle_minutes"][weekday][10], 30)
+        self.assertEqual(report["weekday_utilization"][weekday], round(30 / 480, 3))
+        self.assertEqual(
+            report["services"],
+            [{"service_id": self.service.pk, "name": "Cut", "bookings": 1,
+              "booked_minutes": 30, "share": 1.0}],
+        )
+
+    def test_only_the_owner_and_a_bounded_range(self):
+        self.assertEqual(self.get(self.customer).status_code, 403)
+        self.assertEqual(self.get(self.owner, salon_id=999999).status_code, 404)
+        for params in ({"from": "soon"}, {"to": (self.day - timedelta(days=1)).isoformat()},
+                       {"to": (self.day + timedelta(days=366)).isoformat()}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(self.owner, **params).status_code, 400)
+
+
+class EarliestSearchTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        # the base salon (10-18) at the search point, a later-opening one ~1.1 km north
+        Salon.objects.filter(pk=self.salon.pk).update(lat="24.900000", lng="67.000000")
+        self.late = Salon.objects.create(
+            owner=self.owner, name="Late", open_time=time(11), close_time=time(18),
+            lat="24.910000", lng="67.000000",
+        )
+        self.late_cut = Service.objects.create(
+            salon=self.late, name="Cut", duration_minutes=30, price="12.00"
+        )
+
+    def find(self, limit=10, **kwargs):
+        window = (datetime.combine(self.day, time(0)), datetime.combine(self.day, time(23)))
+        return [(r["salon_name"], r["start"][11:16])
+                for r in find_earliest("cut", *window, limit=limit, **kwargs)]
+
+    def test_merge_is_in_time_order_across_salons(self):
+        self.make_booking(10)
+        self.make_booking(10, 30)
+        self.assertEqual(
+            self.find(limit=4),
+            [("Salon", "11:00"), ("Late", "11:00"), ("Salon", "11:30"), ("Late", "11:30")],
+        )
+
+    def test_ties_go_to_the_nearer_salon(self):
+        Salon.objects.filter(pk=self.salon.pk).update(open_time=time(11))
+        self.assertEqual(self.find(limit=2, lat=24.91, lng=67.0, radius_km=5)[0], ("Late", "11:00"))
+        self.assertEqual(self.find(limit=2, lat=24.90, lng=67.0, radius_km=5)[0], ("Salon", "11:00"))
+
+    def test_limit_and_radius(self):
+        self.assertEqual(len(self.find(limit=3)), 3)
+        self.assertEqual({name for name, _ in self.find(lat=24.90, lng=67.0, radius_km=0.5)},
+                         {"Salon"})
+
+    def test_candidate_cut_keeps_the_best_ranked(self):
+        # the base salon has the lower pk; the cut must not just keep it
+        with mock.patch.object(search, "MAX_CANDIDATES", 1):
+            self.assertEqual({name for name, _ in self.find(lat=24.91, lng=67.0, radius_km=5)},
+                             {"Late"})
+            Salon.objects.filter(pk=self.late.pk).update(open_time=time(8))
+            self.assertEqual({name for name, _ in self.find()}, {"Late"})
+
+
+class ArchiveTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() - timedelta(days=30)
+        self.cutoff = timezone.now() - timedelta(days=7)
+
+    def test_rows_move_intact(self):
+        done = self.make_booking(10, status="completed")
+        paid = self.make_payment(done, status="completed")
+        entry = WaitlistEntry.objects.create(
+            customer=self.customer, salon=self.salon, service=self.service,
+            earliest_start=done.start_time, latest_start=done.start_time,
+            status="booked", booking=done,
+        )
+        active = self.make_booking(11)
+        tombstones = Tombstone.objects.count()
+
+        self.assertEqual(archive_batch(self.cutoff), (1, 1))
+
+        self.assertEqual(list(Booking.objects.values_list("pk", flat=True)), [active.pk])
+        archived = ArchivedBooking.objects.get(pk=done.pk)
+        self.assertEqual(
+            (archived.customer_id, archived.salon_id, archived.service_id, archived.start_time,
+             archived.end_time, archived.status, archived.created_at, archived.updated_at),
+            (done.customer_id, done.salon_id, done.service_id, done.start_time,
+             done.end_time, done.status, done.created_at, done.updated_at),
+        )
+        cold_payment = ArchivedPayment.objects.get(pk=paid.pk)
+        self.assertEqual((cold_payment.booking_id, str(cold_payment.amount), cold_payment.status),
+                         (done.pk, "10.00", "completed"))
+        self.assertFalse(Payment.objects.filter(pk=paid.pk).exists())
+        # the waitlist row stays, only its link to the hot row is cleared
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.booking_id), ("booked", None))
+        self.assertEqual(Tombstone.objects.count(), tombstones)  # nothing was deleted for sync
+        self.assertEqual(archive_batch(self.cutoff), (0, 0))
+
+    def test_history_has_each_row_once(self):
+        old = [self.make_booking(hour, status="completed") for hour in (10, 11)]
+        self.make_payment(old[0], status="completed")
+        current = self.make_booking(12)
+        archive_batch(self.cutoff, batch_size=1)
+
+        response = self.client_for(self.customer).get("/api/bookings/bookings/history/")
+        rows = response.json()["results"]
+        self.assertEqual([row["id"] for row in rows], [current.pk, old[1].pk, old[0].pk])
+        self.assertEqual([row["archived"] for row in rows], [False, False, True])
+        self.assertEqual(rows[2]["payment_status"], "completed")
+
+    def test_row_archived_mid_export_is_written_once(self):
+        bookings = [self.make_booking(hour, status="completed") for hour in (10, 11, 12, 13)]
+        client = self.client_for(self.customer)
+        with mock.patch.object(BookingViewSet, "EXPORT_CHUNK", 2):
+            response = client.get("/api/bookings/bookings/export/")
+            lines = iter(response.streaming_content)
+            read = [next(lines), next(lines)]  # header and the newest row
+            archive_batch(self.cutoff)  # everything moves to the cold tier
+            read.extend(lines)
+
+        ids = [int(line.decode().split(",")[0]) for line in read[1:]]
+        self.assertEqual(ids, [b.pk for b in reversed(bookings)])
+        self.assertEqual([line.decode().rstrip().endswith("True") for line in read[1:]],
+                         [False, False, True, True])
+
+
+class AdminSearchTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser("admin", password="x"))
+
+    def search(self, term, url="/admin/bookings/booking/"):
+        response = self.client.get(url, {"q": term})
+        self.assertEqual(response.status_code, 200)
+        return sorted(obj.pk for obj in response.context["cl"].result_list)
+
+    def test_ids_are_exact_and_names_are_prefixes(self):
+        first, second = self.make_booking(10), self.make_booking(11)
+        other = User.objects.create_user("cust", password="x", role="customer")
+        third = self.make_booking(12)
+        Booking.objects.filter(pk=third.pk).update(customer=other)
+
+        self.assertEqual(self.search(str(second.pk)), [second.pk])
+        self.assertEqual(self.search("cust"), [first.pk, second.pk, third.pk])
+        self.assertEqual(self.search("custo"), [first.pk, second.pk])
+        self.assertEqual(self.search("Sal"), [first.pk, second.pk, third.pk])
+        self.assertEqual(self.search("alon"), [])  # not a substring search
+        self.assertEqual(self.search(""), [first.pk, second.pk, third.pk])
+
+    def test_search_joins_nothing_for_the_term(self):
+        self.make_booking(10)
+        with CaptureQueriesContext(connection) as queries:
+            self.search("cust")
+        listing = [q["sql"] for q in queries if 'FROM "bookings_booking"' in q["sql"]]
+        self.assertTrue(listing)
+        for sql in listing:
+            self.assertIn('"customer_id" IN (SELECT', sql)
+
+
+class SyncTests(BookingTestCase):
+    url = "/api/bookings/bookings/sync/"
+
+    def sync(self, since=None):
+        params = {"since": since} if since else {}
+        return self.client_for(self.customer).get(self.url, params)
+
+    def test_delta_since_cursor(self):
+        quiet, changed, deleted = (self.make_booking(hour) for hour in (10, 11, 12))
+
+        snapshot = self.sync().json()
+        self.assertEqual(len(snapshot["bookings"]), 3)
+        self.assertEqual(snapshot["deleted"], [])
+
+        transition(changed, "cancelled")
+        deleted_pk = deleted.pk
+        deleted.delete()
+        delta = self.sync(snapshot["cursor"]).json()
+
+        self.assertEqual([b["id"] for b in delta["bookings"]], [changed.pk])
+        self.assertEqual(delta["deleted"], [{"model": "booking", "id": deleted_pk}])
+        self.assertNotIn(quiet.pk, [b["id"] for b in delta["bookings"]])
+        self.assertEqual(self.sync(delta["cursor"]).json()["bookings"], [])
+
+    def test_late_commit_is_not_skipped(self):
+        booking = self.make_booking(10)
+        cursor = self.sync().json()["cursor"]
+
+        # a transaction that stamped updated_at long before it committed
+        transition(booking, "cancelled")
+        Booking.objects.filter(pk=booking.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=10)
+        )
+
+        delta = self.sync(cursor).json()
+        self.assertEqual([b["id"] for b in delta["bookings"]], [booking.pk])
+        self.assertEqual(delta["payments"], [])
+
+    def test_payment_changes_are_sent(self):
+        payment = self.make_payment(self.make_booking(10))
+        cursor = self.sync().json()["cursor"]
+
+        transition(payment.booking, "cancelled")
+
+        delta = self.sync(cursor).json()
+        self.assertEqual([(p["id"], p["status"]) for p in delta["payments"]], [(payment.pk, "failed")])
+
+    def test_deleted_resource_is_sent(self):
+        chair = Resource.objects.create(salon=self.salon, name="Chair")
+        booking = self.make_booking(10, resource=chair)
+        cursor = self.sync().json()["cursor"]
+
+        chair.delete()
+
+        delta = self.sync(cursor).json()
+        self.assertEqual([(b["id"], b["resource"]) for b in delta["bookings"]], [(booking.pk, None)])
+
+    def test_other_customers_changes_are_not_sent(self):
+        other = User.objects.create_user("other", password="x", role="customer")
+        cursor = self.sync().json()["cursor"]
+        booking = Booking.objects.create(
+            customer=other, salon=self.salon, service=self.service,
+            start_time=local(self.day, 10), end_time=local(self.day, 10, 30),
+        )
+        booking.delete()
+        delta = self.sync(cursor).json()
+        self.assertEqual((delta["bookings"], delta["deleted"]), ([], []))
+
+    def test_bad_and_expired_cursors(self):
+        for bad in ("yesterday", "-1", "2030-01-01T00:00:00Z"):
+            with self.subTest(cursor=bad):
+                self.assertEqual(self.sync(bad).status_code, 400)
+
+        self.make_booking(10).delete()
+        before_purge = self.sync().json()["cursor"]
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(purge_tombstones(), 1)
+
+        self.assertEqual(self.sync(encode_cursor(0)).status_code, 410)
+        self.assertEqual(self.sync(before_purge).status_code, 200)
+
+
+class SlotStreamTests(BookingTestCase):
+    def url(self, token=True):
+        query = f"?date={self.day.isoformat()}"
+        if token:
+            query += f"&token={AccessToken.for_user(self.customer)}"
+        return f"/api/bookings/stream/{self.salon.pk}/{query}"
+
+    def open(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.addCleanup(response.close)
+        events = response.streaming_content
+        self.assertEqual(next(events), b"retry: 3000\n\n")
+        return response, events
+
+    def test_needs_token(self):
+        self.assertEqual(self.client.get(self.url(token=False)).status_code, 401)
+
+    async def test_needs_token_under_asgi(self):
+        response = await self.async_client.get(self.url(token=False))
+        self.assertEqual(response.status_code, 401)
+
+    def test_taken_and_freed_under_wsgi(self):
+        _, events = self.open()
+        client = self.client_for(self.customer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(
+                "/api/bookings/bookings/",
+                {
+                    "salon_id": self.salon.pk,
+                    "service_id": self.service.pk,
+                    "start_time": f"{self.day.isoformat()}T10:00:00",
+                },
+                format="json",
+            )
+        booking_id = response.json()["id"]
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f"/api/bookings/bookings/{booking_id}/cancel/")
+
+        taken, freed = next(events).decode(), next(events).decode()
+        self.assertTrue(taken.startswith("event: slot_taken\n"))
+        self.assertTrue(freed.startswith("event: slot_freed\n"))
+        event = json.loads(freed.split("data: ", 1)[1])
+        self.assertEqual(event["booking_id"], booking_id)
+        self.assertEqual(event["start"], f"{self.day.isoformat()}T10:00:00")
+
+    @override_settings(BOOKING_STREAM_MAX_THREADS=1)
+    def test_threads_per_process_are_capped(self):
+        first, _ = self.open()
+        busy = self.client.get(self.url())
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy["Retry-After"], "30")
+
+        first.close()
+        self.open()
+
+    @override_settings(BOOKING_STREAM_MAX_SECONDS=0)
+    def test_stream_ends_to_free_the_thread(self):
+        _, events = self.open()
+        self.assertEqual(list(events), [])
+
+
+class DatabaseBackendTests(TransactionTestCase):
+    """Two backends stand in for two worker processes."""
+
+    channel = "salon:1:2030-01-01"
+
+    def test_events_reach_other_processes(self):
+        listener, publisher = DatabaseBackend(), DatabaseBackend()
+        sub = listener.subscribe(self.channel, blocking=True)
+        self.addCleanup(listener._poller.join, 5)
+        self.addCleanup(sub.close)
+
+        publisher.publish(self.channel, {"type": "slot_taken", "booking_id": 1})
+        publisher.publish("salon:2:2030-01-01", {"type": "slot_taken", "booking_id": 2})
+        publisher.publish(self.channel, {"type": "slot_freed", "booking_id": 1})
+
+        self.assertEqual(sub.get(5), {"type": "slot_taken", "booking_id": 1})
+        self.assertEqual(sub.get(5), {"type": "slot_freed", "booking_id": 1})
+        with self.assertRaises(TimeoutError):
+            sub.get(1)
+
+    def test_each_row_is_delivered_once(self):
+        backend = DatabaseBackend()
+        backend._since = timezone.now()
+        backend.publish(self.channel, {"type": "slot_taken"})
+        self.assertEqual(backend.poll(), 1)
+        self.assertEqual(backend.poll(), 0)
+
+
+class SyncSequenceTests(TestCase):
+    def test_counter_row_comes_back_after_a_flush(self):
+        SyncSequence.objects.all().delete()
+        self.assertEqual(SyncSequence.current(), (0, 0))
+        with transaction.atomic():
+            self.assertEqual(SyncSequence.take(), 1)
+            self.assertEqual(SyncSequence.take(), 2)
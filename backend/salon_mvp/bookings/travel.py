@@ -0,0 +1,110 @@
+"""
+Travel buffers for home services.
+
+A booking takes place at the customer's address (Booking.lat/lng) when
+its service is a home service, otherwise at the salon. Whoever does it
+has to get from one appointment to the next, so at salons that offer
+home services every other booking is widened on both sides by the
+travel time between its location and the candidate's before the usual
+overlap checks. Two in-salon bookings are at the same place and get no
+buffer, so salons without home visits schedule exactly as before.
+
+Travel time is straight-line distance at HOME_SERVICE_SPEED_KMH plus
+HOME_SERVICE_BUFFER_MINUTES to park and set up, capped at
+HOME_SERVICE_MAX_TRAVEL_MINUTES, which also bounds how far around a slot
+we have to look. A visit without an address only costs the fixed
+buffer. Distances for a whole day's bookings come from one numpy call.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from salons.geo import haversine_km
+from .availability import day_window, to_local
+from .models import Booking
+
+
+def _coordinate(value):
+    return math.nan if value is None else float(value)
+
+
+def max_travel():
+    return timedelta(minutes=settings.HOME_SERVICE_MAX_TRAVEL_MINUTES)
+
+
+def location(salon, service, lat=None, lng=None):
+    """(lat, lng, at_home) of a booking of ``service`` at ``salon``."""
+    if service.is_home_service:
+        return _coordinate(lat), _coordinate(lng), True
+    return _coordinate(salon.lat), _coordinate(salon.lng), False
+
+
+def travel_minutes(origin, lats, lngs, at_home):
+    """
+    Whole minutes of travel between ``origin`` (from location()) and each
+    booking location given as arrays; 0 where both are at the salon.
+    """
+    lat, lng, origin_home = origin
+    at_home = np.asarray(at_home, dtype=bool)
+    km = np.nan_to_num(haversine_km(lat, lng, lats, lngs), nan=0.0)
+    minutes = np.ceil(km * 60 / settings.HOME_SERVICE_SPEED_KMH) + settings.HOME_SERVICE_BUFFER_MINUTES
+    minutes = np.minimum(minutes, settings.HOME_SERVICE_MAX_TRAVEL_MINUTES)
+    if not origin_home:
+        minutes[~at_home] = 0
+    return minutes
+
+
+def _rows(salon, start, end):
+    """Active bookings near [start, end) with where they take place, one query."""
+    margin = max_travel()
+    rows = list(
+        Booking.objects.filter(
+            salon=salon,
+            status__in=Booking.ACTIVE_STATUSES,
+            start_time__lt=end + margin,
+            end_time__gt=start - margin,
+        ).values_list(
+            "start_time", "end_time", "resource_id", "pk",
+            "lat", "lng", "service__is_home_service",
+        )
+    )
+    salon_lat, salon_lng = _coordinate(salon.lat), _coordinate(salon.lng)
+    lats = np.array([_coordinate(r[4]) if r[6] else salon_lat for r in rows], dtype=np.float64)
+    lngs = np.array([_coordinate(r[5]) if r[6] else salon_lng for r in rows], dtype=np.float64)
+    at_home = np.array([r[6] for r in rows], dtype=bool)
+    return rows, lats, lngs, at_home
+
+
+def padded_day_bookings(salon, date, origin):
+    """
+    day_bookings() for a booking made at ``origin``: every interval is
+    widened by the travel time to or from it, start-sorted.
+    """
+    open_dt, close_dt = day_window(salon, date)
+    rows, lats, lngs, at_home = _rows(
+        salon, timezone.make_aware(open_dt), timezone.make_aware(close_dt)
+    )
+    if not rows:
+        return []
+    pads = travel_minutes(origin, lats, lngs, at_home).tolist()
+    return sorted(
+        ((to_local(start) - timedelta(minutes=pad), to_local(end) + timedelta(minutes=pad),
+          resource_id, pk)
+         for (start, end, resource_id, pk, *_), pad in zip(rows, pads)),
+        key=lambda row: row[0],
+    )
+
+
+def conflicting_ids(salon, start, end, origin):
+    """Pks of active bookings that [start, end) at ``origin`` can't be fitted around."""
+    rows, lats, lngs, at_home = _rows(salon, start, end)
+    if not rows:
+        return []
+    pads = travel_minutes(origin, lats, lngs, at_home).tolist()
+    return [
+        row[3] for row, pad in zip(rows, pads)
+        if row[0] - timedelta(minutes=pad) < end and row[1] + timedelta(minutes=pad) > start
+    ]
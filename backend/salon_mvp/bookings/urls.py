@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookingViewSet
+from .stream import slot_stream
+from .views import BookingViewSet, WaitlistViewSet
 
 router = DefaultRouter()
 router.register(r'bookings', BookingViewSet, basename='booking')
+router.register(r'waitlist', WaitlistViewSet, basename='waitlist')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('stream/<int:salon_id>/', slot_stream, name='booking-slot-stream'),
 ]
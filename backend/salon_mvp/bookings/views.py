@@ -1,21 +1,73 @@
-from datetime import timedelta, datetime, time
+import csv
+import math
+from datetime import timedelta, datetime
 
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Q
-from rest_framework import viewsets, permissions, serializers, status
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import mixins, viewsets, permissions, serializers, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 
-from .models import Booking
-from .serializers import BookingSerializer
+from .admission import SlotTaken, admit
+from .analytics import salon_utilization
+from .archive import both_tiers
+from .availability import busy_for, day_bookings, day_window, eligible_resource_ids, slot_list
+from .events import publish_slot_event
+from .lifecycle import bulk_transition, transition
+from .models import Booking, SyncSequence, Tombstone, WaitlistEntry
+from .search import find_earliest
+from .serializers import BookingSerializer, BulkCancelSerializer, WaitlistEntrySerializer
+from .sync import decode_cursor, encode_cursor
+from .travel import location, padded_day_bookings
+from .waitlist import max_window, queue_backfill
+from salons.catalog import get_salon_service
+from salons.geo import valid_point
 from salons.models import Salon, Service
-from payments.models import Payment  # <-- import from payments app
+from idempotency.decorators import idempotent
+from jobs.queue import enqueue
+from payments.models import Payment
+from payments.serializers import PaymentSerializer
+
+
+# columns of the history/export endpoints, read from both tiers
+HISTORY_FIELDS = (
+    "id", "customer_id", "salon_id", "service_id", "resource_id",
+    "start_time", "end_time", "status", "created_at",
+)
+HISTORY_EXPRESSIONS = {
+    "salon_name": F("salon__name"),
+    "service_name": F("service__name"),
+    "payment_amount": F("payment__amount"),
+    "payment_method": F("payment__method"),
+    "payment_status": F("payment__status"),
+}
+
+
+class HistoryPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 500
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for streaming csv."""
+
+    def write(self, value):
+        return value
 
 
 class BookingViewSet(viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    UTILIZATION_MAX_DAYS = 366
+    EXPORT_CHUNK = 2000
+    EARLIEST_MAX_RESULTS = 50
+    EARLIEST_MAX_DAYS = 7
 
     def get_queryset(self):
         user = self.request.user
@@ -29,6 +81,10 @@ class BookingViewSet(viewsets.ModelViewSet):
             return base.filter(salon__owner=user)
         return base  # superadmin
 
+    @idempotent("bookings.create")
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         user = self.request.user
         if getattr(user, "role", None) != "customer":
@@ -37,71 +93,235 @@ class BookingViewSet(viewsets.ModelViewSet):
         salon_id = serializer.validated_data.pop("salon_id")
         service_id = serializer.validated_data.pop("service_id")
 
+        # process-local catalog cache; see salons/catalog.py
         try:
-            salon = Salon.objects.get(id=salon_id)
+            salon, service = get_salon_service(salon_id, service_id)
         except Salon.DoesNotExist:
             raise serializers.ValidationError("Salon does not exist")
-
-        try:
-            service = Service.objects.get(id=service_id, salon=salon)
         except Service.DoesNotExist:
             raise serializers.ValidationError("Service does not exist for this salon")
 
         start = serializer.validated_data["start_time"]
         end = start + timedelta(minutes=service.duration_minutes)
+        # the visit address only means something for home services
+        if not service.is_home_service:
+            serializer.validated_data.pop("lat", None)
+            serializer.validated_data.pop("lng", None)
+        lat = serializer.validated_data.get("lat")
+        lng = serializer.validated_data.get("lng")
 
         with transaction.atomic():
-            # lock rows during overlap check
-            overlap = (
-                Booking.objects.select_for_update()
-                .filter(salon=salon, status__in=["pending", "confirmed"])
-                .filter(~Q(end_time__lte=start) & ~Q(start_time__gte=end))
-            )
-
-            if overlap.exists():
-                raise serializers.ValidationError("Time overlaps with another booking")
+            try:
+                resource = admit(salon, service, start, end, lat, lng)
+            except SlotTaken as exc:
+                raise serializers.ValidationError(str(exc))
 
             booking = serializer.save(
                 customer=user,
                 salon=salon,
                 service=service,
+                resource=resource,
                 end_time=end,
                 status="confirmed",
             )
 
-            # Auto-create a pending payment record (default COD)
-            Payment.objects.create(
-                booking=booking,
-                customer=user,
-                salon_owner=salon.owner,
-                amount=service.price,
-                method="cod",
-                status="pending",
+            publish_slot_event("slot_taken", booking)
+
+            # Default COD payment is created by a background job that
+            # commits with this booking (price captured now)
+            enqueue(
+                "payments.create_for_booking",
+                {"booking_id": booking.pk, "amount": str(service.price)},
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if instance.status in Booking.ACTIVE_STATUSES:
+                publish_slot_event("slot_freed", instance)
+                queue_backfill(instance.salon_id, instance.start_time, instance.end_time)
+            instance.delete()
+
+    def _owner_transition(self, request, to_status):
+        booking = self.get_object()
+        if request.user.pk != booking.salon.owner_id:
+            return Response({"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
+
+        if not transition(booking, to_status):
+            return Response(
+                {"detail": f"Cannot move a {booking.status} booking to {to_status}"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        return Response({"status": to_status}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"])
+    def confirm(self, request, pk=None):
+        return self._owner_transition(request, "confirmed")
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        return self._owner_transition(request, "completed")
+
+    @action(detail=True, methods=["post"], url_path="no-show")
+    def no_show(self, request, pk=None):
+        return self._owner_transition(request, "no_show")
 
     @action(detail=True, methods=["post"])
     def cancel(self, request, pk=None):
         booking = self.get_object()
         user = request.user
 
-        if user != booking.customer and user != booking.salon.owner:
+        if user.pk != booking.customer_id and user.pk != booking.salon.owner_id:
             return Response({"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
 
-        if booking.status == "cancelled":
+        # conditional UPDATE: only one of two racing cancels can win
+        if not transition(booking, "cancelled"):
+            # the status we loaded may be what just changed under us
+            booking.refresh_from_db(fields=["status"])
+            if booking.status == "cancelled":
+                return Response(
+                    {"detail": "Booking already cancelled"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             return Response(
-                {"detail": "Booking already cancelled"},
+                {"detail": f"Cannot cancel a {booking.status} booking"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        booking.status = "cancelled"
-        booking.save()
+        return Response({"status": "cancelled"}, status=status.HTTP_200_OK)
 
-        # keep payment consistent
-        if hasattr(booking, "payment") and booking.payment.status == "pending":
-            booking.payment.status = "failed"
-            booking.payment.save(update_fields=["status", "updated_at"])
+    @action(detail=False, methods=["post"], url_path="bulk-cancel")
+    def bulk_cancel(self, request):
+        """
+        POST {"ids": [...]} or {"salon_id": ..., "date": "YYYY-MM-DD"}
+        Salon owners only; bookings outside their salons are ignored.
+        """
+        user = request.user
+        if getattr(user, "role", None) not in ("salon_owner", "superadmin"):
+            return Response({"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
 
-        return Response({"status": "cancelled"}, status=status.HTTP_200_OK)
+        qs = Booking.objects.all()
+        if user.role == "salon_owner":
+            qs = qs.filter(salon__owner=user)
+
+        params = BulkCancelSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        if params.validated_data.get("ids"):
+            qs = qs.filter(pk__in=params.validated_data["ids"])
+        else:
+            qs = qs.filter(
+                salon_id=params.validated_data["salon_id"],
+                start_time__date=params.validated_data["date"],
+            )
+
+        cancelled = bulk_transition(qs, "cancelled")
+        return Response(
+            {"cancelled": cancelled, "count": len(cancelled)},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        """
+        GET ?since=<cursor>
+        Bookings and payments changed since the cursor, plus ids deleted
+        since then. Omit ``since`` for a full snapshot; send the returned
+        ``cursor`` on the next call.
+
+        Cursors are SyncSequence change numbers, which become visible in
+        commit order, so a write that commits late still lands after the
+        cursor handed out before it. The cursor is read before the rows:
+        a row changed in between comes again next time (clients upsert
+        by id).
+        """
+        user = request.user
+        cursor, purged_through = SyncSequence.current()
+        bookings = self.get_queryset()
+        payments = Payment.objects.all()
+        deleted = Tombstone.objects.all()
+
+        role = getattr(user, "role", None)
+        if role == "customer":
+            payments = payments.filter(customer=user)
+            deleted = deleted.filter(customer_id=user.pk)
+        elif role == "salon_owner":
+            payments = payments.filter(salon_owner=user)
+            deleted = deleted.filter(salon_owner_id=user.pk)
+
+        since_raw = request.query_params.get("since")
+        if since_raw:
+            since = decode_cursor(since_raw)
+            if since is None:
+                return Response({"detail": "Invalid cursor"}, status=400)
+            if since < purged_through:
+                return Response(
+                    {"detail": "Cursor expired, sync again without since"},
+                    status=status.HTTP_410_GONE,
+                )
+            bookings = bookings.filter(change_seq__gt=since)
+            payments = payments.filter(change_seq__gt=since)
+            deleted = deleted.filter(change_seq__gt=since)
+        else:
+            deleted = deleted.none()
+
+        return Response(
+            {
+                "cursor": encode_cursor(cursor),
+                "bookings": self.get_serializer(bookings, many=True).data,
+                "payments": PaymentSerializer(payments, many=True).data,
+                "deleted": [
+                    {"model": model, "id": object_id}
+                    for model, object_id in deleted.values_list("model", "object_id")
+                ],
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def utilization(self, request):
+        """
+        GET ?salon_id=&from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive, max 366 days)
+        Hour-of-week occupancy and idle time plus per-service totals for
+        the salon's owner.
+        """
+        salon_id = request.query_params.get("salon_id")
+        try:
+            first_day = datetime.strptime(request.query_params.get("from", ""), "%Y-%m-%d").date()
+            last_day = datetime.strptime(request.query_params.get("to", ""), "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"detail": "from and to must be YYYY-MM-DD"}, status=400)
+        days = (last_day - first_day).days + 1
+        if not salon_id or not 1 <= days <= self.UTILIZATION_MAX_DAYS:
+            return Response(
+                {"detail": f"Need salon_id and a range of 1-{self.UTILIZATION_MAX_DAYS} days"},
+                status=400,
+            )
+
+        try:
+            salon = Salon.objects.get(pk=salon_id)
+        except Salon.DoesNotExist:
+            return Response({"detail": "Salon does not exist"}, status=404)
+        user = request.user
+        if user.pk != salon.owner_id and getattr(user, "role", None) != "superadmin":
+            return Response({"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
+
+        window_start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+        # past windows reach into archived bookings
+        rows = list(both_tiers(
+            Q(salon=salon, start_time__lt=window_start + timedelta(days=days),
+              end_time__gt=window_start) & ~Q(status="cancelled"),
+            "start_time", "end_time", "service_id",
+            flat=True,
+        ))
+        services = list(
+            Service.objects.filter(salon=salon).order_by("pk").values_list("pk", "name")
+        )
+        known = {pk for pk, _ in services}
+        rows = [row for row in rows if row[2] in known]
+
+        report = salon_utilization(salon, rows, services, first_day, days)
+        report.update(
+            {"salon_id": salon.pk, "from": first_day.isoformat(), "to": last_day.isoformat()}
+        )
+        return Response(report)
 
     @action(detail=False, methods=["get"])
     def availability(self, request):
@@ -113,9 +333,8 @@ class BookingViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Missing params"}, status=400)
 
         try:
-            salon = Salon.objects.get(pk=salon_id)
-            service = Service.objects.get(pk=service_id, salon=salon)
-        except (Salon.DoesNotExist, Service.DoesNotExist):
+            salon, service = get_salon_service(salon_id, service_id)
+        except (Salon.DoesNotExist, Service.DoesNotExist, ValueError):
             return Response({"detail": "Invalid salon or service"}, status=400)
 
         try:
@@ -123,39 +342,213 @@ class BookingViewSet(viewsets.ModelViewSet):
         except ValueError:
             return Response({"detail": "Invalid date format"}, status=400)
 
-        # working hours (fallbacks if fields don’t exist)
-        open_time = getattr(salon, "open_time", time(10, 0))
-        close_time = getattr(salon, "close_time", time(18, 0))
-        open_dt = datetime.combine(date, open_time)
-        close_dt = datetime.combine(date, close_time)
-
-        # existing bookings for that day
-        existing_bookings = Booking.objects.filter(
-            salon=salon,
-            start_time__date=date,
-            status__in=["pending", "confirmed"],
-        )
+        # visit address, for home services
+        try:
+            lat = float(request.query_params["lat"]) if request.query_params.get("lat") else None
+            lng = float(request.query_params["lng"]) if request.query_params.get("lng") else None
+        except ValueError:
+            return Response({"detail": "Invalid lat/lng"}, status=400)
+        if (lat is None) != (lng is None) or (lat is not None and not valid_point(lat, lng)):
+            return Response({"detail": "Invalid lat/lng"}, status=400)
+
+        # one bookings query, then a single sweep over the day's slots;
+        # with home visits the bookings are padded by travel time first
+        open_dt, close_dt = day_window(salon, date)
+        if salon.has_home_service:
+            bookings = padded_day_bookings(salon, date, location(salon, service, lat, lng))
+        else:
+            bookings = day_bookings(salon, date)
+        busy, capacity = busy_for(bookings, eligible_resource_ids(salon, service))
+        slots = slot_list(open_dt, close_dt, service.duration_minutes, busy, capacity)
 
-        slots = []
-        slot_length = timedelta(minutes=service.duration_minutes)
-        current = open_dt
+        return Response(slots)
 
-        while current + slot_length <= close_dt:
-            slot_start = current
-            slot_end = current + slot_length
+    @action(detail=False, methods=["get"])
+    def earliest(self, request):
+        """
+        GET ?service=haircut[&lat=..&lng=..&radius_km=5][&area=..]
+            [&start=2025-01-01T09:00&end=2025-01-01T20:00][&limit=10]
+
+        Earliest free slots for a service across every matching salon.
+        start/end are local wall-clock times; the window defaults to now
+        until the end of today.
+        """
+        params = request.query_params
+        name = (params.get("service") or "").strip()
+        if not name:
+            return Response({"detail": "service is required"}, status=400)
+
+        now = timezone.localtime().replace(tzinfo=None, second=0, microsecond=0)
+        try:
+            start = datetime.fromisoformat(params["start"]) if params.get("start") else now
+            end = (
+                datetime.fromisoformat(params["end"]) if params.get("end")
+                else datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+            )
+            limit = int(params.get("limit", 10))
+            lat = float(params["lat"]) if params.get("lat") else None
+            lng = float(params["lng"]) if params.get("lng") else None
+            radius_km = float(params.get("radius_km", 5))
+        except ValueError:
+            return Response({"detail": "Invalid parameters"}, status=400)
 
-            overlap = existing_bookings.filter(
-                ~Q(end_time__lte=slot_start) & ~Q(start_time__gte=slot_end)
+        start = max(start.replace(tzinfo=None), now)
+        end = end.replace(tzinfo=None)
+        if end <= start:
+            return Response({"detail": "end must be after start"}, status=400)
+        if end - start > timedelta(days=self.EARLIEST_MAX_DAYS):
+            return Response(
+                {"detail": f"Window is limited to {self.EARLIEST_MAX_DAYS} days"}, status=400
             )
+        if lat is not None and lng is not None and not valid_point(lat, lng):
+            return Response({"detail": "Invalid lat/lng"}, status=400)
+        if (lat is None) != (lng is None) or not 0 < radius_km < math.inf:
+            return Response({"detail": "lat and lng go together with a positive radius_km"},
+                            status=400)
+
+        return Response(find_earliest(
+            name, start, end,
+            limit=min(max(limit, 1), self.EARLIEST_MAX_RESULTS),
+            lat=lat, lng=lng, radius_km=radius_km, area=params.get("area"),
+        ))
+
+    def _history(self, request, before=None):
+        """
+        Both tiers, scoped to the caller and filtered by the query params;
+        with ``before`` = (start_time, id), only rows after that one in
+        the newest-first order.
+        """
+        user = request.user
+        role = getattr(user, "role", None)
+        q = Q()
+        if role == "customer":
+            q &= Q(customer=user)
+        elif role == "salon_owner":
+            q &= Q(salon__owner=user)
+
+        params = request.query_params
+        if params.get("salon_id"):
+            q &= Q(salon_id=params["salon_id"])
+        if params.get("status"):
+            q &= Q(status=params["status"])
+        try:
+            if params.get("from"):
+                first_day = datetime.strptime(params["from"], "%Y-%m-%d")
+                q &= Q(start_time__gte=timezone.make_aware(first_day))
+            if params.get("to"):
+                last_day = datetime.strptime(params["to"], "%Y-%m-%d") + timedelta(days=1)
+                q &= Q(start_time__lt=timezone.make_aware(last_day))
+        except ValueError:
+            raise serializers.ValidationError({"detail": "from and to must be YYYY-MM-DD"})
+        if before is not None:
+            start_time, pk = before
+            q &= Q(start_time__lt=start_time) | Q(start_time=start_time, id__lt=pk)
+        return both_tiers(q, *HISTORY_FIELDS, **HISTORY_EXPRESSIONS).order_by(
+            "-start_time", "-id"
+        )
+
+    @action(detail=False, methods=["get"])
+    def history(self, request):
+        """
+        GET [?from=YYYY-MM-DD&to=YYYY-MM-DD&salon_id=&status=&limit=&offset=]
+        Current and archived bookings, newest first, with payment details.
+        """
+        paginator = HistoryPagination()
+        page = paginator.paginate_queryset(self._history(request), request, view=self)
+        return paginator.get_paginated_response(page)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Same filters as history, streamed as CSV. Read in keyset pages of
+        EXPORT_CHUNK rows on (start_time, id), which a booking keeps when
+        it is archived, so a row moved to the cold tier mid-export is
+        still written exactly once.
+        """
+        self._history(request)  # bad parameters fail before streaming starts
+        columns = list(HISTORY_FIELDS) + list(HISTORY_EXPRESSIONS) + ["archived"]
+        writer = csv.writer(_Echo())
+
+        def lines():
+            yield writer.writerow(columns)
+            before = None
+            while True:
+                page = list(self._history(request, before)[:self.EXPORT_CHUNK])
+                for row in page:
+                    yield writer.writerow([row[column] for column in columns])
+                if len(page) < self.EXPORT_CHUNK:
+                    return
+                before = page[-1]["start_time"], page[-1]["id"]
+
+        response = StreamingHttpResponse(lines(), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="bookings.csv"'
+        return response
+
+
+class WaitlistViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Customers join with {"salon_id", "service_id", "earliest_start",
+    "latest_start"[, "lat", "lng"]} and are booked automatically when a
+    start in that window frees up; the customer withdraws with DELETE.
+    Owners see the entries at their salons.
+    """
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-            slots.append(
-                {
-                    "start": slot_start.isoformat(),
-                    "end": slot_end.isoformat(),
-                    "available": not overlap.exists(),
-                }
+    def get_queryset(self):
+        user = self.request.user
+        base = WaitlistEntry.objects.all()
+        if getattr(user, "role", None) == "customer":
+            return base.filter(customer=user)
+        elif getattr(user, "role", None) == "salon_owner":
+            return base.filter(salon__owner=user)
+        return base  # superadmin
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        if getattr(user, "role", None) != "customer":
+            raise serializers.ValidationError("Only customers can join a waitlist")
+
+        salon_id = serializer.validated_data.pop("salon_id")
+        service_id = serializer.validated_data.pop("service_id")
+        try:
+            salon, service = get_salon_service(salon_id, service_id)
+        except Salon.DoesNotExist:
+            raise serializers.ValidationError("Salon does not exist")
+        except Service.DoesNotExist:
+            raise serializers.ValidationError("Service does not exist for this salon")
+
+        earliest = serializer.validated_data["earliest_start"]
+        latest = serializer.validated_data["latest_start"]
+        if latest <= timezone.now():
+            raise serializers.ValidationError("The window has already passed")
+        if latest - earliest > max_window():
+            raise serializers.ValidationError(
+                f"Window is limited to {settings.WAITLIST_MAX_WINDOW_DAYS} days"
             )
+        if not service.is_home_service:
+            serializer.validated_data.pop("lat", None)
+            serializer.validated_data.pop("lng", None)
 
-            current += slot_length
+        with transaction.atomic():
+            serializer.save(customer=user, salon=salon, service=service)
+            # it may be free already
+            queue_backfill(
+                salon.pk, earliest,
+                latest + timedelta(minutes=service.duration_minutes),
+            )
 
-        return Response(slots)
+    def perform_destroy(self, instance):
+        if instance.customer_id != self.request.user.pk:
+            raise PermissionDenied("Only the customer can withdraw this entry")
+        withdrawn = WaitlistEntry.objects.filter(pk=instance.pk, status="waiting").update(
+            status="withdrawn", updated_at=timezone.now()
+        )
+        if not withdrawn:
+            raise serializers.ValidationError(f"Entry is already {instance.status}")
@@ -0,0 +1,188 @@
+"""
+Waitlist backfill.
+
+Whenever a future booking stops holding its interval (cancelled, or
+deleted), ``queue_backfill`` enqueues a ``bookings.backfill_waitlist``
+job with the transaction that freed it. The job looks up the salon's
+waiting entries whose window touches the interval - a range scan on
+(salon, status, earliest_start), bounded because windows are at most
+WAITLIST_MAX_WINDOW_DAYS long - and tries them oldest first. For each
+entry the free starts inside both the freed interval and its window come
+from the same sweep as availability (the freed start itself, then the
+salon's slot grid), and the first that passes the normal admission check
+is booked. Customers hear about it from the booking itself instead of
+polling availability.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from .admission import SlotTaken, admit
+from . import travel
+from .availability import (
+    busy_for, day_bookings, day_window, eligible_resource_ids, iter_slots, to_local,
+)
+from .events import publish_slot_event
+from .models import Booking, WaitlistEntry
+
+logger = logging.getLogger(__name__)
+
+
+def max_window():
+    return timedelta(days=settings.WAITLIST_MAX_WINDOW_DAYS)
+
+
+def queue_backfill(salon_id, start, end):
+    """Offer [start, end) at the salon to its waitlist once this transaction commits."""
+    if end is None or end <= timezone.now():
+        return
+    enqueue(
+        "bookings.backfill_waitlist",
+        {"salon_id": salon_id, "start": start.isoformat(), "end": end.isoformat()},
+    )
+
+
+def _fit(salon, start, minutes):
+    """(start, end) moved up to opening time if need be; None if it would run past closing."""
+    local_start = to_local(start)
+    open_dt, close_dt = day_window(salon, local_start.date())
+    if local_start < open_dt:
+        start, local_start = timezone.make_aware(open_dt), open_dt
+    if local_start + timedelta(minutes=minutes) > close_dt:
+        return None
+    return start, start + timedelta(minutes=minutes)
+
+
+def _free_grid_starts(entry, first, last):
+    """Starts of free grid slots for ``entry`` in [first, last] (naive local), in order."""
+    salon, service = entry.salon, entry.service
+    eligible = eligible_resource_ids(salon, service)
+    origin = travel.location(salon, service, entry.lat, entry.lng)
+    day = first.date()
+    while day <= last.date():
+        if salon.has_home_service:
+            bookings = travel.padded_day_bookings(salon, day, origin)
+        else:
+            bookings = day_bookings(salon, day)
+        busy, capacity = busy_for(bookings, eligible)
+        open_dt, close_dt = day_window(salon, day)
+        for start, _, available in iter_slots(
+            open_dt, close_dt, service.duration_minutes, busy, capacity
+        ):
+            if start > last:
+                return
+            if available and start >= first:
+                yield start
+        day += timedelta(days=1)
+
+
+def _slots(entry, start, end):
+    """
+    Candidate (start, end) slots for ``entry`` in the freed [start, end):
+    the earliest start it allows, then every free slot of the grid up to
+    the end of the interval or of its window.
+    """
+    minutes = entry.service.duration_minutes
+    first = _fit(entry.salon, max(start, entry.earliest_start), minutes)
+    if first is None or first[0] >= end or first[0] > entry.latest_start:
+        first = None
+    else:
+        yield first
+    lower = to_local(max(start, entry.earliest_start))
+    upper = to_local(min(end - timedelta(microseconds=1), entry.latest_start))
+    for local_start in _free_grid_starts(entry, lower, upper):
+        slot_start = timezone.make_aware(local_start)
+        if first is None or slot_start > first[0]:
+            yield slot_start, slot_start + timedelta(minutes=minutes)
+
+
+def _book(entry, start, end):
+    """Book ``entry`` for [start, end) or raise SlotTaken; None if it was withdrawn meanwhile."""
+    salon, service = entry.salon, entry.service
+    with transaction.atomic():
+        claimed = WaitlistEntry.objects.filter(pk=entry.pk, status="waiting").update(
+            status="booked", updated_at=timezone.now()
+        )
+        if not claimed:
+            return None
+        resource = admit(salon, service, start, end, entry.lat, entry.lng)
+        booking = Booking.objects.create(
+            customer_id=entry.customer_id,
+            salon=salon,
+            service=service,
+            resource=resource,
+            start_time=start,
+            end_time=end,
+            lat=entry.lat,
+            lng=entry.lng,
+            status="confirmed",
+        )
+        WaitlistEntry.objects.filter(pk=entry.pk).update(booking=booking)
+        publish_slot_event("slot_taken", booking)
+        enqueue(
+            "payments.create_for_booking",
+            {"booking_id": booking.pk, "amount": str(service.price)},
+        )
+    return booking
+
+
+def backfill(salon_id, start, end):
+    """Book waiting entries into [start, end) at the salon; returns the bookings made."""
+    start = max(start, timezone.now())
+    if start >= end:
+        return []
+    entries = (
+        WaitlistEntry.objects.select_related("salon", "service")
+        .filter(
+            salon_id=salon_id,
+            status="waiting",
+            earliest_start__gte=start - max_window(),
+            earliest_start__lt=end,
+            latest_start__gte=start,
+        )
+        .order_by("created_at", "pk")[:settings.WAITLIST_BACKFILL_CANDIDATES]
+    )
+    booked = []
+    for entry in entries:
+        for slot_start, slot_end in _slots(entry, start, end):
+            try:
+                booking = _book(entry, slot_start, slot_end)
+            except SlotTaken:
+                continue
+            if booking is not None:
+                logger.info("waitlist entry %s booked as %s", entry.pk, booking.pk)
+                booked.append(booking)
+            break
+    return booked
+
+
+def merge_intervals(payloads):
+    """{salon_id: [(start, end), ...]} with overlapping freed intervals merged."""
+    by_salon = {}
+    for payload in payloads:
+        by_salon.setdefault(payload["salon_id"], []).append(
+            (datetime.fromisoformat(payload["start"]), datetime.fromisoformat(payload["end"]))
+        )
+    merged = {}
+    for salon_id, intervals in by_salon.items():
+        intervals.sort()
+        out = [list(intervals[0])]
+        for start, end in intervals[1:]:
+            if start <= out[-1][1]:
+                out[-1][1] = max(out[-1][1], end)
+            else:
+                out.append([start, end])
+        merged[salon_id] = [tuple(interval) for interval in out]
+    return merged
+
+
+def expire_entries(now=None):
+    """Mark entries whose window has passed as expired; returns how many."""
+    now = now or timezone.now()
+    return WaitlistEntry.objects.filter(status="waiting", latest_start__lt=now).update(
+        status="expired", updated_at=now
+    )
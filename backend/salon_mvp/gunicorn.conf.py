@@ -0,0 +1,92 @@
+"""
+Production launcher: gunicorn -c gunicorn.conf.py salon_mvp.wsgi:application
+
+The app is preloaded and warmed up once in the master (salon_mvp/warmup.py)
+and then forked into WEB_CONCURRENCY workers with GUNICORN_THREADS
+threads each; by default 2 x CPUs + 1 workers of 4 threads. Each worker
+opens its database connections and starts its background threads before
+taking traffic. Boot times go to the log and the worker_startup_seconds
+metric; an exited worker's metrics and profiles are folded into the
+archive files.
+
+Migrations and collectstatic are release steps (see Procfile), not part
+of booting a web process.
+"""
+import os
+import time
+
+_began = time.perf_counter()
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "salon_mvp.settings")
+os.environ["SALON_MVP_PRELOAD"] = "1"  # see salon_mvp/warmup.py
+# slot events must reach SSE streams held by the other workers
+os.environ.setdefault("BOOKING_EVENTS_BACKEND", "bookings.events.DatabaseBackend")
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))  # honours container CPU limits
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * _cpus() + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then; with the app preloaded a fresh fork is cheap
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    from salon_mvp.metrics import clear_files
+    from salon_mvp.profiling import archive_exited
+
+    clear_files()
+    archive_exited()  # profiles outlive restarts, one file per old worker doesn't
+
+
+def when_ready(server):
+    from salon_mvp.warmup import timings
+
+    steps = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+    server.log.info(
+        "master ready in %.2f s (warm-up: %s); starting %s workers x %s threads",
+        time.perf_counter() - _began, steps or "skipped", server.num_workers, server.cfg.threads,
+    )
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    from salon_mvp.metrics import WORKER_STARTUP
+    from salon_mvp.warmup import worker_ready
+
+    steps = worker_ready(getattr(worker, "tpool", None), worker.cfg.threads)
+    elapsed = time.perf_counter() - worker.forked_at
+    WORKER_STARTUP.labels().observe(elapsed)
+    worker.log.info(
+        "worker %s ready in %.0f ms (connections %.0f ms)",
+        worker.pid, elapsed * 1000, steps["connections"] * 1000,
+    )
+
+
+def worker_exit(server, worker):
+    from salon_mvp.metrics import flush
+
+    flush()  # the last second's values, before the master archives them
+
+
+def child_exit(server, worker):
+    from salon_mvp import metrics, profiling
+
+    metrics.archive_process(worker.pid)
+    profiling.archive_process(worker.pid)
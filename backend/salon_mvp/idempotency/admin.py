@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import IdempotencyKey
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('scope', 'key', 'user', 'status', 'response_status', 'created_at')
+    search_fields = ('=key',)
+    list_filter = ('status', 'scope')
+    raw_id_fields = ('user',)
+    ordering = ('-created_at',)
@@ -0,0 +1,155 @@
+"""
+``Idempotency-Key`` support for create endpoints.
+
+    class PaymentViewSet(viewsets.ModelViewSet):
+        @idempotent("payments.create")
+        def create(self, request, *args, **kwargs): ...
+
+The first request with a given key claims it by inserting an
+IdempotencyKey row (unique per user, scope and key) and runs the view in
+a transaction that also stores its response, so the booking and the
+stored response commit together. Retries replay the stored response with
+an ``Idempotent-Replayed: true`` header. A duplicate that arrives while
+the first is still running waits up to IDEMPOTENCY_WAIT_SECONDS for it
+instead of doing the work again, then gets 409 if it is still not done.
+
+Exceptions and 5xx responses release the key so the client can retry.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from salon_mvp.metrics import IDEMPOTENT_RETRIES
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _claim(user, scope, key, digest):
+    """(record, True) if this request now owns the key, else (existing record, False)."""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, scope=scope, key=key, fingerprint=digest, locked_at=now
+            )
+        return record, True
+    except IntegrityError:
+        pass
+    try:
+        record = IdempotencyKey.objects.get(user=user, scope=scope, key=key)
+    except IdempotencyKey.DoesNotExist:
+        return None, False  # released in between; caller tries again
+
+    stale = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+    if record.status == "in_progress" and record.locked_at < stale and record.fingerprint == digest:
+        # whoever held it died mid-request; take over (only one retry can win)
+        won = IdempotencyKey.objects.filter(
+            pk=record.pk, status="in_progress", locked_at=record.locked_at
+        ).update(locked_at=now)
+        if won:
+            record.locked_at = now
+            return record, True
+    return record, False
+
+
+def _wait(record):
+    """Poll an in-progress key until it's done, released (None) or we give up."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while record.status == "in_progress" and time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        try:
+            record.refresh_from_db(fields=["status", "response_status", "response_body"])
+        except IdempotencyKey.DoesNotExist:
+            return None
+    return record
+
+
+def _release(record):
+    IdempotencyKey.objects.filter(pk=record.pk, status="in_progress").delete()
+
+
+def idempotent(scope):
+    """Make a DRF view method replay its first response for a repeated key."""
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > 255:
+                return Response(
+                    {"detail": f"{HEADER} is too long"}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+            digest = fingerprint(request)
+            for _ in range(3):
+                record, owned = _claim(request.user, scope, key, digest)
+                if owned:
+                    break
+                if record is None:
+                    continue
+                if record.fingerprint != digest:
+                    return Response(
+                        {"detail": f"{HEADER} was already used for a different request"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                record = _wait(record)
+                if record is None:
+                    continue  # the first attempt failed; this one may run
+                if record.status == "done":
+                    IDEMPOTENT_RETRIES.labels(scope, "replayed").inc()
+                    return Response(
+                        record.response_body,
+                        status=record.response_status,
+                        headers={"Idempotent-Replayed": "true"},
+                    )
+                break
+            if not owned:
+                IDEMPOTENT_RETRIES.labels(scope, "in_progress").inc()
+                return Response(
+                    {"detail": f"A request with this {HEADER} is still in progress"},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Retry-After": "1"},
+                )
+
+            try:
+                with transaction.atomic():
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code < 500:
+                        IdempotencyKey.objects.filter(pk=record.pk).update(
+                            status="done",
+                            response_status=response.status_code,
+                            response_body=response.data,
+                        )
+            except BaseException:
+                _release(record)
+                raise
+            if response.status_code >= 500:
+                _release(record)
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_keys():
+    """Delete keys older than IDEMPOTENCY_KEY_TTL_HOURS. Returns how many."""
+    horizon = timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=horizon).delete()
+    return deleted
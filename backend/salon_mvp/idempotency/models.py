@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class IdempotencyKey(models.Model):
+    """
+    First outcome of a request sent with an ``Idempotency-Key`` header.
+    Retries with the same key get the stored response back instead of
+    running the request again. Purged after IDEMPOTENCY_KEY_TTL_HOURS.
+    """
+    STATUS_CHOICES = (
+        ("in_progress", "In progress"),
+        ("done", "Done"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    scope = models.CharField(max_length=50)  # e.g. "bookings.create"
+    key = models.CharField(max_length=255)
+    # sha256 of the request body; a reused key with another body is an error
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="in_progress")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope", "key"], name="idempotency_user_scope_key_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status})"
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from bookings.models import Booking
+from bookings.tests import BookingTestCase
+from .decorators import fingerprint
+from .models import IdempotencyKey
+
+
+class IdempotentCreateTests(BookingTestCase):
+    url = "/api/bookings/bookings/"
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.customer)
+        self.body = {
+            "salon_id": self.salon.pk,
+            "service_id": self.service.pk,
+            "start_time": f"{self.day.isoformat()}T10:00:00",
+        }
+
+    def post(self, body=None, key="key-1"):
+        headers = {"Idempotency-Key": key} if key else {}
+        return self.client.post(self.url, body or self.body, format="json", headers=headers)
+
+    def test_retry_replays_first_response(self):
+        first = self.post()
+        second = self.post()
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_raised_errors_release_the_key(self):
+        self.make_booking(10)
+        self.assertEqual(self.post().status_code, 400)
+        Booking.objects.all().delete()
+
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", response.headers)
+
+    def test_same_key_other_body_is_rejected(self):
+        self.post()
+        other = {**self.body, "start_time": f"{self.day.isoformat()}T11:00:00"}
+        self.assertEqual(self.post(other).status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_without_key_nothing_is_stored(self):
+        self.post(key=None)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_keys_are_per_user(self):
+        self.post()
+        other = self.client_for(
+            type(self.customer).objects.create_user("other", password="x", role="customer")
+        )
+        body = {**self.body, "start_time": f"{self.day.isoformat()}T11:00:00"}
+        response = other.post(self.url, body, format="json", headers={"Idempotency-Key": "key-1"})
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_in_progress_duplicate_gets_409(self):
+        self.hold_key(locked_at=timezone.now())
+        response = self.post()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Booking.objects.exists())
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=60)
+    def test_abandoned_key_is_taken_over(self):
+        self.hold_key(locked_at=timezone.now() - timedelta(seconds=61))
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status, "done")
+
+    def hold_key(self, locked_at):
+        # what a request that is still running (or died) leaves behind
+        request = type("Request", (), {"data": self.body})()
+        IdempotencyKey.objects.create(
+            user=self.customer, scope="bookings.create", key="key-1",
+            fingerprint=fingerprint(request), locked_at=locked_at,
+        )
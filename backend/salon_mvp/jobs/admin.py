@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'queue', 'status', 'attempts', 'run_at', 'locked_by', 'created_at')
+    search_fields = ('task',)
+    list_filter = ('status', 'queue')
+    ordering = ('run_at',)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from jobs.queue import Worker
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", dest="queues", help="Queue(s) to serve (default: default)")
+        parser.add_argument("--concurrency", type=int, default=4, help="Worker threads")
+        parser.add_argument("--batch-size", type=int, default=10, help="Jobs claimed per round trip")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when idle")
+        parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            options["queues"] or ["default"],
+            concurrency=options["concurrency"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        )
+        self.stdout.write(f"worker {worker.worker_id} serving {', '.join(worker.queues)}")
+        try:
+            worker.run(drain=options["drain"])
+        except KeyboardInterrupt:
+            worker.stopping.set()
@@ -0,0 +1,33 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("failed", "Failed"),
+    )
+
+    queue = models.CharField(max_length=50, default="default")
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["run_at"]
+        indexes = [
+            # claim query: next due jobs of a queue
+            models.Index(fields=["queue", "status", "run_at"], name="job_claim_idx"),
+            models.Index(fields=["locked_by"], name="job_locked_by_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
@@ -0,0 +1,254 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Task:
+    name: str
+    func: object
+    queue: str = "default"
+    max_attempts: int = 5
+    batch: bool = False  # handler receives a list of payloads
+    max_concurrency: int = 0  # per worker; 0 = limited only by the pool
+    on_failure: object = None  # gets the payloads of jobs that used their last attempt
+
+
+_registry = {}
+
+
+def task(name, queue="default", max_attempts=5, batch=False, max_concurrency=0,
+         on_failure=None):
+    """
+    Register a job handler.
+
+        @task("payments.create_for_booking")
+        def create_for_booking(payload): ...
+
+    Batch handlers get every payload claimed together for that task in
+    one call and succeed or fail as a unit. ``on_failure(payloads)`` runs
+    in its own transaction once jobs are marked failed for good, so the
+    task can clean up whatever it left half done.
+    """
+    def decorator(func):
+        _registry[name] = Task(
+            name, func, queue, max_attempts, batch, max_concurrency, on_failure
+        )
+        return func
+    return decorator
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def enqueue(name, payload=None, run_at=None, delay=None):
+    """
+    Add a job. It is written with the caller's current transaction, so it
+    only becomes visible to workers if that transaction commits (outbox).
+    """
+    spec = get_task(name)
+    if run_at is None:
+        run_at = timezone.now() + (delay or timedelta(0))
+    return Job.objects.create(
+        queue=spec.queue,
+        task=name,
+        payload=payload or {},
+        max_attempts=spec.max_attempts,
+        run_at=run_at,
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts`` (exponential, jittered)."""
+    base = settings.JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return min(base, settings.JOBS_RETRY_MAX_SECONDS) * random.uniform(0.8, 1.2)
+
+
+def claim(queues, worker_id, limit):
+    """
+    Atomically take up to ``limit`` due jobs from ``queues``.
+
+    Candidates are read with SELECT ... FOR UPDATE SKIP LOCKED where the
+    backend has it, so concurrent workers don't queue up behind each other.
+    On SQLite (one writer at a time) the conditional UPDATE keyed on a
+    per-claim token does the same job: a row can only flip queued -> running
+    once, and we read back exactly the rows our token won.
+
+    A running job whose lock is older than JOBS_LOCK_TIMEOUT was lost with
+    its worker and counts as a failed attempt: it is taken again, or marked
+    failed (and its task's on_failure run) if that was its last attempt.
+    """
+    now = timezone.now()
+    token = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    abandoned = Q(status="running", locked_at__lt=stale)
+    due = Q(status="queued", run_at__lte=now) | (
+        abandoned & Q(attempts__lt=F("max_attempts"))
+    )
+
+    with transaction.atomic():
+        # a worker died on the job's last attempt: don't run it again
+        lost = Job.objects.filter(abandoned, queue__in=queues, attempts__gte=F("max_attempts"))
+        if connection.features.has_select_for_update_skip_locked:
+            lost = lost.select_for_update(skip_locked=True)
+        lost = list(lost.values_list("pk", "task", "payload"))
+        if lost:
+            Job.objects.filter(pk__in=[pk for pk, _, _ in lost]).update(
+                status="failed",
+                locked_by="",
+                locked_at=None,
+                last_error="Lock expired on the last attempt (worker lost)",
+            )
+            _give_up([(name, payload) for _, name, payload in lost])
+
+        candidates = Job.objects.filter(due, queue__in=queues).order_by("run_at")
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list("pk", flat=True)[:limit])
+        if not ids:
+            return []
+        Job.objects.filter(due, pk__in=ids).update(
+            status="running",
+            locked_by=token,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+    return list(Job.objects.filter(locked_by=token, status="running"))
+
+
+def _succeed(jobs):
+    Job.objects.filter(pk__in=[job.pk for job in jobs], locked_by=jobs[0].locked_by).delete()
+
+
+def _give_up(jobs):
+    """Run on_failure for ``[(task, payload), ...]`` that failed for good."""
+    by_task = {}
+    for name, payload in jobs:
+        by_task.setdefault(name, []).append(payload)
+    for name, payloads in by_task.items():
+        spec = _registry.get(name)
+        if spec is None or spec.on_failure is None:
+            continue
+        try:
+            with transaction.atomic():
+                spec.on_failure(payloads)
+        except Exception:
+            logger.exception("on_failure of %s failed", name)
+
+
+def _fail(jobs, error):
+    now = timezone.now()
+    given_up = []
+    for job in jobs:
+        final = job.attempts >= job.max_attempts
+        if final:
+            changes = {"status": "failed"}
+        else:
+            changes = {
+                "status": "queued",
+                "run_at": now + timedelta(seconds=backoff(job.attempts)),
+            }
+        # only if we still own it (a stale-lock reclaim may have taken it)
+        owned = Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            locked_by="", locked_at=None, last_error=error, **changes
+        )
+        if owned and final:
+            given_up.append((job.task, job.payload))
+    _give_up(given_up)
+
+
+def run_jobs(jobs):
+    """Run claimed jobs of one task. Errors are recorded, never raised."""
+    spec = _registry.get(jobs[0].task)
+    try:
+        if spec is None:
+            raise LookupError(f"Unknown task {jobs[0].task!r}")
+        if spec.batch:
+            spec.func([job.payload for job in jobs])
+        else:
+            for job in jobs:
+                try:
+                    spec.func(job.payload)
+                except Exception:
+                    logger.exception("job %s failed", job)
+                    _fail([job], traceback.format_exc())
+                else:
+                    _succeed([job])
+            return
+    except Exception:
+        logger.exception("jobs %s failed", [job.pk for job in jobs])
+        _fail(jobs, traceback.format_exc())
+    else:
+        _succeed(jobs)
+
+
+class Worker:
+    """
+    Polls ``queues`` and runs jobs on a thread pool of ``concurrency``
+    threads, claiming at most ``batch_size`` jobs per round trip.
+    """
+
+    def __init__(self, queues, concurrency=4, batch_size=10, poll_interval=1.0):
+        self.queues = list(queues)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self._limits = {}
+
+    def _run_group(self, jobs):
+        spec = _registry.get(jobs[0].task)
+        limit = self._limits.get(jobs[0].task)
+        if limit is None and spec and spec.max_concurrency:
+            limit = self._limits.setdefault(
+                spec.name, threading.BoundedSemaphore(spec.max_concurrency)
+            )
+        try:
+            if limit:
+                with limit:
+                    run_jobs(jobs)
+            else:
+                run_jobs(jobs)
+        finally:
+            close_old_connections()
+
+    def run_once(self, pool):
+        """Claim and run one batch; returns how many jobs were claimed."""
+        jobs = claim(self.queues, self.worker_id, self.batch_size)
+        groups = {}
+        for job in jobs:
+            spec = _registry.get(job.task)
+            key = job.task if spec and spec.batch else job.pk
+            groups.setdefault(key, []).append(job)
+        futures = [pool.submit(self._run_group, group) for group in groups.values()]
+        for future in futures:
+            future.result()
+        return len(jobs)
+
+    def run(self, drain=False):
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="job") as pool:
+            while not self.stopping.is_set():
+                claimed = self.run_once(pool)
+                close_old_connections()
+                if not claimed:
+                    if drain:
+                        break
+                    self.stopping.wait(self.poll_interval)
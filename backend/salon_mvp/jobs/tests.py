@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim, enqueue, run_jobs, task
+
+calls = []
+
+
+@task("tests.record")
+def record(payload):
+    calls.append(payload)
+
+
+@task("tests.explode", max_attempts=2)
+def explode(payload):
+    raise RuntimeError("boom")
+
+
+@task("tests.explode_once", max_attempts=1, on_failure=lambda payloads: calls.append(payloads))
+def explode_once(payload):
+    raise RuntimeError("boom")
+
+
+@task("tests.record_batch", batch=True)
+def record_batch(payloads):
+    calls.append(sorted(p["n"] for p in payloads))
+
+
+@override_settings(JOBS_RETRY_BASE_SECONDS=10, JOBS_LOCK_TIMEOUT=300)
+class ClaimTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_success_deletes_job(self):
+        enqueue("tests.record", {"n": 1})
+        jobs = claim(["default"], "w", 10)
+        self.assertEqual(len(jobs), 1)
+
+        run_jobs(jobs)
+
+        self.assertEqual(calls, [{"n": 1}])
+        self.assertFalse(Job.objects.exists())
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        enqueue("tests.record")
+        self.assertEqual(len(claim(["default"], "a", 10)), 1)
+        self.assertEqual(claim(["default"], "b", 10), [])
+
+    def test_future_jobs_wait(self):
+        enqueue("tests.record", delay=timedelta(minutes=5))
+        self.assertEqual(claim(["default"], "w", 10), [])
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        enqueue("tests.explode")
+
+        with self.assertLogs("jobs.queue", "ERROR"):
+            run_jobs(claim(["default"], "w", 10))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ("queued", 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertIn("boom", job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs("jobs.queue", "ERROR"):
+            run_jobs(claim(["default"], "w", 10))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertEqual(claim(["default"], "w", 10), [])
+
+    def test_batch_handler_gets_all_payloads(self):
+        for n in (2, 1, 3):
+            enqueue("tests.record_batch", {"n": n})
+        run_jobs(claim(["default"], "w", 10))
+        self.assertEqual(calls, [[1, 2, 3]])
+
+    def test_stale_lock_is_reclaimed(self):
+        enqueue("tests.record")
+        first = claim(["default"], "dead", 10)[0]
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=301))
+
+        again = claim(["default"], "alive", 10)
+
+        self.assertEqual([job.pk for job in again], [first.pk])
+        self.assertEqual(again[0].attempts, 2)
+        # the lost worker can no longer fail a job it doesn't own
+        run_jobs([first])
+        self.assertEqual(Job.objects.get().locked_by, again[0].locked_by)
+
+    def test_stale_lock_on_last_attempt_fails(self):
+        enqueue("tests.explode")
+        Job.objects.update(
+            status="running", attempts=2, locked_by="dead",
+            locked_at=timezone.now() - timedelta(seconds=301),
+        )
+
+        self.assertEqual(claim(["default"], "w", 10), [])
+
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ("failed", 2, ""))
+
+    def test_on_failure_runs_once_the_job_gives_up(self):
+        enqueue("tests.explode_once", {"n": 1})
+        with self.assertLogs("jobs.queue", "ERROR"):
+            run_jobs(claim(["default"], "w", 10))
+        self.assertEqual(calls, [[{"n": 1}]])
+        self.assertEqual(Job.objects.get().status, "failed")
@@ -1,3 +1,23 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
 
-# Register your models here.
+from salon_mvp.admin_search import IndexedSearchMixin
+from salon_mvp.paginators import EstimatedCountPaginator
+from .models import Payment
+
+User = get_user_model()
+
+@admin.register(Payment)
+class PaymentAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'booking', 'customer', 'salon_owner', 'amount', 'method', 'status', 'created_at')
+    list_select_related = ('booking__service', 'customer', 'salon_owner')
+    # payment or booking id, the gateway's reference, or a username prefix
+    search_ids = ('pk', 'booking_id')
+    search_exact = ('gateway_reference',)
+    search_prefixes = {'customer': (User, 'username'), 'salon_owner': (User, 'username')}
+    list_filter = ('status', 'method')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    raw_id_fields = ('booking', 'customer', 'salon_owner')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,197 @@
+"""
+Card gateway client and webhook handling.
+
+Nothing talks to the gateway inside a request. Creating a card payment
+marks it "processing" and enqueues ``payments.charge_card``; the worker
+claims those jobs in batches and posts every charge concurrently over one
+pooled httpx AsyncClient with connect/read timeouts. The outcome arrives
+later on the signed webhook (POST /api/payments/webhook/), which carries
+many events at once and settles them with one conditional UPDATE per
+outcome - only payments still "processing" move, so duplicate or late
+deliveries change nothing. A charge job that fails for good fails its
+payments, and anything still processing after PAYMENT_PROCESSING_TIMEOUT
+is failed by the sweeper (or can be settled by the salon owner).
+
+Each charge is sent with ``payment-<id>`` as both merchant reference and
+Idempotency-Key: a retried job can't charge twice, and the webhook finds
+the payment from the reference alone.
+
+Webhook bodies are signed with HMAC-SHA256 over ``"<timestamp>.<body>"``
+using PAYMENT_WEBHOOK_SECRET, sent as X-Gateway-Timestamp and
+X-Gateway-Signature. `manage.py stub_gateway` runs a local stand-in
+for offline load tests.
+"""
+import asyncio
+import hashlib
+import hmac
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bookings.models import SyncSequence
+from salon_mvp.metrics import PAYMENT_TRANSITIONS
+from .models import Payment
+
+try:
+    import httpx
+except ImportError:  # optional; only the job worker needs it
+    httpx = None
+
+REFERENCE_PREFIX = "payment-"
+
+# webhook event type -> payment status it settles to
+EVENT_STATUS = {
+    "charge.succeeded": "completed",
+    "charge.failed": "failed",
+}
+
+
+class GatewayError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def merchant_reference(payment_id):
+    return f"{REFERENCE_PREFIX}{payment_id}"
+
+
+def payment_id_from_reference(reference):
+    if not isinstance(reference, str) or not reference.startswith(REFERENCE_PREFIX):
+        return None
+    try:
+        return int(reference[len(REFERENCE_PREFIX):])
+    except ValueError:
+        return None
+
+
+# -------------------------------------------------------------------
+# Signing
+# -------------------------------------------------------------------
+
+def sign(body, timestamp, secret=None):
+    secret = settings.PAYMENT_WEBHOOK_SECRET if secret is None else secret
+    message = f"{timestamp}.".encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify(body, timestamp, signature):
+    """True if ``signature`` is ours for ``body`` and the timestamp is recent."""
+    if not settings.PAYMENT_WEBHOOK_SECRET or not timestamp or not signature:
+        return False
+    try:
+        age = abs(time.time() - int(timestamp))
+    except ValueError:
+        return False
+    if age > settings.PAYMENT_WEBHOOK_TOLERANCE:
+        return False
+    return hmac.compare_digest(sign(body, timestamp), signature)
+
+
+# -------------------------------------------------------------------
+# Charging
+# -------------------------------------------------------------------
+
+async def _charge(client, payment_id, amount):
+    reference = merchant_reference(payment_id)
+    try:
+        response = await client.post(
+            "/charges",
+            json={"reference": reference, "amount": str(amount), "currency": settings.PAYMENT_CURRENCY},
+            headers={"Idempotency-Key": reference},
+        )
+    except httpx.HTTPError as exc:  # timeouts, refused connections, ...
+        raise GatewayError(f"{type(exc).__name__}: {exc}") from exc
+    if response.status_code >= 500 or response.status_code == 429:
+        raise GatewayError(f"gateway returned {response.status_code}")
+    if response.status_code >= 400:
+        raise GatewayError(f"charge rejected: {response.text[:200]}", retryable=False)
+    return response.json()["id"]
+
+
+async def charge_all(charges):
+    """
+    Send ``[(payment_id, amount), ...]`` concurrently.
+    Returns {payment_id: gateway id or GatewayError}.
+    """
+    if httpx is None:
+        raise GatewayError("httpx is not installed", retryable=False)
+    timeout = httpx.Timeout(
+        settings.PAYMENT_GATEWAY_TIMEOUT, connect=settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT
+    )
+    limits = httpx.Limits(
+        max_connections=settings.PAYMENT_GATEWAY_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.PAYMENT_GATEWAY_MAX_CONNECTIONS,
+    )
+    headers = {}
+    if settings.PAYMENT_GATEWAY_KEY:
+        headers["Authorization"] = f"Bearer {settings.PAYMENT_GATEWAY_KEY}"
+    async with httpx.AsyncClient(
+        base_url=settings.PAYMENT_GATEWAY_URL,
+        headers=headers,
+        timeout=timeout,
+        limits=limits,
+    ) as client:
+        results = await asyncio.gather(
+            *(_charge(client, payment_id, amount) for payment_id, amount in charges),
+            return_exceptions=True,
+        )
+    outcome = {}
+    for (payment_id, _), result in zip(charges, results):
+        if isinstance(result, Exception) and not isinstance(result, GatewayError):
+            result = GatewayError(f"{type(result).__name__}: {result}")
+        outcome[payment_id] = result
+    return outcome
+
+
+def charge_many(charges):
+    """Blocking wrapper for worker threads (they have no event loop)."""
+    return asyncio.run(charge_all(charges))
+
+
+# -------------------------------------------------------------------
+# Settling
+# -------------------------------------------------------------------
+
+def settle(payment_ids, target):
+    """
+    Move those of ``payment_ids`` still processing to ``target``; returns
+    how many moved. Call inside a transaction.
+    """
+    if not payment_ids:
+        return 0
+    moved = Payment.objects.filter(pk__in=payment_ids, status="processing").update(
+        status=target, updated_at=timezone.now(), change_seq=SyncSequence.take()
+    )
+    if moved:
+        PAYMENT_TRANSITIONS.labels("processing", target).inc(moved)
+    return moved
+
+
+def expire_processing():
+    """
+    Fail payments that have been "processing" for longer than
+    PAYMENT_PROCESSING_TIMEOUT: no webhook came and no job is left to
+    retry them. Returns how many moved; run by the booking sweeper.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PAYMENT_PROCESSING_TIMEOUT)
+    with transaction.atomic():
+        stuck = Payment.objects.filter(status="processing", updated_at__lt=cutoff)
+        return settle(list(stuck.values_list("pk", flat=True)), "failed")
+
+
+def apply_events(events):
+    """Settle a webhook batch; returns {"completed": n, "failed": n}."""
+    by_status = {target: [] for target in EVENT_STATUS.values()}
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        target = EVENT_STATUS.get(event.get("type"))
+        payment_id = payment_id_from_reference(event.get("reference"))
+        if target and payment_id is not None:
+            by_status[target].append(payment_id)
+    with transaction.atomic():
+        return {target: settle(ids, target) for target, ids in by_status.items()}
@@ -0,0 +1,161 @@
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.gateway import sign
+
+
+class StubGateway:
+    """Accepts charges and reports them on the app's webhook in signed batches."""
+
+    def __init__(self, options, stderr):
+        self.options = options
+        self.stderr = stderr
+        self.secret = options["secret"] or settings.PAYMENT_WEBHOOK_SECRET
+        self.charges = {}  # Idempotency-Key -> charge id
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.stats = {"charges": 0, "replayed": 0, "errors": 0, "delivered": 0, "batches": 0}
+        self.stopping = threading.Event()
+
+    def charge(self, body, idempotency_key):
+        """(status, response body) for POST /charges."""
+        time.sleep(self.options["latency"] / 1000)
+        if random.random() < self.options["error_rate"]:
+            self.stats["errors"] += 1
+            return 503, {"error": "temporarily unavailable"}
+        key = idempotency_key or uuid.uuid4().hex
+        with self.lock:
+            charge_id = self.charges.get(key)
+            if charge_id is not None:
+                self.stats["replayed"] += 1
+                return 200, {"id": charge_id, "status": "pending"}
+            charge_id = self.charges[key] = f"ch_{uuid.uuid4().hex[:24]}"
+            self.stats["charges"] += 1
+        declined = random.random() < self.options["decline_rate"]
+        self.events.append({
+            "id": f"evt_{uuid.uuid4().hex[:24]}",
+            "type": "charge.failed" if declined else "charge.succeeded",
+            "charge": charge_id,
+            "reference": body.get("reference"),
+            "amount": body.get("amount"),
+        })
+        return 201, {"id": charge_id, "status": "pending"}
+
+    def deliver(self, events):
+        body = json.dumps({"events": events}).encode()
+        timestamp = str(int(time.time()))
+        request = urllib.request.Request(
+            self.options["webhook_url"],
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-Gateway-Timestamp": timestamp,
+                "X-Gateway-Signature": sign(body, timestamp, self.secret),
+            },
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+
+    def deliver_forever(self):
+        retry_in = 0.5
+        while not self.stopping.is_set():
+            self.stopping.wait(self.options["flush_interval"])
+            while self.events:
+                batch = []
+                while self.events and len(batch) < self.options["batch_size"]:
+                    batch.append(self.events.popleft())
+                try:
+                    self.deliver(batch)
+                except Exception as exc:
+                    self.events.extendleft(reversed(batch))
+                    self.stderr.write(f"webhook delivery failed ({exc}); retrying in {retry_in:.1f}s")
+                    self.stopping.wait(retry_in)
+                    retry_in = min(retry_in * 2, 30)
+                    break
+                retry_in = 0.5
+                self.stats["delivered"] += len(batch)
+                self.stats["batches"] += 1
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the app's pool is exercised
+
+        def _reply(self, code, body):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+            if urlsplit(self.path).path != "/charges":
+                return self._reply(404, {"error": "not found"})
+            key = stub.options["key"]
+            if key and self.headers.get("Authorization") != f"Bearer {key}":
+                return self._reply(401, {"error": "bad api key"})
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                return self._reply(400, {"error": "invalid json"})
+            if not body.get("reference") or not body.get("amount"):
+                return self._reply(400, {"error": "reference and amount are required"})
+            self._reply(*stub.charge(body, self.headers.get("Idempotency-Key")))
+
+        def log_message(self, format, *args):
+            if stub.options["verbosity"] > 1:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = "Run a local card gateway stand-in for offline testing and load tests."
+
+    def add_arguments(self, parser):
+        gateway = urlsplit(settings.PAYMENT_GATEWAY_URL)
+        parser.add_argument("--host", default=gateway.hostname or "127.0.0.1")
+        parser.add_argument("--port", type=int, default=gateway.port or 8765)
+        parser.add_argument("--webhook-url", default="http://127.0.0.1:8000/api/payments/webhook/")
+        parser.add_argument("--secret", default="", help="Webhook secret (default: PAYMENT_WEBHOOK_SECRET)")
+        parser.add_argument("--key", default=settings.PAYMENT_GATEWAY_KEY, help="API key charges must send")
+        parser.add_argument("--latency", type=float, default=50, help="Milliseconds per charge call")
+        parser.add_argument("--decline-rate", type=float, default=0.05, help="Share of charges declined")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered 503")
+        parser.add_argument("--batch-size", type=int, default=100, help="Events per webhook call")
+        parser.add_argument("--flush-interval", type=float, default=0.5, help="Seconds between webhook batches")
+
+    def handle(self, *args, **options):
+        stub = StubGateway(options, self.stderr)
+        if not stub.secret:
+            self.stderr.write("warning: no webhook secret; the app will reject every delivery")
+        server = ThreadingHTTPServer((options["host"], options["port"]), make_handler(stub))
+        server.daemon_threads = True
+        sender = threading.Thread(target=stub.deliver_forever, name="webhooks", daemon=True)
+        sender.start()
+        self.stdout.write(
+            f"stub gateway on http://{options['host']}:{options['port']}, "
+            f"webhooks to {options['webhook_url']}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            stub.stopping.set()
+            sender.join()
+            self.stdout.write(" ".join(f"{name}={count}" for name, count in stub.stats.items()))
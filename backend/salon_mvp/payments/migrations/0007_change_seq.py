@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_payment_gateway'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+    ]
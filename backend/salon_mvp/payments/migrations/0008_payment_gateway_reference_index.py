@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_change_seq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='gateway_reference',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-from bookings.models import Booking
+from bookings.models import ArchivedBooking, Booking, SyncSequence
 
 
 class Payment(models.Model):
@@ -11,6 +11,7 @@ class Payment(models.Model):
 
     STATUS_CHOICES = (
         ("pending", "Pending"),
+        ("processing", "Processing"),  # card charge sent, waiting for the gateway
         ("completed", "Completed"),
         ("failed", "Failed"),
     )
@@ -31,11 +32,52 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     method = models.CharField(max_length=20, choices=METHOD_CHOICES, default="cod")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # the gateway's charge id; support finds payments by it in the admin
+    gateway_reference = models.CharField(max_length=64, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # delta-sync position, as on Booking
+    change_seq = models.BigIntegerField(default=0, db_index=True)
 
     class Meta:
         ordering = ["-created_at"]
 
     def __str__(self):
         return f"Payment {self.id} - {self.status}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.change_seq = SyncSequence.take()
+            super().save(*args, **kwargs)
+
+
+class ArchivedPayment(models.Model):
+    """Cold copy of the Payment of an ArchivedBooking (same id)."""
+
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.OneToOneField(
+        ArchivedBooking, on_delete=models.CASCADE, related_name="payment"
+    )
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_payments",
+    )
+    salon_owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_received_payments",
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    method = models.CharField(max_length=20, choices=Payment.METHOD_CHOICES)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    gateway_reference = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Archived payment {self.id} - {self.status}"
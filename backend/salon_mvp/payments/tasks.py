@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from bookings.lifecycle import PAYMENT_EFFECTS
+from bookings.models import Booking, SyncSequence
+from jobs.queue import backoff, enqueue, task
+from salon_mvp.metrics import PAYMENT_TRANSITIONS
+from . import gateway
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+@task("payments.create_for_booking")
+def create_for_booking(payload):
+    """
+    Create the default COD payment for a new booking. The booking row is
+    locked while we do, so a cancel can't slip in between: a booking that
+    was cancelled (or marked no-show) before the job ran gets its payment
+    already failed, as transition() would have left it.
+    """
+    with transaction.atomic():
+        booking = (
+            Booking.objects.select_for_update(of=("self",))
+            .select_related("salon")
+            .filter(pk=payload["booking_id"])
+            .first()
+        )
+        if booking is None:  # deleted before we got to it
+            return
+        status = PAYMENT_EFFECTS.get(booking.status, "pending")
+        # the customer may already have created one through the API
+        _, created = Payment.objects.get_or_create(
+            booking=booking,
+            defaults={
+                "customer_id": booking.customer_id,
+                "salon_owner_id": booking.salon.owner_id,
+                "amount": Decimal(payload["amount"]),
+                "method": "cod",
+                "status": status,
+            },
+        )
+    if created:
+        PAYMENT_TRANSITIONS.labels("none", status).inc()
+
+
+def charge_failed(payloads):
+    """
+    A charge_card job used its last attempt. Fail the payments the
+    gateway never accepted; those with a gateway_reference may still be
+    charged and wait for the webhook (or gateway.expire_processing).
+    """
+    unsent = Payment.objects.filter(
+        pk__in=[p["payment_id"] for p in payloads], gateway_reference=""
+    ).values_list("pk", flat=True)
+    gateway.settle(list(unsent), "failed")
+
+
+@task("payments.charge_card", batch=True, max_attempts=3, on_failure=charge_failed)
+def charge_card(payloads):
+    """
+    Send the charges for a batch of processing card payments at once.
+    The result comes back on the webhook; here we only keep the gateway's
+    id, fail charges it refused outright and retry ones that didn't get
+    through (timeouts, 5xx) on their own, so one bad call doesn't resend
+    the whole batch.
+    """
+    attempts = {p["payment_id"]: p.get("attempt", 1) for p in payloads}
+    charges = list(
+        Payment.objects.filter(pk__in=attempts, status="processing", method="card")
+        .values_list("pk", "amount")
+    )
+    if not charges:
+        return
+    outcome = gateway.charge_many(charges)
+
+    accepted, refused = [], []
+    for payment_id, result in outcome.items():
+        if not isinstance(result, gateway.GatewayError):
+            accepted.append(Payment(pk=payment_id, gateway_reference=result))
+        elif not result.retryable or attempts[payment_id] >= settings.PAYMENT_GATEWAY_MAX_ATTEMPTS:
+            logger.warning("charge for payment %s failed: %s", payment_id, result)
+            refused.append(payment_id)
+        else:
+            attempt = attempts[payment_id]
+            enqueue(
+                "payments.charge_card",
+                {"payment_id": payment_id, "attempt": attempt + 1},
+                delay=timedelta(seconds=backoff(attempt)),
+            )
+    with transaction.atomic():
+        if accepted:
+            change = SyncSequence.take()
+            for payment in accepted:
+                payment.change_seq = change
+            Payment.objects.bulk_update(accepted, ["gateway_reference", "change_seq"])
+        gateway.settle(refused, "failed")
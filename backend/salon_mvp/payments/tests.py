@@ -1,3 +1,265 @@
-from django.test import TestCase
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db.models.signals import pre_save
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from bookings.lifecycle import transition
+from bookings.tests import BookingTestCase
+from jobs.models import Job
+from jobs.queue import claim, enqueue, run_jobs
+from users.models import User
+from . import gateway
+from .models import Payment
+from .tasks import create_for_booking
+
+
+class CreateForBookingTests(BookingTestCase):
+    def book(self):
+        response = self.client_for(self.customer).post(
+            "/api/bookings/bookings/",
+            {
+                "salon_id": self.salon.pk,
+                "service_id": self.service.pk,
+                "start_time": f"{self.day.isoformat()}T10:00:00",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["id"]
+
+    def drain(self):
+        while jobs := claim(["default"], "test", 10):
+            for name in {job.task for job in jobs}:
+                run_jobs([job for job in jobs if job.task == name])
+
+    def test_booking_gets_pending_cod_payment(self):
+        booking_id = self.book()
+        self.drain()
+
+        payment = Payment.objects.get(booking_id=booking_id)
+        self.assertEqual((payment.method, payment.status), ("cod", "pending"))
+        self.assertEqual(str(payment.amount), "10.00")
+        self.assertFalse(Job.objects.exists())
+
+    def test_booking_cancelled_before_the_job_gets_failed_payment(self):
+        booking_id = self.book()
+        booking = self.salon.bookings.get(pk=booking_id)
+        self.assertTrue(transition(booking, "cancelled"))
+
+        self.drain()
+
+        self.assertEqual(Payment.objects.get(booking_id=booking_id).status, "failed")
+
+    def test_existing_payment_is_kept(self):
+        booking_id = self.book()
+        booking = self.salon.bookings.get(pk=booking_id)
+        self.make_payment(booking, status="completed")
+
+        self.drain()
+
+        self.assertEqual(Payment.objects.get(booking_id=booking_id).status, "completed")
+
+
+class PaymentCreateTests(BookingTestCase):
+    def test_unknown_method_is_rejected(self):
+        booking = self.make_booking(10)
+        response = self.client_for(self.customer).post(
+            "/api/payments/", {"booking_id": booking.pk, "method": "bitcoin"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_card_payment_is_queued_for_the_gateway(self):
+        booking = self.make_booking(10)
+        response = self.client_for(self.customer).post(
+            "/api/payments/", {"booking_id": booking.pk, "method": "card"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], "processing")
+        self.assertEqual(Job.objects.get().task, "payments.charge_card")
+
+    def test_losing_the_race_to_the_job_is_a_400(self):
+        booking = self.make_booking(10)
+
+        def job_runs_first(sender, instance, **kwargs):
+            pre_save.disconnect(job_runs_first, sender=Payment)
+            create_for_booking({"booking_id": booking.pk, "amount": "10.00"})
+
+        pre_save.connect(job_runs_first, sender=Payment)
+        self.addCleanup(pre_save.disconnect, job_runs_first, sender=Payment)
+        response = self.client_for(self.customer).post(
+            "/api/payments/", {"booking_id": booking.pk, "method": "card"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.filter(task="payments.charge_card").exists())
+
+
+class PaymentAdminSearchTests(BookingTestCase):
+    def test_payment_booking_and_gateway_ids(self):
+        self.client.force_login(User.objects.create_superuser("admin", password="x"))
+        self.make_booking(9)  # so booking and payment ids differ
+        cash = self.make_payment(self.make_booking(10))
+        card = self.make_payment(self.make_booking(11))
+        self.assertNotEqual(card.booking_id, card.pk)
+        Payment.objects.filter(pk=card.pk).update(gateway_reference="ch_123")
+
+        def search(term):
+            response = self.client.get("/admin/payments/payment/", {"q": term})
+            return sorted(payment.pk for payment in response.context["cl"].result_list)
+
+        self.assertEqual(search(str(cash.pk)), [cash.pk])
+        self.assertIn(card.pk, search(str(card.booking_id)))
+        self.assertEqual(search("ch_123"), [card.pk])
+        self.assertEqual(search("ch_12"), [])
+        self.assertEqual(search("own"), [cash.pk, card.pk])  # salon owner's username
+
+
+@override_settings(PAYMENT_WEBHOOK_SECRET="whsec", PAYMENT_WEBHOOK_TOLERANCE=300)
+class SignatureTests(SimpleTestCase):
+    body = b'{"events": []}'
+
+    def test_own_signature_verifies(self):
+        now = str(int(time.time()))
+        self.assertTrue(gateway.verify(self.body, now, gateway.sign(self.body, now)))
+
+    def test_bad_signatures_are_refused(self):
+        now = str(int(time.time()))
+        stale = str(int(time.time()) - 301)
+        for body, timestamp, signature in (
+            (self.body, now, gateway.sign(self.body, now, secret="other")),
+            (b'{"events": [1]}', now, gateway.sign(self.body, now)),  # body changed
+            (self.body, stale, gateway.sign(self.body, stale)),
+            (self.body, "soon", gateway.sign(self.body, "soon")),
+            (self.body, None, gateway.sign(self.body, now)),
+            (self.body, now, ""),
+        ):
+            with self.subTest(timestamp=timestamp, signature=signature):
+                self.assertFalse(gateway.verify(body, timestamp, signature))
+
+    @override_settings(PAYMENT_WEBHOOK_SECRET="")
+    def test_nothing_verifies_without_a_secret(self):
+        now = str(int(time.time()))
+        self.assertFalse(gateway.verify(self.body, now, gateway.sign(self.body, now)))
+
+
+class CardPaymentTestCase(BookingTestCase):
+    def card_payment(self, hour=10, **fields):
+        payment = self.make_payment(self.make_booking(hour), status="processing")
+        Payment.objects.filter(pk=payment.pk).update(method="card", **fields)
+        return payment
+
+    def status_of(self, payment):
+        return Payment.objects.values_list("status", flat=True).get(pk=payment.pk)
+
+
+@override_settings(PAYMENT_WEBHOOK_SECRET="whsec")
+class WebhookTests(CardPaymentTestCase):
+    url = "/api/payments/webhook/"
+
+    def post(self, events, secret="whsec", body=None):
+        body = body or json.dumps({"events": events}).encode()
+        timestamp = str(int(time.time()))
+        return self.client.post(
+            self.url, body, content_type="application/json",
+            HTTP_X_GATEWAY_TIMESTAMP=timestamp,
+            HTTP_X_GATEWAY_SIGNATURE=gateway.sign(body, timestamp, secret=secret),
+        )
+
+    def event(self, kind, payment):
+        return {"type": f"charge.{kind}", "reference": gateway.merchant_reference(payment.pk)}
+
+    def test_events_settle_payments(self):
+        paid, declined = self.card_payment(10), self.card_payment(11)
+        response = self.post([self.event("succeeded", paid), self.event("failed", declined),
+                              {"type": "charge.refunded", "reference": "payment-1"},
+                              {"type": "charge.failed", "reference": "order-1"}, "junk"])
+
+        self.assertEqual(response.json(), {"received": 5, "completed": 1, "failed": 1})
+        self.assertEqual((self.status_of(paid), self.status_of(declined)), ("completed", "failed"))
+
+    def test_duplicate_and_late_events_change_nothing(self):
+        payment = self.card_payment()
+        self.post([self.event("succeeded", payment)])
+
+        again = self.post([self.event("succeeded", payment), self.event("failed", payment)])
+
+        self.assertEqual(again.json(), {"received": 2, "completed": 0, "failed": 0})
+        self.assertEqual(self.status_of(payment), "completed")
+        # a payment that isn't a gateway charge is never touched
+        cod = self.make_payment(self.make_booking(12))
+        self.assertEqual(gateway.apply_events([self.event("failed", cod)]),
+                         {"completed": 0, "failed": 0})
+        self.assertEqual(self.status_of(cod), "pending")
+
+    def test_unsigned_or_malformed_posts_are_refused(self):
+        payment = self.card_payment()
+        self.assertEqual(self.post([self.event("succeeded", payment)], secret="guess").status_code, 401)
+        self.assertEqual(self.client.post(self.url, {}, format="json").status_code, 401)
+        self.assertEqual(self.post(None, body=b"{not json").status_code, 400)
+        self.assertEqual(self.post(None, body=b'{"events": {}}').status_code, 400)
+        self.assertEqual(self.status_of(payment), "processing")
+
+
+@override_settings(PAYMENT_PROCESSING_TIMEOUT=3600, JOBS_LOCK_TIMEOUT=300)
+class StuckPaymentTests(CardPaymentTestCase):
+    def charge_job(self, payment, attempts):
+        job = enqueue("payments.charge_card", {"payment_id": payment.pk})
+        Job.objects.filter(pk=job.pk).update(attempts=attempts)
+
+    def test_last_failed_attempt_fails_unsent_payments(self):
+        unsent = self.card_payment(10)
+        sent = self.card_payment(11, gateway_reference="ch_1")
+        for payment in (unsent, sent):
+            self.charge_job(payment, attempts=2)  # claiming makes it the third and last
+
+        with mock.patch.object(gateway, "charge_many", side_effect=RuntimeError("down")), \
+                self.assertLogs("jobs.queue", "ERROR"):
+            run_jobs(claim(["default"], "w", 10))
+
+        self.assertEqual(set(Job.objects.values_list("status", flat=True)), {"failed"})
+        self.assertEqual(self.status_of(unsent), "failed")
+        # the gateway has it and may still charge it: wait for the webhook
+        self.assertEqual(self.status_of(sent), "processing")
+
+    def test_worker_lost_on_the_last_attempt(self):
+        payment = self.card_payment()
+        self.charge_job(payment, attempts=3)
+        Job.objects.update(status="running", locked_by="dead",
+                           locked_at=timezone.now() - timedelta(seconds=301))
+
+        self.assertEqual(claim(["default"], "w", 10), [])
+        self.assertEqual(self.status_of(payment), "failed")
+
+    def test_earlier_failures_keep_it_processing(self):
+        payment = self.card_payment()
+        self.charge_job(payment, attempts=0)
+        with mock.patch.object(gateway, "charge_many", side_effect=RuntimeError("down")), \
+                self.assertLogs("jobs.queue", "ERROR"):
+            run_jobs(claim(["default"], "w", 10))
+        self.assertEqual(self.status_of(payment), "processing")
+
+    def test_old_processing_payments_expire(self):
+        stuck = self.card_payment(10, updated_at=timezone.now() - timedelta(hours=2))
+        recent = self.card_payment(11)
+
+        self.assertEqual(gateway.expire_processing(), 1)
+        self.assertEqual((self.status_of(stuck), self.status_of(recent)), ("failed", "processing"))
+
+    def test_owner_can_settle_after_the_timeout(self):
+        payment = self.card_payment()
+        client = self.client_for(self.owner)
+        url = f"/api/payments/{payment.pk}/"
+        self.assertEqual(client.patch(url, {"status": "completed"}, format="json").status_code, 409)
+
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(client.patch(url, {"status": "completed"}, format="json").status_code, 200)
+        self.assertEqual(self.status_of(payment), "completed")
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PaymentViewSet
+from .views import GatewayWebhookView, PaymentViewSet
 
 router = DefaultRouter()
 router.register(r'payments', PaymentViewSet, basename='payment')
 
 urlpatterns = [
+    path('payments/webhook/', GatewayWebhookView.as_view(), name='payment-webhook'),
     path('', include(router.urls)),
 ]
@@ -1,6 +1,17 @@
+from datetime import timedelta
+
+import orjson
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from bookings.models import Booking
+from idempotency.decorators import idempotent
+from jobs.queue import enqueue
+from salon_mvp.metrics import PAYMENT_TRANSITIONS
+from . import gateway
 from .models import Payment
 from .serializers import PaymentSerializer
 
@@ -10,6 +21,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent("payments.create")
     def create(self, request, *args, **kwargs):
         booking_id = request.data.get("booking_id")
         method = request.data.get("method", "cod")
@@ -19,6 +31,11 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 {"detail": "Booking ID is required"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if method not in dict(Payment.METHOD_CHOICES):
+            return Response(
+                {"detail": "Invalid payment method"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         try:
             booking = Booking.objects.get(id=booking_id)
@@ -35,14 +52,26 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
         amount = booking.service.price
 
-        payment = Payment.objects.create(
-            booking=booking,
-            customer=request.user,
-            salon_owner=booking.salon.owner,
-            amount=amount,
-            method=method,
-            status="pending" if method == "cod" else "completed",
-        )
+        # card payments wait for the gateway's webhook (see gateway.py)
+        try:
+            with transaction.atomic():
+                payment = Payment.objects.create(
+                    booking=booking,
+                    customer=request.user,
+                    salon_owner=booking.salon.owner,
+                    amount=amount,
+                    method=method,
+                    status="pending" if method == "cod" else "processing",
+                )
+                if payment.status == "processing":
+                    enqueue("payments.charge_card", {"payment_id": payment.pk})
+        except IntegrityError:
+            # the booking's create_for_booking job got there first
+            return Response(
+                {"detail": "Payment already exists for this booking"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        PAYMENT_TRANSITIONS.labels("none", payment.status).inc()
 
         serializer = self.get_serializer(payment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -54,10 +83,48 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 {"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN
             )
 
+        timeout = timedelta(seconds=settings.PAYMENT_PROCESSING_TIMEOUT)
+        if payment.status == "processing" and payment.updated_at > timezone.now() - timeout:
+            # past the timeout the owner may settle it by hand
+            return Response(
+                {"detail": "Payment is being processed by the card gateway"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
         status_update = request.data.get("status")
         if status_update in ["pending", "completed", "failed"]:
+            if status_update != payment.status:
+                PAYMENT_TRANSITIONS.labels(payment.status, status_update).inc()
             payment.status = status_update
             payment.save()
             serializer = self.get_serializer(payment)
             return Response(serializer.data)
         return Response({"detail": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class GatewayWebhookView(APIView):
+    """
+    POST /api/payments/webhook/ from the card gateway:
+        {"events": [{"type": "charge.succeeded", "reference": "payment-12", ...}, ...]}
+    Authenticated by its HMAC signature, not by a user.
+    """
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        body = request.body
+        if not gateway.verify(
+            body,
+            request.META.get("HTTP_X_GATEWAY_TIMESTAMP"),
+            request.META.get("HTTP_X_GATEWAY_SIGNATURE"),
+        ):
+            return Response({"detail": "Invalid signature"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            events = orjson.loads(body)["events"]
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            return Response({"detail": "Expected {\"events\": [...]}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(events, list):
+            return Response({"detail": "Expected {\"events\": [...]}"}, status=status.HTTP_400_BAD_REQUEST)
+        settled = gateway.apply_events(events)
+        return Response({"received": len(events), **settled})
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'salon_mvp.settings')
 
 application = get_asgi_application()
+
+from bookings.sweeper import start_sweeper  # noqa: E402  (needs apps loaded)
+
+start_sweeper()
@@ -0,0 +1,209 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+ALLOWED_METHODS = SAFE_METHODS + ("POST", "PUT", "PATCH", "DELETE")
+
+# request headers a sub-request inherits from the batch request
+INHERITED_META = ("HTTP_AUTHORIZATION", "HTTP_COOKIE", "HTTP_ACCEPT_LANGUAGE",
+                  "HTTP_USER_AGENT", "HTTP_X_PROFILE", "REMOTE_ADDR", "SERVER_NAME",
+                  "SERVER_PORT", "wsgi.url_scheme")
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def _get_handler():
+    """A handler with settings.MIDDLEWARE loaded, built once per process."""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            handler = BaseHandler()
+            handler.load_middleware()
+            _handler = handler
+    return _handler
+
+
+class BatchView(APIView):
+    """
+    POST /api/batch/
+    {"requests": [{"id": "me", "method": "GET", "path": "/api/auth/me/"},
+                  {"method": "POST", "path": "/api/bookings/bookings/", "body": {...}}]}
+
+    Runs each sub-request through the full middleware stack, URL resolver
+    and view, as a request of its own carrying the caller's Authorization
+    and Cookie headers, and returns
+    {"responses": [{"id": ..., "status": ..., "body": ...}, ...]} in order.
+    So each sub-request is routed to a replica or the primary, pins the
+    caller after a write, and is counted in /metrics and the profiler
+    under its own view.
+
+    Consecutive reads run concurrently; a write waits for everything before
+    it and blocks everything after it, so "create then list" still sees the
+    create. Limits: BATCH_MAX_REQUESTS per batch, BATCH_MAX_CONCURRENCY
+    reads at once, and BATCH_TIME_BUDGET seconds overall - sub-requests
+    not finished by then come back as 504. A read that is already running
+    at that point can't be stopped: it finishes in the background (at most
+    BATCH_MAX_CONCURRENCY of them per batch, each closing its connection
+    when done) after the response has gone. Writes are never cut short.
+
+    A sub-request that crashes comes back as its own 500; the others, and
+    any writes already committed before it, are reported as usual.
+    Streaming responses (the SSE stream, CSV export) can't be batched and
+    come back as 400.
+    """
+
+    # sub-requests check their own permissions
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        subs = request.data.get("requests") if isinstance(request.data, dict) else None
+        if not isinstance(subs, list) or not subs:
+            return Response({"detail": "requests must be a non-empty list"}, status=400)
+        if len(subs) > settings.BATCH_MAX_REQUESTS:
+            return Response(
+                {"detail": f"At most {settings.BATCH_MAX_REQUESTS} requests per batch"},
+                status=400,
+            )
+        for sub in subs:
+            error = self._validate(sub)
+            if error:
+                return Response({"detail": error, "request": sub}, status=400)
+
+        deadline = time.monotonic() + settings.BATCH_TIME_BUDGET
+        results = [None] * len(subs)
+        pool = ThreadPoolExecutor(settings.BATCH_MAX_CONCURRENCY, thread_name_prefix="batch")
+        try:
+            group = []
+            for index, sub in enumerate(subs):
+                if sub.get("method", "GET").upper() in SAFE_METHODS:
+                    group.append(index)
+                    continue
+                self._run_reads(pool, request, subs, group, results, deadline)
+                group = []
+                results[index] = self._run_or_expire(request, sub, deadline)
+            self._run_reads(pool, request, subs, group, results, deadline)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return Response({"responses": results})
+
+    def _validate(self, sub):
+        if not isinstance(sub, dict) or not isinstance(sub.get("path"), str):
+            return "Each request needs a path"
+        if sub.get("method", "GET").upper() not in ALLOWED_METHODS:
+            return f"Method {sub.get('method')} not allowed"
+        path = urlsplit(sub["path"]).path
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None  # reported as that sub-request's 404
+        if getattr(match.func, "view_class", None) is BatchView:
+            return "Batches can't be nested"
+        return None
+
+    def _run_reads(self, pool, request, subs, indexes, results, deadline):
+        if not indexes:
+            return
+        futures = {
+            pool.submit(self._run_in_thread, request, subs[index]): index
+            for index in indexes
+        }
+        done, pending = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        for future in done:
+            results[futures[future]] = future.result()
+        for future in pending:
+            future.cancel()
+            results[futures[future]] = self._expired(subs[futures[future]])
+
+    def _run_in_thread(self, request, sub):
+        try:
+            return self._dispatch(request, sub)
+        finally:
+            # pool threads get their own connections; don't leak them
+            connections.close_all()
+
+    def _run_or_expire(self, request, sub, deadline):
+        if time.monotonic() >= deadline:
+            return self._expired(sub)
+        return self._dispatch(request, sub)
+
+    def _expired(self, sub):
+        return {
+            "id": sub.get("id"),
+            "status": status.HTTP_504_GATEWAY_TIMEOUT,
+            "body": {"detail": "Batch time budget exceeded"},
+        }
+
+    def _dispatch(self, request, sub):
+        method = sub.get("method", "GET").upper()
+        url = urlsplit(sub["path"])
+        body = b"" if sub.get("body") is None else json.dumps(sub["body"]).encode()
+
+        environ = {key: request.META[key] for key in INHERITED_META if key in request.META}
+        environ.update({
+            "REQUEST_METHOD": method,
+            "PATH_INFO": url.path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": url.query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_ACCEPT": "application/json",
+            "wsgi.input": BytesIO(body),
+        })
+        environ.setdefault("SERVER_NAME", "localhost")
+        environ.setdefault("SERVER_PORT", "80")
+        environ.setdefault("wsgi.url_scheme", "https" if request.is_secure() else "http")
+        subrequest = WSGIRequest(environ)
+
+        try:
+            resolve(url.path)
+        except Resolver404:
+            return {"id": sub.get("id"), "status": 404, "body": {"detail": "Not found."}}
+
+        try:
+            # renders the response; view errors come back as 4xx/5xx responses
+            response = _get_handler().get_response(subrequest)
+        except Exception:
+            logger.exception("batched %s %s failed", method, url.path)
+            return self._crashed(sub)
+        try:
+            if response.streaming:
+                return {
+                    "id": sub.get("id"),
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "body": {"detail": f"{url.path} streams its response and can't be batched"},
+                }
+            content = response.content
+        finally:
+            response.close()
+        if response.get("Content-Type", "").startswith("application/json") and content:
+            payload = json.loads(content)
+        elif response.status_code >= 500:
+            return self._crashed(sub)  # Django's HTML error page
+        else:
+            payload = content.decode(response.charset or "utf-8", "replace")
+        return {"id": sub.get("id"), "status": response.status_code, "body": payload}
+
+    def _crashed(self, sub):
+        return {
+            "id": sub.get("id"),
+            "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+            "body": {"detail": "Internal server error"},
+        }
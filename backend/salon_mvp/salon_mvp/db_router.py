@@ -0,0 +1,203 @@
+"""
+Read replicas with read-your-writes.
+
+Every alias in DATABASES other than ``default`` is a read replica.
+ReplicaRoutingMiddleware picks one healthy replica for each GET/HEAD/
+OPTIONS request and ReplicaRouter sends that request's reads to it;
+everything else, and any read after the request has written, goes to
+``default``.
+
+After a user writes, their reads stay on the primary for
+DB_READ_YOUR_WRITES_SECONDS so they see their own booking straight away.
+The pin is kept in the shared cache (settings.CACHES) under the JWT's
+user id, so every worker sees it, and in a cookie for clients without a
+token. The frontend calls the API cross-site with credentials, which
+only carries SameSite=None cookies, and those must be Secure.
+
+Replicas are checked at most every DB_REPLICA_CHECK_INTERVAL seconds per
+process and skipped while they are unreachable or more than
+DB_REPLICA_MAX_LAG_SECONDS behind.
+
+Locally, point DATABASE_REPLICAS at a copy of the SQLite file and
+refresh it by hand to simulate replication:
+
+    sqlite3 db.sqlite3 ".backup replica.sqlite3"
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = "db_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@dataclass
+class _Routing:
+    read: str = DEFAULT_DB_ALIAS
+    wrote: bool = False
+
+
+_routing = ContextVar("db_routing", default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def _is_cache_table(model):
+    # DatabaseCache asks the router too; the cache lives on the primary
+    # only, and filling it on a GET isn't a write that should pin anyone
+    return model._meta.app_label == "django_cache"
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or _is_cache_table(model):
+            return DEFAULT_DB_ALIAS
+        return state.read
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state and not _is_cache_table(model):
+            # read-your-writes within the request too
+            state.read = DEFAULT_DB_ALIAS
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+# -------------------------------------------------------------------
+# Replica health
+# -------------------------------------------------------------------
+
+_health = {}  # alias -> (healthy, checked_at)
+_health_lock = threading.Lock()
+
+
+def replica_lag(alias):
+    """
+    Seconds ``alias`` is behind the primary. On PostgreSQL that is the
+    replay delay; elsewhere it is how far the newest booking write on the
+    replica trails the one on the primary.
+    """
+    conn = connections[alias]
+    if conn.vendor == "postgresql":
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            return float(cursor.fetchone()[0] or 0)
+
+    from bookings.models import Booking
+
+    newest = Booking.objects.using(DEFAULT_DB_ALIAS).aggregate(at=Max("updated_at"))["at"]
+    seen = Booking.objects.using(alias).aggregate(at=Max("updated_at"))["at"]
+    if newest is None or (seen is not None and seen >= newest):
+        return 0.0
+    if seen is None:
+        return float("inf")
+    return (newest - seen).total_seconds()
+
+
+def _check(alias):
+    try:
+        lag = replica_lag(alias)
+    except Exception:
+        logger.warning("replica %s is unreachable", alias, exc_info=True)
+        connections[alias].close()
+        return False
+    if lag > settings.DB_REPLICA_MAX_LAG_SECONDS:
+        logger.warning("replica %s is %.1fs behind, skipping it", alias, lag)
+        return False
+    return True
+
+
+def healthy_replicas():
+    """Replicas currently usable for reads, re-checking stale results."""
+    now = time.monotonic()
+    healthy = []
+    for alias in replica_aliases():
+        ok, checked_at = _health.get(alias, (False, None))
+        if checked_at is None or now - checked_at >= settings.DB_REPLICA_CHECK_INTERVAL:
+            with _health_lock:
+                ok, checked_at = _health.get(alias, (False, None))
+                if checked_at is None or now - checked_at >= settings.DB_REPLICA_CHECK_INTERVAL:
+                    ok = _check(alias)
+                    _health[alias] = (ok, now)
+        if ok:
+            healthy.append(alias)
+    return healthy
+
+
+# -------------------------------------------------------------------
+# Request routing
+# -------------------------------------------------------------------
+
+def token_user_id(request):
+    """User id from a valid Bearer token, without a database query."""
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not header.startswith("Bearer "):
+        return None
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        return AccessToken(header.split(" ", 1)[1])[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+
+def _pin_key(user_id):
+    return f"db-pin:{user_id}"
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        user_id = token_user_id(request)
+        pinned = PIN_COOKIE in request.COOKIES or (
+            user_id is not None and cache.get(_pin_key(user_id)) is not None
+        )
+        state = _Routing()
+        if request.method in SAFE_METHODS and not pinned:
+            replicas = healthy_replicas()
+            if replicas:
+                state.read = random.choice(replicas)
+
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if state.wrote or request.method not in SAFE_METHODS:
+            window = settings.DB_READ_YOUR_WRITES_SECONDS
+            if user_id is not None:
+                cache.set(_pin_key(user_id), 1, window)
+            response.set_cookie(PIN_COOKIE, "1", max_age=window, httponly=True,
+                                samesite="None", secure=True)
+        return response
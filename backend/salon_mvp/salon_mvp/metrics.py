@@ -0,0 +1,406 @@
+"""
+Process-safe metrics with a Prometheus text endpoint.
+
+Each process keeps its values in a memory-mapped file of float64 slots,
+``metrics-<pid>.db`` in METRICS_DIR, with ``metrics-<pid>.keys`` naming
+the series in each slot. Recording only appends a tuple to an in-memory
+deque (atomic under the GIL, no lock, no I/O), well under a microsecond;
+a flusher thread adds the backlog into the file every
+METRICS_FLUSH_INTERVAL seconds. GET /metrics reads
+every process's files and sums them, so with several gunicorn workers a
+scrape sees the whole server no matter which worker answers. When a
+worker exits, the master folds its values into ``metrics-archive.*`` and
+deletes its files (archive_process(), from gunicorn's child_exit), so
+recycled workers neither lose their counts nor pile up files. The
+directory is emptied with clear_files() as the server starts.
+
+    BOOKING_ADMISSIONS.labels("accepted").inc()
+    REQUEST_LATENCY.labels(view, "GET", "2xx").observe(0.012)
+"""
+import json
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows; no gunicorn there either
+    fcntl = None
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from .profiling import view_name
+
+MAX_SLOTS = 16384  # float64 slots per process (128 KiB)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()  # slot allocation and flushing, never recording
+_registry = {}
+_pending = deque()  # (slot, amount) or (bucket slot, sum slot, value)
+
+
+class _Store:
+    """This process's value file and slot allocator, opened on first use."""
+
+    def __init__(self):
+        self.values = None
+        self.next_slot = 0
+        self._keys = None
+
+    def _open(self):
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        pid = os.getpid()
+        with open(directory / f"metrics-{pid}.db", "w+b") as fh:
+            fh.truncate(MAX_SLOTS * 8)
+            self._mmap = mmap.mmap(fh.fileno(), MAX_SLOTS * 8)
+        self.values = memoryview(self._mmap).cast("d")
+        self._keys = open(directory / f"metrics-{pid}.keys", "w")
+        self.next_slot = 0
+        threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+
+    def allocate(self, name, labels, width):
+        """First slot of ``width`` new slots for a series (call with _lock held)."""
+        if self.values is None:
+            self._open()
+        if self.next_slot + width > MAX_SLOTS:
+            raise RuntimeError("metrics store is full; raise MAX_SLOTS")
+        slot = self.next_slot
+        self.next_slot += width
+        self._keys.write(json.dumps([slot, name, list(labels)]) + "\n")
+        self._keys.flush()
+        return slot
+
+
+_store = _Store()
+
+
+def flush():
+    """Add everything recorded so far into this process's file."""
+    with _lock:
+        values = _store.values
+        while values is not None:
+            try:
+                item = _pending.popleft()
+            except IndexError:
+                return
+            if len(item) == 2:
+                values[item[0]] += item[1]
+            else:
+                bucket, sum_slot, value = item
+                values[bucket] += 1
+                values[sum_slot] += value
+                values[sum_slot + 1] += 1
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+def _after_fork():
+    # a forked worker gets its own files; drop the parent's slots and backlog
+    global _store, _lock
+    _store = _Store()
+    _lock = threading.Lock()
+    _pending.clear()
+    for metric in _registry.values():
+        metric._children.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class _CounterChild:
+    __slots__ = ("slot",)
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def inc(self, amount=1):
+        _pending.append((self.slot, amount))
+
+
+class _HistogramChild:
+    __slots__ = ("slot", "bounds", "sum_slot")
+
+    def __init__(self, slot, bounds):
+        self.slot = slot
+        self.bounds = bounds
+        # layout: one slot per bucket (+Inf last), then sum, then count
+        self.sum_slot = slot + len(bounds) + 1
+
+    def observe(self, value):
+        _pending.append((self.slot + bisect_left(self.bounds, value), self.sum_slot, value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _registry[name] = self
+
+    @property
+    def width(self):
+        return 1
+
+    def _child(self, slot):
+        return _CounterChild(slot)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with _lock:
+                child = self._children.get(values)
+                if child is None:
+                    slot = _store.allocate(self.name, values, self.width)
+                    child = self._children[values] = self._child(slot)
+        return child
+
+    def samples(self, labels, values):
+        yield self.name, labels, values[0]
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    @property
+    def width(self):
+        return len(self.bounds) + 3
+
+    def _child(self, slot):
+        return _HistogramChild(slot, self.bounds)
+
+    def samples(self, labels, values):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), values):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{self.name}_bucket", labels + (("le", le),), cumulative
+        yield f"{self.name}_sum", labels, values[-2]
+        yield f"{self.name}_count", labels, values[-1]
+
+
+# -------------------------------------------------------------------
+# The app's metrics
+# -------------------------------------------------------------------
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by view action.",
+    ["view", "method", "status"],
+)
+DB_TIME = Histogram(
+    "db_time_seconds", "Time spent in database queries per request.", ["view"],
+)
+DB_QUERIES = Counter("db_queries_total", "Database queries run.", ["view"])
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Lookups in application caches.", ["cache", "result"],
+)
+BOOKING_ADMISSIONS = Counter(
+    "booking_admissions_total", "Booking admission checks by outcome.", ["outcome"],
+)
+IDEMPOTENT_RETRIES = Counter(
+    "idempotent_retries_total",
+    "Requests answered from an earlier attempt with the same Idempotency-Key.",
+    ["scope", "result"],
+)
+PAYMENT_TRANSITIONS = Counter(
+    "payment_transitions_total", "Payment status changes.", ["from", "to"],
+)
+WORKER_STARTUP = Histogram(
+    "worker_startup_seconds", "Time from fork until a web worker takes traffic.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+# -------------------------------------------------------------------
+# Collection and exposition
+# -------------------------------------------------------------------
+
+@contextmanager
+def _files_locked(exclusive=False):
+    """Readers share the directory; archiving an exited process excludes them."""
+    if fcntl is None:
+        yield
+        return
+    directory = Path(settings.METRICS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "metrics.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read(keys_path):
+    """(values, [(slot, name, labels), ...]) of one process's files."""
+    with open(keys_path.with_suffix(".db"), "rb") as fh:
+        values = array("d", fh.read())
+    with open(keys_path) as fh:
+        lines = fh.readlines()
+    series = []
+    for line in lines:
+        try:
+            slot, name, labels = json.loads(line)
+        except ValueError:
+            continue  # a half-written last line
+        metric = _registry.get(name)
+        if metric is not None and slot + metric.width <= len(values):
+            series.append((slot, name, tuple(labels)))
+    return values, series
+
+
+def collect():
+    """{(name, labels): [summed slot values]} across every process's files."""
+    flush()
+    totals = {}
+    with _files_locked():
+        for keys_path in Path(settings.METRICS_DIR).glob("metrics-*.keys"):
+            try:
+                values, series = _read(keys_path)
+            except FileNotFoundError:
+                continue
+            for slot, name, labels in series:
+                slot_values = values[slot:slot + _registry[name].width]
+                key = (name, labels)
+                if key in totals:
+                    totals[key] = [a + b for a, b in zip(totals[key], slot_values)]
+                else:
+                    totals[key] = list(slot_values)
+    return totals
+
+
+def archive_process(pid):
+    """Fold exited process ``pid``'s values into the archive files and delete its own."""
+    directory = Path(settings.METRICS_DIR)
+    keys_path = directory / f"metrics-{pid}.keys"
+    archive_path = directory / "metrics-archive.keys"
+    with _files_locked(exclusive=True):
+        try:
+            values, series = _read(keys_path)
+        except FileNotFoundError:
+            return
+        try:
+            archived, archived_series = _read(archive_path)
+        except FileNotFoundError:
+            archived, archived_series = array("d"), []
+        slots = {(name, labels): slot for slot, name, labels in archived_series}
+        for slot, name, labels in series:
+            width = _registry[name].width
+            start = slots.get((name, labels))
+            if start is None:
+                start = slots[(name, labels)] = len(archived)
+                archived.extend([0.0] * width)
+            for offset in range(width):
+                archived[start + offset] += values[slot + offset]
+
+        for path, content in (
+            (archive_path.with_suffix(".db"), archived.tobytes()),
+            (archive_path, "".join(
+                json.dumps([slot, name, list(labels)]) + "\n"
+                for (name, labels), slot in slots.items()
+            ).encode()),
+        ):
+            partial = path.with_name(path.name + ".tmp")
+            partial.write_bytes(content)
+            os.replace(partial, path)
+        keys_path.unlink(missing_ok=True)
+        keys_path.with_suffix(".db").unlink(missing_ok=True)
+
+
+def clear_files():
+    """Delete every process's files; only while no process is recording."""
+    for path in Path(settings.METRICS_DIR).glob("metrics-*"):
+        path.unlink(missing_ok=True)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def exposition():
+    by_metric = {}
+    for (name, labels), values in collect().items():
+        by_metric.setdefault(name, []).append((labels, values))
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for labels, values in sorted(by_metric.get(name, ())):
+            for sample, pairs, value in metric.samples(
+                tuple(zip(metric.labelnames, labels)), values
+            ):
+                rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+                lines.append(f"{sample}{{{rendered}}} {_number(value)}" if rendered
+                             else f"{sample} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    GET /metrics in Prometheus text format with "Authorization: Bearer
+    <METRICS_TOKEN>". Without a token configured it is a 404 unless
+    METRICS_PUBLIC is set; DEBUG alone doesn't expose it.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.METRICS_PUBLIC:
+            return HttpResponse(status=404)
+    elif request.META.get("HTTP_AUTHORIZATION") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class MetricsMiddleware:
+    """Latency, DB time and query count per view action."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db = [0.0, 0]
+
+        def timed(execute, sql, params, many, context):
+            began = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db[0] += time.perf_counter() - began
+                db[1] += 1
+
+        began = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(timed))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - began
+
+        view = view_name(request)
+        REQUEST_LATENCY.labels(
+            view, request.method, f"{response.status_code // 100}xx"
+        ).observe(elapsed)
+        DB_TIME.labels(view).observe(db[0])
+        DB_QUERIES.labels(view).inc(db[1])
+        return response
@@ -0,0 +1,46 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using="default"):
+    """
+    Cheap approximate row count for ``model``'s table, or None if the
+    backend has nothing better than COUNT(*).
+
+    SQLite has no maintained row estimate (MAX(rowid) overshoots once rows
+    are deleted or archived, leaving runs of empty admin pages), so it
+    always gets an exact count.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        # planner statistics, refreshed by (auto)vacuum/analyze
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator that skips COUNT(*) for an unfiltered changelist of a
+    big table and uses the table estimate instead. Filtered and searched
+    lists (and small tables) still get an exact count.
+    """
+
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, "query") and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
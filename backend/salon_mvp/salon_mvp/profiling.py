@@ -0,0 +1,295 @@
+"""
+Opt-in sampling profiler for live requests.
+
+A request is profiled when a staff user sends ``X-Profile: 1`` or when it
+is picked at random with probability PROFILING_SAMPLE_RATE. While it
+runs, one shared sampler thread reads the request thread's stack every
+PROFILING_INTERVAL seconds through sys._current_frames(); requests that
+aren't profiled pay nothing beyond a random() call.
+
+Samples are kept per view (``BookingViewSet.availability``,
+``PaymentViewSet.update``, ...) as collapsed stacks - one
+``view;outer;...;inner count`` line per distinct stack, the input
+format of flamegraph.pl and speedscope. Each process appends to its own
+file in PROFILING_DIR, and GET /api/profiles/ (staff only) merges them.
+
+A file that grows past PROFILING_MAX_BYTES is compacted in place: equal
+stacks are summed, and if that isn't enough the rarest stacks are
+dropped until it is half the cap. Files of exited processes are folded
+into profile-archive.folded (gunicorn.conf.py, as for metrics), so
+restarts and recycled workers don't leave a file per pid behind.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, nothing to coordinate
+    fcntl = None
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .db_router import token_user_id
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+
+
+def collapse(frame):
+    """Root-first ``module:function`` names of ``frame``'s stack joined with ';'."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    One daemon thread sampling every registered thread's stack. It only
+    runs while at least one request is being profiled.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}  # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        samples = Counter()
+        with self._lock:
+            self._active[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for thread_id, samples in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[collapse(frame)] += 1
+
+
+_sampler = None
+_write_lock = threading.Lock()
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = StackSampler(settings.PROFILING_INTERVAL)
+    return _sampler
+
+
+def view_name(request):
+    """``ViewClass.action`` for the resolved view, or the function's name."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    func = match.func
+    view_class = getattr(func, "cls", None) or getattr(func, "view_class", None)
+    if view_class is None:
+        return f"{func.__module__}.{func.__qualname__}"
+    actions = getattr(func, "actions", None) or {}
+    return f"{view_class.__name__}.{actions.get(request.method.lower(), request.method.lower())}"
+
+
+def profile_dir():
+    path = Path(settings.PROFILING_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+ARCHIVE_NAME = "profile-archive.folded"
+
+
+@contextmanager
+def _files_locked(exclusive=False):
+    """Readers share the directory; archiving an exited process excludes them."""
+    if fcntl is None:
+        yield
+        return
+    with open(profile_dir() / "profile.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read(path, view=None):
+    totals = Counter()
+    with open(path) as fh:
+        for line in fh:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and (view is None or stack.split(";", 1)[0] == view):
+                totals[stack] += int(count)
+    return totals
+
+
+def _write(path, totals, max_bytes):
+    """Replace ``path`` with ``totals``, heaviest stacks first, within ``max_bytes``."""
+    size, lines = 0, []
+    for stack, count in totals.most_common():
+        line = f"{stack} {count}\n"
+        size += len(line.encode())
+        if size > max_bytes:
+            break
+        lines.append(line)
+    partial = path.with_name(f".{path.name}.tmp")
+    partial.write_text("".join(lines))
+    os.replace(partial, path)
+
+
+def record(view, samples):
+    """Append one request's samples to this process's file, compacting it past the cap."""
+    if not samples:
+        return
+    lines = "".join(f"{view};{stack} {count}\n" for stack, count in samples.items())
+    path = profile_dir() / f"profile-{os.getpid()}.folded"
+    with _write_lock:
+        with open(path, "a") as fh:
+            fh.write(lines)
+            size = fh.tell()
+        if size > settings.PROFILING_MAX_BYTES:
+            _write(path, _read(path), settings.PROFILING_MAX_BYTES // 2)
+
+
+def archive_process(pid):
+    """Fold exited process ``pid``'s file into the archive file and delete it."""
+    directory = profile_dir()
+    path = directory / f"profile-{pid}.folded"
+    archive_path = directory / ARCHIVE_NAME
+    with _files_locked(exclusive=True):
+        try:
+            totals = _read(path)
+        except FileNotFoundError:
+            return
+        if archive_path.exists():
+            totals.update(_read(archive_path))
+        _write(archive_path, totals, settings.PROFILING_MAX_BYTES)
+        path.unlink()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # someone else's process
+        pass
+    return True
+
+
+def archive_exited():
+    """Archive the files of every process that is no longer running."""
+    for path in profile_dir().glob("profile-*.folded"):
+        pid = path.stem.partition("-")[2]
+        if pid.isdigit() and not _alive(int(pid)):
+            archive_process(int(pid))
+
+
+def merged_profiles(view=None):
+    """Collapsed stacks from every process, summed; optionally one view's only."""
+    totals = Counter()
+    with _files_locked():
+        for path in profile_dir().glob("profile-*.folded"):
+            try:
+                totals.update(_read(path, view))
+            except FileNotFoundError:  # compacted or archived meanwhile
+                continue
+    return totals
+
+
+def _is_staff(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    user_id = token_user_id(request)
+    if user_id is None:
+        return False
+    from users.models import User
+
+    return User.objects.filter(pk=user_id, is_staff=True, is_active=True).exists()
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wanted = request.META.get(PROFILE_HEADER) == "1" and _is_staff(request)
+        if not wanted and not (
+            settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+
+        sampler = get_sampler()
+        thread_id = threading.get_ident()
+        sampler.start(thread_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            samples = sampler.stop(thread_id)
+            record(view_name(request), samples)
+        response["X-Profile-Samples"] = str(sum(samples.values()))
+        return response
+
+
+class ProfileView(APIView):
+    """
+    GET /api/profiles/[?view=BookingViewSet.availability]
+        collapsed stacks, text/plain, ready for flamegraph.pl
+    GET /api/profiles/?summary=1
+        samples per view
+    DELETE /api/profiles/
+        start over
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        totals = merged_profiles(request.query_params.get("view"))
+        if request.query_params.get("summary"):
+            per_view = Counter()
+            for stack, count in totals.items():
+                per_view[stack.split(";", 1)[0]] += count
+            return Response(dict(per_view.most_common()))
+        body = "".join(f"{stack} {count}\n" for stack, count in sorted(totals.items()))
+        response = HttpResponse(body, content_type="text/plain; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="profile.folded"'
+        return response
+
+    def delete(self, request):
+        with _files_locked(exclusive=True):
+            for path in profile_dir().glob("profile-*.folded"):
+                path.unlink(missing_ok=True)
+        return Response(status=204)
@@ -3,6 +3,8 @@ Django settings for salon_mvp project.
 """
 
 import os
+import tempfile
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 
@@ -41,6 +43,8 @@ INSTALLED_APPS = [
     "salons",
     "bookings",
     "payments",
+    "jobs",
+    "idempotency",
 
     # Third-party
     "rest_framework",
@@ -48,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "salon_mvp.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # must be high in the list
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # For static files in production
@@ -55,6 +60,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "salon_mvp.profiling.ProfilingMiddleware",
+    "salon_mvp.db_router.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -83,9 +90,33 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # keep connections between requests (opened up front by
+        # salon_mvp/warmup.py); 0 closes them after every request
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Shared cache. Salon version stamps, cached salon pages and the replica
+# pin must be seen by every worker process, so not the per-process
+# LocMemCache: Redis when REDIS_URL is set (needs the redis package),
+# otherwise a database table (created by salons migration 0009)
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "salon_mvp_cache",
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -121,6 +152,19 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # orjson first, so it's the default for Accept: */* and application/json;
+    # application/msgpack when the msgpack package is installed
+    "DEFAULT_RENDERER_CLASSES": [
+        "salon_mvp.renderers.ORJSONRenderer",
+        *(["salon_mvp.renderers.MessagePackRenderer"] if find_spec("msgpack") else []),
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "salon_mvp.renderers.ORJSONParser",
+        *(["salon_mvp.renderers.MessagePackParser"] if find_spec("msgpack") else []),
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 # JWT config
@@ -161,4 +205,116 @@ CORS_ALLOWED_ORIGIN_REGEXES = [
 
 # Allow credentials for authentication
 CORS_ALLOW_CREDENTIALS = True
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
\ No newline at end of file
+STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# Booking sweeper: seconds between in-process sweeps (0 = off; use
+# `manage.py sweep_bookings` from cron instead) and how long after a
+# booking ends before it is auto-completed
+BOOKING_SWEEPER_INTERVAL = int(os.environ.get("BOOKING_SWEEPER_INTERVAL", "0"))
+BOOKING_SWEEP_GRACE_MINUTES = int(os.environ.get("BOOKING_SWEEP_GRACE_MINUTES", "60"))
+
+# Background job queue (see jobs/queue.py, `manage.py run_jobs`)
+JOBS_RETRY_BASE_SECONDS = 10
+JOBS_RETRY_MAX_SECONDS = 3600
+JOBS_LOCK_TIMEOUT = 300  # running jobs older than this are reclaimed
+
+# Live slot events for the SSE stream: InProcessBackend for a single
+# process; DatabaseBackend or PostgresNotifyBackend when running several
+# (gunicorn.conf.py sets DatabaseBackend unless told otherwise)
+BOOKING_EVENTS_BACKEND = os.environ.get(
+    "BOOKING_EVENTS_BACKEND", "bookings.events.InProcessBackend"
+)
+# Under WSGI each open stream holds a request thread: at most this many
+# per process, each closed after BOOKING_STREAM_MAX_SECONDS (the browser
+# reconnects)
+BOOKING_STREAM_MAX_THREADS = int(os.environ.get("BOOKING_STREAM_MAX_THREADS", "2"))
+BOOKING_STREAM_MAX_SECONDS = 300
+
+# Delta sync: how long tombstones for deleted bookings/payments are kept;
+# older sync cursors must do a full resync
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# POST /api/batch/ limits
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_CONCURRENCY = 4  # reads run in parallel, up to this many
+BATCH_TIME_BUDGET = 10  # seconds for the whole batch
+
+# Read replicas (see salon_mvp/db_router.py). DATABASE_REPLICAS is a
+# comma-separated list of SQLite files kept in step with the primary;
+# safe requests read from them, writes and recent writers use "default"
+for _index, _path in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICAS", "").split(",")), start=1
+):
+    DATABASES[f"replica{_index}"] = {
+        **DATABASES["default"],
+        "NAME": _path.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["salon_mvp.db_router.ReplicaRouter"]
+DB_READ_YOUR_WRITES_SECONDS = int(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", "5"))
+DB_REPLICA_MAX_LAG_SECONDS = int(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+DB_REPLICA_CHECK_INTERVAL = 5  # seconds between health checks per process
+
+# Finished bookings older than this are moved to the archive tables by
+# `manage.py archive_bookings` (run it from cron)
+BOOKING_ARCHIVE_AFTER_DAYS = int(os.environ.get("BOOKING_ARCHIVE_AFTER_DAYS", "90"))
+
+# Idempotency-Key on booking/payment creation (see idempotency/decorators.py)
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_WAIT_SECONDS = 5  # how long a duplicate waits for the first request
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # an in-progress key older than this can be taken over
+
+# Sampling profiler (see salon_mvp/profiling.py): staff can send
+# "X-Profile: 1"; PROFILING_SAMPLE_RATE profiles that share of all requests
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_DIR = os.environ.get(
+    "PROFILING_DIR", os.path.join(tempfile.gettempdir(), "salon_mvp_profiles")
+)
+# per process file; compacted past this size, exited processes' files
+# are folded into one archive file
+PROFILING_MAX_BYTES = int(os.environ.get("PROFILING_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Metrics (see salon_mvp/metrics.py): per-process value files for
+# /metrics, emptied by gunicorn.conf.py on start. Scrapes need
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token /metrics is
+# a 404 unless METRICS_PUBLIC=True opts in to serving it to anyone
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "salon_mvp_metrics")
+)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "False") == "True"
+METRICS_FLUSH_INTERVAL = 1  # seconds; how stale another worker's numbers can be
+
+# Card gateway (see payments/gateway.py). Charges are sent from the job
+# worker; results come back on POST /api/payments/webhook/ signed with
+# PAYMENT_WEBHOOK_SECRET. `manage.py stub_gateway` serves the default URL
+PAYMENT_GATEWAY_URL = os.environ.get("PAYMENT_GATEWAY_URL", "http://127.0.0.1:8765")
+PAYMENT_GATEWAY_KEY = os.environ.get("PAYMENT_GATEWAY_KEY", "")
+PAYMENT_WEBHOOK_SECRET = os.environ.get("PAYMENT_WEBHOOK_SECRET", "")
+PAYMENT_WEBHOOK_TOLERANCE = 300  # seconds a signed timestamp stays valid
+PAYMENT_CURRENCY = os.environ.get("PAYMENT_CURRENCY", "USD")
+PAYMENT_GATEWAY_TIMEOUT = 10  # seconds per charge call
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = 3
+PAYMENT_GATEWAY_MAX_CONNECTIONS = 20  # pooled connections per batch
+PAYMENT_GATEWAY_MAX_ATTEMPTS = 5  # per charge, then the payment fails
+# a card payment still "processing" this long (seconds) is failed by the
+# booking sweeper, and its owner may settle it by hand
+PAYMENT_PROCESSING_TIMEOUT = int(os.environ.get("PAYMENT_PROCESSING_TIMEOUT", str(6 * 3600)))
+
+# Travel between home visits (see bookings/travel.py): straight-line
+# distance at this speed plus a fixed buffer, capped
+HOME_SERVICE_SPEED_KMH = float(os.environ.get("HOME_SERVICE_SPEED_KMH", "25"))
+HOME_SERVICE_BUFFER_MINUTES = 10
+HOME_SERVICE_MAX_TRAVEL_MINUTES = 120
+
+# Waitlist (see bookings/waitlist.py)
+WAITLIST_MAX_WINDOW_DAYS = 7  # longest earliest..latest window an entry may ask for
+WAITLIST_BACKFILL_CANDIDATES = 20  # entries tried per freed interval
+
+# Process-local LRU of Salon/Service instances (see salons/catalog.py)
+CATALOG_CACHE_SIZE = 4096
+CATALOG_CACHE_TTL = 60  # seconds; a backstop, changes normally invalidate at once
+# seconds a process trusts the catalog stamp it last read (one cache query);
+# how long other workers can serve a changed salon's old services
+CATALOG_VERSION_CHECK_INTERVAL = 5
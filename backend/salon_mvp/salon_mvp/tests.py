@@ -0,0 +1,416 @@
+import io
+import os
+import tempfile
+import threading
+import time as clock
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import get_resolver
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings import stream
+from bookings.models import Booking
+from salons import catalog
+from salons.models import Salon, Service
+from salons.views import SalonViewSet
+from users.models import User
+from . import db_router, profiling, warmup
+from .db_router import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from .metrics import collect
+from .renderers import (
+    MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer, msgpack,
+)
+
+
+def request_count(view, method="GET", status="2xx"):
+    values = collect().get(("http_request_duration_seconds", (view, method, status)))
+    return values[-1] if values else 0
+
+
+class BatchTests(TransactionTestCase):
+    # reads run on pool threads with their own connections, which only
+    # see committed rows
+    url = "/api/batch/"
+
+    def setUp(self):
+        cache.clear()
+        catalog.clear()
+        self.customer = User.objects.create_user("customer", password="x", role="customer")
+        owner = User.objects.create_user("owner", password="x", role="salon_owner")
+        self.salon = Salon.objects.create(
+            owner=owner, name="Salon", open_time=time(10), close_time=time(18)
+        )
+        self.service = Service.objects.create(
+            salon=self.salon, name="Cut", duration_minutes=30, price="10.00"
+        )
+        self.day = timezone.localdate() + timedelta(days=7)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.customer)}")
+
+    def batch(self, *requests):
+        response = self.client.post(self.url, {"requests": list(requests)}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["responses"]
+
+    def create(self, hour=10):
+        return {
+            "id": f"create-{hour}",
+            "method": "POST",
+            "path": "/api/bookings/bookings/",
+            "body": {
+                "salon_id": self.salon.pk,
+                "service_id": self.service.pk,
+                "start_time": f"{self.day.isoformat()}T{hour}:00:00",
+            },
+        }
+
+    def test_reads_after_a_write_see_it(self):
+        created, listed, salon = self.batch(
+            self.create(),
+            {"id": "mine", "path": "/api/bookings/bookings/"},
+            {"path": f"/api/salons/salons/{self.salon.pk}/"},
+        )
+        self.assertEqual((created["id"], created["status"]), ("create-10", 201))
+        self.assertEqual([b["id"] for b in listed["body"]], [created["body"]["id"]])
+        self.assertEqual(salon["body"]["name"], "Salon")
+
+    def test_sub_requests_go_through_the_middleware(self):
+        before = request_count("SalonViewSet.list")
+        # a plain Django view needs request.user from AuthenticationMiddleware
+        admin, _ = self.batch(
+            {"path": "/admin/login/"}, {"path": "/api/salons/salons/"},
+        )
+        self.assertEqual(admin["status"], 200)
+        self.assertIn("<form", admin["body"])
+        self.assertEqual(request_count("SalonViewSet.list"), before + 1)
+
+    def test_a_crash_is_contained(self):
+        # the test client would re-raise the logged sub-request error
+        self.client.raise_request_exception = False
+        with mock.patch.object(SalonViewSet, "list", side_effect=RuntimeError("boom")):
+            crashed, created = self.batch(
+                {"path": "/api/salons/salons/"}, self.create(),
+            )
+        self.assertEqual(crashed["status"], 500)
+        self.assertEqual(crashed["body"], {"detail": "Internal server error"})
+        self.assertEqual(created["status"], 201)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_unknown_paths_and_streams(self):
+        missing, streamed = self.batch(
+            {"path": "/api/nowhere/"},
+            {"path": f"/api/bookings/stream/{self.salon.pk}/?date={self.day.isoformat()}"},
+        )
+        self.assertEqual(missing["status"], 404)
+        self.assertEqual(streamed["status"], 400)
+        self.assertEqual(stream._open_streams, 0)  # its thread slot was given back
+
+    def test_bad_batches_are_refused(self):
+        for body in (
+            {"requests": []},
+            {"requests": [{"path": "/api/batch/", "method": "POST"}]},
+            {"requests": [{"path": "/api/salons/salons/", "method": "TRACE"}]},
+            {"requests": [{"path": "/api/salons/salons/"}] * 21},
+        ):
+            with self.subTest(body=str(body)[:60]):
+                self.assertEqual(self.client.post(self.url, body, format="json").status_code, 400)
+
+    @override_settings(BATCH_TIME_BUDGET=0)
+    def test_nothing_runs_past_the_budget(self):
+        read, write = self.batch({"path": "/api/salons/salons/"}, self.create())
+        self.assertEqual((read["status"], write["status"]), (504, 504))
+        self.assertFalse(Booking.objects.exists())
+
+
+@override_settings(DB_READ_YOUR_WRITES_SECONDS=30, DB_REPLICA_CHECK_INTERVAL=60,
+                   DB_REPLICA_MAX_LAG_SECONDS=10)
+class ReplicaRoutingTests(TestCase):
+    # the test settings have no replica; pretend "replica1" is one and
+    # look at where the router would send each request's reads
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user("customer", password="x", role="customer")
+        self.token = f"Bearer {AccessToken.for_user(self.user)}"
+        for target, value in (("replica_aliases", ["replica1"]), ("healthy_replicas", ["replica1"])):
+            patcher = mock.patch.object(db_router, target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def call(self, method="get", write=False, **extra):
+        seen = {}
+
+        def view(request):
+            router = ReplicaRouter()
+            seen["before"] = router.db_for_read(Booking)
+            if write:
+                router.db_for_write(Booking)
+            seen["after"] = router.db_for_read(Booking)
+            return HttpResponse()
+
+        request = getattr(self.factory, method)("/api/bookings/bookings/", **extra)
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_safe_reads_go_to_a_replica(self):
+        seen, response = self.call()
+        self.assertEqual(seen, {"before": "replica1", "after": "replica1"})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        # outside a request everything stays on the primary
+        self.assertEqual(ReplicaRouter().db_for_read(Booking), "default")
+
+    def test_a_write_pins_the_token_user(self):
+        seen, response = self.call("post", HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(seen["before"], "default")
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual((cookie["samesite"], cookie["secure"], cookie["max-age"]), ("None", True, 30))
+
+        # another worker, no cookie: the shared cache still pins them
+        seen, _ = self.call(HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(seen["before"], "default")
+        # other users are not affected
+        self.assertEqual(self.call()[0]["before"], "replica1")
+
+    def test_a_cookie_pins_anonymous_clients(self):
+        self.factory.cookies[PIN_COOKIE] = "1"
+        self.assertEqual(self.call()[0]["before"], "default")
+
+    def test_write_inside_a_get_moves_its_reads(self):
+        seen, response = self.call(write=True)
+        self.assertEqual(seen, {"before": "replica1", "after": "default"})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_cache_table_is_never_routed(self):
+        model = mock.Mock()
+        model._meta.app_label = "django_cache"
+        seen = {}
+
+        def view(request):
+            seen["read"] = ReplicaRouter().db_for_read(model)
+            ReplicaRouter().db_for_write(model)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(self.factory.get("/"))
+        self.assertEqual(seen["read"], "default")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(DB_REPLICA_CHECK_INTERVAL=60, DB_REPLICA_MAX_LAG_SECONDS=10)
+class ReplicaHealthTests(TestCase):
+    def setUp(self):
+        db_router._health.clear()
+        self.addCleanup(db_router._health.clear)
+        patcher = mock.patch.object(db_router, "replica_aliases", return_value=["replica1"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lagging_replica_is_skipped_and_rechecked_later(self):
+        with mock.patch.object(db_router, "replica_lag", return_value=30.0) as lag, \
+                self.assertLogs("salon_mvp.db_router", "WARNING"):
+            self.assertEqual(db_router.healthy_replicas(), [])
+            self.assertEqual(db_router.healthy_replicas(), [])
+        self.assertEqual(lag.call_count, 1)  # cached for the interval
+
+        with override_settings(DB_REPLICA_CHECK_INTERVAL=0), \
+                mock.patch.object(db_router, "replica_lag", return_value=1.0):
+            self.assertEqual(db_router.healthy_replicas(), ["replica1"])
+
+    def test_same_data_has_no_lag(self):
+        self.assertEqual(db_router.replica_lag("default"), 0.0)
+
+
+class RendererTests(TestCase):
+    data = {
+        "name": "Salon\u2028One",
+        "price": Decimal("10.50"),
+        "at": datetime(2026, 1, 2, 10, 30, tzinfo=dt_timezone.utc),
+        "day": datetime(2026, 1, 2).date(),
+        "took": timedelta(minutes=1, seconds=30),
+        "ids": (1, 2),
+        "nested": [{"ok": True, "none": None}],
+    }
+
+    def test_orjson_matches_drf(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_orjson_parser_is_strict(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(b'{"a": [1, 2.5]}')), {"a": [1, 2.5]})
+        for body in (b"{", b'{"a": NaN}', b'{"a": Infinity}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_round_trip_matches_json(self):
+        packed = MessagePackRenderer().render(self.data)
+        unpacked = MessagePackParser().parse(io.BytesIO(packed))
+        self.assertEqual(unpacked, ORJSONParser().parse(io.BytesIO(ORJSONRenderer().render(self.data))))
+        self.assertEqual(unpacked["at"], "2026-01-02T10:30:00Z")
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b"\xc1"))
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_api_speaks_msgpack(self):
+        owner = User.objects.create_user("owner", password="x", role="salon_owner")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(owner)}")
+        body = msgpack.packb({"name": "Packed", "open_time": "10:00", "close_time": "18:00"})
+        created = client.post("/api/salons/salons/", body, content_type="application/msgpack",
+                              HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(created.status_code, 201, created.content)
+        self.assertEqual(created["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(created.content)["name"], "Packed")
+
+        listed = client.get("/api/salons/salons/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual([s["name"] for s in msgpack.unpackb(listed.content)], ["Packed"])
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_warm_up_prepares_without_leaving_threads_or_connections(self):
+        threads = threading.active_count()
+        with mock.patch.object(connections, "close_all") as close_all:
+            timings = warmup.warm_up()
+
+        self.assertEqual(
+            set(timings), {"imports", "urls", "serializers", "api settings", "templates", "total"}
+        )
+        self.assertTrue(get_resolver()._populated)
+        close_all.assert_called_once()
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_every_view_serializer_is_built(self):
+        callbacks = warmup.build_urls()
+        self.assertIn(SalonViewSet, {getattr(callback, "cls", None) for callback in callbacks})
+        self.assertGreater(warmup.build_serializers(callbacks), 3)
+
+    def test_worker_connects_on_each_thread(self):
+        seen = set()
+        with mock.patch.object(type(connections["default"]), "ensure_connection",
+                               lambda conn: seen.add(threading.get_ident())), \
+                mock.patch("bookings.sweeper.start_sweeper") as start_sweeper, \
+                ThreadPoolExecutor(3) as pool:
+            steps = warmup.worker_ready(pool, 3)
+        self.assertEqual(len(seen), 3)
+        self.assertIn("connections", steps)
+        start_sweeper.assert_called_once()
+
+    def test_worker_starts_even_if_the_database_is_down(self):
+        with mock.patch.object(warmup, "open_connections", side_effect=OSError("down")), \
+                mock.patch("bookings.sweeper.start_sweeper") as start_sweeper, \
+                self.assertLogs("salon_mvp.warmup", "WARNING"):
+            warmup.worker_ready()
+        start_sweeper.assert_called_once()
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        settings = override_settings(PROFILING_DIR=self.dir, PROFILING_MAX_BYTES=10_000)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def file(self, pid=None):
+        return os.path.join(self.dir, f"profile-{pid or os.getpid()}.folded")
+
+    def test_sampler_sees_the_running_thread(self):
+        sampler = profiling.StackSampler(0.001)
+        sampler.start(threading.get_ident())
+        deadline = clock.monotonic() + 0.2
+        while clock.monotonic() < deadline:
+            pass
+        samples = sampler.stop(threading.get_ident())
+
+        self.assertTrue(samples)
+        self.assertTrue(all("test_sampler_sees_the_running_thread" in stack for stack in samples))
+        thread = sampler._thread
+        if thread is not None:
+            thread.join(1)
+        self.assertIsNone(sampler._thread)  # the sampler stops with the last request
+
+    def test_record_and_merge(self):
+        profiling.record("A.list", Counter({"x;y": 2}))
+        profiling.record("A.list", Counter({"x;y": 1, "x;z": 1}))
+        profiling.record("B.get", Counter({"x": 5}))
+        profiling.record("B.get", Counter())
+
+        self.assertEqual(profiling.merged_profiles(),
+                         {"A.list;x;y": 3, "A.list;x;z": 1, "B.get;x": 5})
+        self.assertEqual(profiling.merged_profiles("B.get"), {"B.get;x": 5})
+
+    def test_file_is_capped(self):
+        profiling.record("A.list", Counter({"hot": 10_000}))
+        for n in range(500):
+            profiling.record("A.list", Counter({f"cold;stack;{n:04d}": 1, "hot": 1}))
+
+        self.assertLessEqual(os.path.getsize(self.file()), 10_000)
+        self.assertEqual(profiling.merged_profiles()["A.list;hot"], 10_500)
+
+    def test_exited_processes_are_archived(self):
+        dead = 2 ** 22 + 1  # beyond pid_max on default kernels
+        with open(self.file(dead), "w") as fh:
+            fh.write("A.list;x 2\n")
+        profiling.record("A.list", Counter({"x": 1}))
+        profiling.archive_exited()
+        with open(self.file(dead + 1), "w") as fh:
+            fh.write("A.list;x 4\n")
+        profiling.archive_process(dead + 1)
+
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         sorted([profiling.ARCHIVE_NAME, os.path.basename(self.file()), "profile.lock"]))
+        self.assertEqual(profiling.merged_profiles(), {"A.list;x": 7})
+
+    def test_view_is_for_admins(self):
+        profiling.record("A.list", Counter({"x": 3}))
+        profiling.record("B.get", Counter({"y": 1}))
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("customer", password="x", role="customer"))
+        self.assertEqual(client.get("/api/profiles/").status_code, 403)
+        client.force_authenticate(User.objects.create_superuser("admin", password="x"))
+
+        body = client.get("/api/profiles/", {"view": "A.list"})
+        self.assertEqual(body.content, b"A.list;x 3\n")
+        self.assertEqual(client.get("/api/profiles/", {"summary": 1}).json(), {"A.list": 3, "B.get": 1})
+        self.assertEqual(client.delete("/api/profiles/").status_code, 204)
+        self.assertEqual(client.get("/api/profiles/").content, b"")
+
+    def test_staff_header_profiles_the_request(self):
+        admin = User.objects.create_superuser("admin", password="x")
+        client = APIClient()
+        client.force_login(admin)
+        response = client.get("/api/salons/salons/", HTTP_X_PROFILE="1")
+        self.assertIn("X-Profile-Samples", response)
+        self.assertNotIn("X-Profile-Samples", self.client.get("/api/salons/salons/", HTTP_X_PROFILE="1"))
+
+
+class MetricsViewTests(TestCase):
+    @override_settings(METRICS_TOKEN="", METRICS_PUBLIC=False, DEBUG=True)
+    def test_hidden_without_token_even_in_debug(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="", METRICS_PUBLIC=True)
+    def test_public_when_opted_in(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE http_request_duration_seconds", response.content)
+
+    @override_settings(METRICS_TOKEN="s3cret", METRICS_PUBLIC=True)
+    def test_token_is_required_once_set(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
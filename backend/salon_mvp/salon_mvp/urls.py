@@ -2,11 +2,18 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from .batch import BatchView
+from .metrics import metrics_view
+from .profiling import ProfileView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),       # Users / auth
     path('api/salons/', include('salons.urls')),    # Salon endpoints
     path('api/bookings/', include('bookings.urls')), # Booking endpoints
     path('api/', include('payments.urls')),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('api/profiles/', ProfileView.as_view(), name='profiles'),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
@@ -0,0 +1,173 @@
+"""
+Warm start for production workers.
+
+gunicorn.conf.py preloads the app in the master, where wsgi.py runs
+warm_up() once before any worker is forked: every app's modules are
+imported, URL patterns compiled and resolvers populated, DRF's settings
+resolved and each view's serializer fields built. Workers inherit all of
+that (copy-on-write) instead of paying for it on their first requests.
+
+Nothing that can't survive a fork is left open in the master: no
+threads, no database connections. Each worker calls worker_ready() after
+the fork, before it takes traffic. That call opens a database connection
+on every request thread and starts the booking sweeper.
+
+Steps are timed; gunicorn.conf.py logs them.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+from importlib.util import find_spec
+
+from django.apps import apps
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import URLResolver, get_resolver
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_ENV = "SALON_MVP_PRELOAD"  # set by gunicorn.conf.py
+APP_MODULES = ("models", "signals", "serializers", "views", "urls", "admin", "tasks")
+API_SETTINGS = (
+    "DEFAULT_RENDERER_CLASSES", "DEFAULT_PARSER_CLASSES",
+    "DEFAULT_AUTHENTICATION_CLASSES", "DEFAULT_PERMISSION_CLASSES",
+    "DEFAULT_PAGINATION_CLASS", "DEFAULT_CONTENT_NEGOTIATION_CLASS",
+    "DEFAULT_METADATA_CLASS", "DEFAULT_VERSIONING_CLASS", "EXCEPTION_HANDLER",
+)
+TEMPLATES = ("rest_framework/api.html",)
+
+timings = {}  # step -> seconds of the last warm_up() in this process
+
+
+def preloaded():
+    return os.environ.get(PRELOAD_ENV) == "1"
+
+
+def import_app_modules():
+    count = 0
+    for config in apps.get_app_configs():
+        for name in APP_MODULES:
+            module = f"{config.name}.{name}"
+            if find_spec(module) is not None:
+                importlib.import_module(module)
+                count += 1
+    return count
+
+
+def _walk(patterns, callbacks):
+    for pattern in patterns:
+        pattern.pattern.regex  # compiled on first access
+        if isinstance(pattern, URLResolver):
+            _walk(pattern.url_patterns, callbacks)
+        else:
+            callbacks.append(pattern.callback)
+
+
+def build_urls():
+    """Compile every URL pattern and populate the resolvers; returns the view callbacks."""
+    resolver = get_resolver()
+    callbacks = []
+    _walk(resolver.url_patterns, callbacks)
+    resolver.reverse_dict  # populates the resolver tree for reverse() and resolve()
+    return callbacks
+
+
+def _build_fields(serializer):
+    serializer = getattr(serializer, "child", serializer)  # many=True
+    for field in serializer.fields.values():
+        if isinstance(field, BaseSerializer):
+            _build_fields(field)
+
+
+def build_serializers(callbacks):
+    """Build the fields of each view's serializer once (model _meta caches, field mapping)."""
+    built = set()
+    for callback in callbacks:
+        serializer_class = getattr(getattr(callback, "cls", None), "serializer_class", None)
+        if serializer_class is None or serializer_class in built:
+            continue
+        built.add(serializer_class)
+        try:
+            _build_fields(serializer_class())
+        except Exception:
+            logger.warning("could not warm up %s", serializer_class.__name__, exc_info=True)
+    return len(built)
+
+
+def load_api_settings():
+    for name in API_SETTINGS:
+        getattr(api_settings, name)
+
+
+def load_templates():
+    for name in TEMPLATES:
+        get_template(name)
+
+
+def _timed(name, func, *args):
+    began = time.perf_counter()
+    result = func(*args)
+    timings[name] = time.perf_counter() - began
+    return result
+
+
+def warm_up():
+    """Do once, before forking, what each worker would otherwise do on its first requests."""
+    began = time.perf_counter()
+    _timed("imports", import_app_modules)
+    callbacks = _timed("urls", build_urls)
+    _timed("serializers", build_serializers, callbacks)
+    _timed("api settings", load_api_settings)
+    _timed("templates", load_templates)
+    # a forked worker must not share the master's sockets
+    connections.close_all()
+    timings["total"] = time.perf_counter() - began
+    return timings
+
+
+def open_connections(pool=None, threads=1):
+    """
+    Connect to every database on ``threads`` distinct threads of ``pool``
+    (Django connections are per thread). A barrier keeps each task on its
+    own thread until all of them have connected.
+    """
+    def connect():
+        for alias in connections:
+            connections[alias].ensure_connection()
+
+    if pool is None or threads <= 1:
+        connect()
+        return
+    barrier = threading.Barrier(threads)
+
+    def on_thread():
+        try:
+            connect()
+        finally:
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+
+    for future in [pool.submit(on_thread) for _ in range(threads)]:
+        future.result()
+
+
+def worker_ready(pool=None, threads=1):
+    """Per-worker start-up after the fork; returns {step: seconds}."""
+    from bookings.sweeper import start_sweeper
+
+    steps = {}
+    began = time.perf_counter()
+    try:
+        open_connections(pool, threads)
+    except Exception:
+        # not fatal: requests connect lazily as usual
+        logger.warning("could not open database connections", exc_info=True)
+    steps["connections"] = time.perf_counter() - began
+    start_sweeper()
+    return steps
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'salon_mvp.settings')
 
 application = get_wsgi_application()
+
+from bookings.sweeper import start_sweeper  # noqa: E402  (needs apps loaded)
+from salon_mvp.warmup import preloaded, warm_up  # noqa: E402
+
+if preloaded():
+    # gunicorn master (gunicorn.conf.py): warm up once before forking;
+    # each worker starts its own threads in post_worker_init
+    warm_up()
+else:
+    start_sweeper()
@@ -1,9 +1,9 @@
 from django.contrib import admin
-from .models import Salon, Service
+from .models import Resource, Salon, Service
 
 @admin.register(Salon)
 class SalonAdmin(admin.ModelAdmin):
-    list_display = ('name', 'owner', 'address', 'open_time', 'close_time', 'created_at')
+    list_display = ('name', 'owner', 'address', 'open_time', 'close_time', 'capacity', 'created_at')
     search_fields = ('name', 'owner__username', 'address')
     list_filter = ('open_time', 'close_time')
 
@@ -12,3 +12,10 @@ class ServiceAdmin(admin.ModelAdmin):
     list_display = ('name', 'salon', 'duration_minutes', 'price', 'is_home_service', 'created_at')
     search_fields = ('name', 'salon__name')
     list_filter = ('is_home_service',)
+
+@admin.register(Resource)
+class ResourceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'salon', 'kind', 'is_active', 'created_at')
+    search_fields = ('name', 'salon__name')
+    list_filter = ('kind', 'is_active')
+    filter_horizontal = ('services',)
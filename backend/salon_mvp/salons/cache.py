@@ -0,0 +1,53 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Everything derived from a salon (its page, availability) is cached under
+# that salon's version stamp. Writes replace the stamp, which orphans the
+# old entries instead of having to find and delete them. Stamps are
+# timestamps rather than counters so an evicted stamp can't come back as a
+# value an old entry was stored under.
+VERSION_KEY = "salon-version:{}"
+# The salon's own row, services and resources only - bookings don't
+# change it, so salons.catalog entries survive a busy day of bookings
+CATALOG_VERSION_KEY = "catalog-version:{}"
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def _bump(key_formats, salon_ids):
+    def bump():
+        now = time.time_ns()
+        cache.set_many(
+            {key.format(pk): now for key in key_formats for pk in salon_ids}, None
+        )
+    transaction.on_commit(bump)
+
+
+def salon_version(salon_id):
+    return _version(VERSION_KEY.format(salon_id))
+
+
+def bump_salon_version(*salon_ids):
+    """Invalidate cached data for ``salon_ids`` once the transaction commits."""
+    _bump((VERSION_KEY,), salon_ids)
+
+
+def catalog_version(salon_id):
+    return _version(CATALOG_VERSION_KEY.format(salon_id))
+
+
+def bump_catalog_version(*salon_ids):
+    """Invalidate the catalog cache for ``salon_ids`` (and everything else) on commit."""
+    from . import catalog  # imports this module
+
+    _bump((CATALOG_VERSION_KEY, VERSION_KEY), salon_ids)
+    transaction.on_commit(lambda: catalog.forget(*salon_ids))
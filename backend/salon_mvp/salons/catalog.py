@@ -0,0 +1,113 @@
+"""
+Process-local catalog cache.
+
+Salon hours and services almost never change but are read on every
+booking create and availability call. ``get_salon`` and
+``get_salon_service`` keep the model instances in a per-process LRU of
+CATALOG_CACHE_SIZE entries, each tagged with the salon's catalog version
+(salons/cache.py), which salons.signals replaces whenever the salon, one
+of its services or resources changes; a changed stamp reloads. The
+stamp lives in the shared cache (settings.CACHES), so a change made
+through one worker invalidates every other. Entries are also reloaded
+after CATALOG_CACHE_TTL seconds, which bounds staleness from changes that
+bypass the signals (queryset.update(), raw SQL) or a lost stamp write.
+
+The shared cache is a database table, so reading the stamp is a query.
+Each process keeps the stamp it read for CATALOG_VERSION_CHECK_INTERVAL
+seconds and a lookup inside that window costs nothing; a change made
+in this process forgets the stamp when it commits, so only other
+workers can see the old catalog, and only until their window runs out.
+
+The instances are shared between requests: read them, don't modify them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from salon_mvp.metrics import CACHE_REQUESTS
+from .cache import catalog_version
+from .models import Salon, Service
+
+_entries = OrderedDict()  # (model, pk) -> (version, expires, instance)
+_versions = {}  # salon id -> (stamp, recheck at)
+_lock = threading.Lock()
+
+
+def _version(salon_id):
+    now = time.monotonic()
+    with _lock:
+        known = _versions.get(salon_id)
+    if known is not None and known[1] > now:
+        return known[0]
+    version = catalog_version(salon_id)
+    with _lock:
+        _versions[salon_id] = (version, now + settings.CATALOG_VERSION_CHECK_INTERVAL)
+    return version
+
+
+def forget(*salon_ids):
+    """Re-read these salons' stamps on the next lookup (salons.cache calls it on a bump)."""
+    with _lock:
+        for salon_id in salon_ids:
+            _versions.pop(salon_id, None)
+
+
+def _get(key, version):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[0] != version or entry[1] < time.monotonic():
+            return None
+        _entries.move_to_end(key)
+        return entry[2]
+
+
+def _put(key, version, instance):
+    with _lock:
+        _entries[key] = (version, time.monotonic() + settings.CATALOG_CACHE_TTL, instance)
+        _entries.move_to_end(key)
+        while len(_entries) > settings.CATALOG_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def _lookup(model, pk, version, load):
+    key = (model, pk)
+    instance = _get(key, version)
+    CACHE_REQUESTS.labels("catalog", "miss" if instance is None else "hit").inc()
+    if instance is None:
+        instance = load()
+        _put(key, version, instance)
+    return instance
+
+
+def get_salon(salon_id, version=None):
+    """The Salon, from this process's cache if still current. Raises Salon.DoesNotExist."""
+    salon_id = int(salon_id)
+    if version is None:
+        version = _version(salon_id)
+    return _lookup(Salon, salon_id, version, lambda: Salon.objects.get(pk=salon_id))
+
+
+def get_salon_service(salon_id, service_id):
+    """
+    (salon, service) with one version check for both. Raises
+    Salon.DoesNotExist, or Service.DoesNotExist when the service isn't
+    the salon's.
+    """
+    salon_id, service_id = int(salon_id), int(service_id)
+    version = _version(salon_id)
+    salon = get_salon(salon_id, version)
+    service = _lookup(
+        Service, service_id, version,
+        lambda: Service.objects.filter(salon_id=salon_id).get(pk=service_id),
+    )
+    if service.salon_id != salon_id:  # cached under another salon's stamp
+        raise Service.DoesNotExist
+    return salon, service
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _versions.clear()
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salons', '0004_alter_salon_lat_alter_salon_lng'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salon',
+            name='capacity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('kind', models.CharField(choices=[('chair', 'Chair'), ('staff', 'Staff')], default='chair', max_length=20)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('salon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resources', to='salons.salon')),
+                ('services', models.ManyToManyField(blank=True, related_name='resources', to='salons.service')),
+            ],
+        ),
+    ]
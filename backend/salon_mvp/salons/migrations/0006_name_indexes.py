@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salons', '0005_salon_capacity_resource'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='salon',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
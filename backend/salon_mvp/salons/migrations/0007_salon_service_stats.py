@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salons', '0006_name_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salon',
+            name='has_home_service',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='salon',
+            name='max_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='salon',
+            name='min_duration',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='salon',
+            name='min_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='salon',
+            name='service_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='salon',
+            index=models.Index(fields=['open_time', 'close_time'], name='salon_hours_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salon',
+            index=models.Index(fields=['has_home_service', 'min_price'], name='salon_home_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salon',
+            index=models.Index(fields=['min_price'], name='salon_min_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salon',
+            index=models.Index(fields=['min_duration'], name='salon_min_duration_idx'),
+        ),
+    ]
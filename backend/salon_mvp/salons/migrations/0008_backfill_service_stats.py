@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count, Max, Min, Q
+
+
+def backfill(apps, schema_editor):
+    Salon = apps.get_model('salons', 'Salon')
+    Service = apps.get_model('salons', 'Service')
+    rows = Service.objects.values('salon_id').annotate(
+        service_count=Count('id'),
+        min_price=Min('price'),
+        max_price=Max('price'),
+        min_duration=Min('duration_minutes'),
+        home_services=Count('id', filter=Q(is_home_service=True)),
+    )
+    for row in rows:
+        salon_id = row.pop('salon_id')
+        row['has_home_service'] = bool(row.pop('home_services'))
+        Salon.objects.filter(pk=salon_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salons', '0007_salon_service_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
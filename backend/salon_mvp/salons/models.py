@@ -3,20 +3,38 @@ from django.conf import settings
 
 class Salon(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='salons')
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, db_index=True)
     address = models.TextField(blank=True)
     lat = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
     lng = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
     open_time = models.TimeField(null=True, blank=True)
     close_time = models.TimeField(null=True, blank=True)
+    # number of active resources (chairs/staff); 0 means the salon takes
+    # one booking at a time. Kept in sync by salons.signals.
+    capacity = models.PositiveIntegerField(default=0, editable=False)
+    # aggregates over the salon's services, denormalized so discovery
+    # filters need no join; kept in sync by salons.signals
+    service_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    min_duration = models.PositiveIntegerField(null=True, editable=False)
+    has_home_service = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['open_time', 'close_time'], name='salon_hours_idx'),
+            models.Index(fields=['has_home_service', 'min_price'], name='salon_home_price_idx'),
+            models.Index(fields=['min_price'], name='salon_min_price_idx'),
+            models.Index(fields=['min_duration'], name='salon_min_duration_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 class Service(models.Model):
     salon = models.ForeignKey(Salon, on_delete=models.CASCADE, related_name='services')
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, db_index=True)
     description = models.TextField(blank=True)
     duration_minutes = models.PositiveIntegerField(default=30)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -25,3 +43,22 @@ class Service(models.Model):
 
     def __str__(self):
         return f"{self.name} - {self.salon.name}"
+
+
+class Resource(models.Model):
+    """A chair or staff member that one booking occupies at a time."""
+    KIND_CHOICES = (
+        ('chair', 'Chair'),
+        ('staff', 'Staff'),
+    )
+
+    salon = models.ForeignKey(Salon, on_delete=models.CASCADE, related_name='resources')
+    name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='chair')
+    # services this resource can do; none selected means all of them
+    services = models.ManyToManyField(Service, blank=True, related_name='resources')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.salon.name}"
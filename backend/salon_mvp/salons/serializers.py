@@ -1,14 +1,26 @@
 from rest_framework import serializers
-from .models import Salon, Service
+from .models import Resource, Salon, Service
 
 class SalonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Salon
         fields = '__all__'
-        read_only_fields = ('owner', 'created_at')
+        read_only_fields = ('owner', 'capacity', 'created_at')
 
 class ServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
         fields = '__all__'
         read_only_fields = ('salon', 'created_at')
+
+class ResourceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Resource
+        fields = '__all__'
+        read_only_fields = ('salon', 'created_at')
+
+    def validate_services(self, services):
+        salon_id = self.instance.salon_id if self.instance else self.initial_data.get('salon')
+        if any(str(service.salon_id) != str(salon_id) for service in services):
+            raise serializers.ValidationError("Services must belong to the resource's salon")
+        return services
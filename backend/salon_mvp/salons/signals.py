@@ -0,0 +1,45 @@
+from django.db.models import Count, Max, Min, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Resource, Salon, Service
+
+
+@receiver([post_save, post_delete], sender=Salon)
+def salon_changed(sender, instance, **kwargs):
+    bump_catalog_version(instance.pk)
+
+
+def refresh_service_stats(salon_id):
+    """Recompute a salon's denormalized service aggregates: one aggregate, one UPDATE."""
+    stats = Service.objects.filter(salon_id=salon_id).aggregate(
+        service_count=Count("id"),
+        min_price=Min("price"),
+        max_price=Max("price"),
+        min_duration=Min("duration_minutes"),
+        home_services=Count("id", filter=Q(is_home_service=True)),
+    )
+    stats["has_home_service"] = bool(stats.pop("home_services"))
+    Salon.objects.filter(pk=salon_id).update(**stats)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def service_changed(sender, instance, **kwargs):
+    refresh_service_stats(instance.salon_id)
+    bump_catalog_version(instance.salon_id)
+
+
+@receiver([post_save, post_delete], sender=Resource)
+def resource_changed(sender, instance, **kwargs):
+    Salon.objects.filter(pk=instance.salon_id).update(
+        capacity=Resource.objects.filter(salon_id=instance.salon_id, is_active=True).count()
+    )
+    bump_catalog_version(instance.salon_id)
+
+
+@receiver(m2m_changed, sender=Resource.services.through)
+def resource_services_changed(sender, instance, action, **kwargs):
+    # sent from either side: resource.services.add() or service.resources.add()
+    if action.startswith("post_"):
+        bump_catalog_version(instance.salon_id)
@@ -1,3 +1,196 @@
-from django.test import TestCase
+from datetime import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import override_settings
+
+from bookings.tests import BookingTestCase
+from users.models import User
+from . import catalog
+from .cache import CATALOG_VERSION_KEY, VERSION_KEY, catalog_version
+from .models import Resource, Salon, Service
+from .views import open_at
+
+
+class ResourceViewTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chair = Resource.objects.create(salon=self.salon, name="Chair 1")
+        self.url = f"/api/salons/resources/{self.chair.pk}/"
+
+    def test_owner_can_update_and_delete(self):
+        client = self.client_for(self.owner)
+        response = client.patch(self.url, {"name": "Window chair"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.delete(self.url).status_code, 204)
+        self.assertEqual(Salon.objects.get(pk=self.salon.pk).capacity, 0)
+
+    def test_others_cannot_change_it(self):
+        other_owner = User.objects.create_user("other", password="x", role="salon_owner")
+        for user in (self.customer, other_owner):
+            client = self.client_for(user)
+            with self.subTest(role=user.username):
+                response = client.patch(self.url, {"is_active": False}, format="json")
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(client.delete(self.url).status_code, 404)
+
+        self.chair.refresh_from_db()
+        self.assertTrue(self.chair.is_active)
+        self.assertEqual(Salon.objects.get(pk=self.salon.pk).capacity, 1)
+
+
+class CatalogTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        catalog.clear()
+
+    def test_cached_until_the_salon_changes(self):
+        catalog.get_salon_service(self.salon.pk, self.service.pk)
+        with self.assertNumQueries(0):  # not even the version stamp
+            _, service = catalog.get_salon_service(self.salon.pk, self.service.pk)
+        self.assertEqual(str(service.price), "10.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = "12.00"
+            self.service.save()
+
+        _, service = catalog.get_salon_service(self.salon.pk, self.service.pk)
+        self.assertEqual(str(service.price), "12.00")
+
+    @override_settings(CATALOG_VERSION_CHECK_INTERVAL=5)
+    def test_other_workers_changes_show_after_the_check_interval(self):
+        catalog.get_salon_service(self.salon.pk, self.service.pk)
+        # another process changed the service and replaced the stamp
+        Service.objects.filter(pk=self.service.pk).update(price="12.00")
+        cache.set(CATALOG_VERSION_KEY.format(self.salon.pk), 1, None)
+
+        _, service = catalog.get_salon_service(self.salon.pk, self.service.pk)
+        self.assertEqual(str(service.price), "10.00")
+
+        later = catalog.time.monotonic() + 6
+        with mock.patch.object(catalog.time, "monotonic", return_value=later), \
+                self.assertNumQueries(3):  # the stamp, then salon and service again
+            _, service = catalog.get_salon_service(self.salon.pk, self.service.pk)
+        self.assertEqual(str(service.price), "12.00")
+
+    def test_other_salons_service_is_refused(self):
+        other = Salon.objects.create(owner=self.owner, name="Other")
+        with self.assertRaises(Service.DoesNotExist):
+            catalog.get_salon_service(other.pk, self.service.pk)
+        catalog.get_salon_service(self.salon.pk, self.service.pk)
+        with self.assertRaises(Service.DoesNotExist):
+            catalog.get_salon_service(other.pk, self.service.pk)
+
+    def test_either_side_of_resource_services_invalidates(self):
+        chair = Resource.objects.create(salon=self.salon, name="Chair")
+        for change in (lambda: chair.services.add(self.service),
+                       lambda: self.service.resources.remove(chair),
+                       lambda: self.service.resources.set([chair])):
+            before = catalog_version(self.salon.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertNotEqual(catalog_version(self.salon.pk), before)
+
+    @override_settings(CATALOG_CACHE_TTL=0)
+    def test_changes_without_signals_expire(self):
+        catalog.get_salon_service(self.salon.pk, self.service.pk)
+        Service.objects.filter(pk=self.service.pk).update(duration_minutes=45)
+
+        _, service = catalog.get_salon_service(self.salon.pk, self.service.pk)
+        self.assertEqual(service.duration_minutes, 45)
+
+
+class SalonPageTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.customer)
+        self.url = f"/api/salons/salons/{self.salon.pk}/page/?date={self.day.isoformat()}"
+
+    def get(self, etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get(self.url, headers=headers)
+
+    def free(self, response, service=0):
+        slots = response.json()["services"][service]["slots"]
+        return [slot["start"] for slot in slots if slot["available"]]
+
+    def test_etag_gives_304_until_something_changes(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.get(first["ETag"]).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_booking(10)
+        fresh = self.get(first["ETag"])
+
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh["ETag"], first["ETag"])
+        self.assertNotIn(self.free(first)[0], self.free(fresh))
+
+    def test_service_change_shows_at_once(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = "15.00"
+            self.service.save()
+        self.assertEqual(self.get().json()["services"][0]["price"], "15.00")
+
+    def test_unknown_salon_is_404_without_a_cache_entry(self):
+        response = self.client.get("/api/salons/salons/999999/page/")
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(cache.get(VERSION_KEY.format(999999)))
+
+
+class DiscoveryTests(BookingTestCase):
+    url = "/api/salons/salons/"
+
+    def setUp(self):
+        super().setUp()
+        # the base salon: 10-18, one 30-minute cut at 10.00
+        self.late = Salon.objects.create(
+            owner=self.owner, name="Late", open_time=time(22), close_time=time(6)
+        )
+        Service.objects.create(salon=self.late, name="Colour", duration_minutes=90, price="40.00")
+        Service.objects.create(
+            salon=self.late, name="Home colour", duration_minutes=120, price="60.00",
+            is_home_service=True,
+        )
+        self.empty = Salon.objects.create(owner=self.owner, name="Empty")
+
+    def names(self, **params):
+        response = self.client_for(self.customer).get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [salon["name"] for salon in response.json()]
+
+    def test_aggregates_follow_the_services(self):
+        self.late.refresh_from_db()
+        self.assertEqual(
+            (self.late.service_count, str(self.late.min_price), str(self.late.max_price),
+             self.late.min_duration, self.late.has_home_service),
+            (2, "40.00", "60.00", 90, True),
+        )
+        self.late.services.get(is_home_service=True).delete()
+        self.late.refresh_from_db()
+        self.assertEqual((self.late.service_count, self.late.has_home_service), (1, False))
+
+    def test_filters(self):
+        self.assertEqual(self.names(), ["Salon", "Late", "Empty"])
+        self.assertEqual(self.names(home_service="true"), ["Late"])
+        # price ranges overlap the requested one
+        self.assertEqual(self.names(min_price="50"), ["Late"])
+        self.assertEqual(self.names(max_price="40"), ["Salon", "Late"])
+        self.assertEqual(self.names(min_price="11", max_price="39"), [])
+        self.assertEqual(self.names(max_duration="60"), ["Salon"])
+
+    def test_open_at_handles_overnight_and_default_hours(self):
+        def open_names(hour):
+            return sorted(Salon.objects.filter(open_at(time(hour))).values_list("name", flat=True))
+
+        self.assertEqual(open_names(12), ["Empty", "Salon"])
+        self.assertEqual(open_names(23), ["Late"])
+        self.assertEqual(open_names(3), ["Late"])
+
+    def test_bad_values_and_paging(self):
+        response = self.client_for(self.customer).get(self.url, {"min_price": "cheap"})
+        self.assertEqual(response.status_code, 400)
+        page = self.client_for(self.customer).get(self.url, {"limit": 1, "offset": 1}).json()
+        self.assertEqual((page["count"], [s["name"] for s in page["results"]]), (3, ["Late"]))
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SalonViewSet, ServiceViewSet
+from .views import ResourceViewSet, SalonViewSet, ServiceViewSet
 
 router = DefaultRouter()
 router.register(r'salons', SalonViewSet, basename='salons')
 router.register(r'services', ServiceViewSet, basename='services')
+router.register(r'resources', ResourceViewSet, basename='resources')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,7 +1,53 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
 from rest_framework import viewsets, permissions
-from rest_framework.exceptions import PermissionDenied
-from .models import Salon, Service
-from .serializers import SalonSerializer, ServiceSerializer
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from bookings.availability import (
+    DEFAULT_CLOSE, DEFAULT_OPEN, busy_for, day_bookings, day_window, slot_list,
+)
+from salon_mvp.metrics import CACHE_REQUESTS
+from .cache import salon_version
+from .models import Resource, Salon, Service
+from .serializers import ResourceSerializer, SalonSerializer, ServiceSerializer
+
+SALON_PAGE_TTL = 300
+
+
+class SalonPagination(LimitOffsetPagination):
+    # opt-in: without ?limit= the list stays a plain array
+    default_limit = None
+    max_limit = 100
+
+
+def open_at(moment):
+    """Salons open at local wall-clock time ``moment``, including overnight hours."""
+    day_hours = Q(close_time__gt=F("open_time")) & Q(open_time__lte=moment, close_time__gt=moment)
+    overnight = Q(close_time__lte=F("open_time")) & (
+        Q(open_time__lte=moment) | Q(close_time__gt=moment)
+    )
+    unset = Q(open_time__isnull=True) | Q(close_time__isnull=True)
+    if DEFAULT_OPEN <= moment < DEFAULT_CLOSE:
+        return day_hours | overnight | unset
+    return day_hours | overnight
+
+
+def _param(params, name, cast):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return cast(value)
+    except (ValueError, InvalidOperation):
+        raise ValidationError({name: "Invalid value"})
 
 # -------------------------
 # Salon CRUD
@@ -9,6 +55,7 @@ from .serializers import SalonSerializer, ServiceSerializer
 class SalonViewSet(viewsets.ModelViewSet):
     serializer_class = SalonSerializer
     queryset = Salon.objects.all()
+    pagination_class = SalonPagination
 
     def perform_create(self, serializer):
         if self.request.user.role != "salon_owner":
@@ -17,16 +64,108 @@ class SalonViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        if self.action == "page":
+            # public read; services come in the same round of queries
+            return Salon.objects.prefetch_related("services", "resources__services")
         if user.is_authenticated and user.role == "salon_owner":
             # Salon owner sees only their salons
-            return Salon.objects.filter(owner=user)
-        return Salon.objects.all()  # Customers see all salons
+            qs = Salon.objects.filter(owner=user)
+        else:
+            qs = Salon.objects.all()  # Customers see all salons
+        if self.action == "list":
+            qs = self.filter_discovery(qs).order_by("id")
+        return qs
+
+    def filter_discovery(self, qs):
+        """
+        ?open_now=true&home_service=true&min_price=&max_price=&max_duration=
+        Every filter reads the salon row itself (hours and the
+        denormalized service aggregates), so there are no joins.
+        Prices match when the salon's price range overlaps the requested one.
+        """
+        params = self.request.query_params
+        if params.get("open_now") == "true":
+            qs = qs.filter(open_at(timezone.localtime().time()))
+        if params.get("home_service") == "true":
+            qs = qs.filter(has_home_service=True)
+        min_price = _param(params, "min_price", Decimal)
+        if min_price is not None:
+            qs = qs.filter(max_price__gte=min_price)
+        max_price = _param(params, "max_price", Decimal)
+        if max_price is not None:
+            qs = qs.filter(min_price__lte=max_price)
+        max_duration = _param(params, "max_duration", int)
+        if max_duration is not None:
+            qs = qs.filter(min_duration__lte=max_duration)
+        return qs
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
             return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
 
+    @action(detail=True, methods=["get"])
+    def page(self, request, pk=None):
+        """
+        GET /api/salons/salons/<id>/page/?date=YYYY-MM-DD (default today)
+        Salon, its services and each service's slots for the day in one
+        response: salon + services in two queries, the day's bookings in
+        one, all availability from that single booking list.
+
+        Cached under the salon's version stamp and sent with an ETag, so a
+        repeat visit costs an existence check and a cache lookup (or a 304)
+        until something changes.
+        """
+        date_str = request.query_params.get("date")
+        try:
+            date = (
+                datetime.strptime(date_str, "%Y-%m-%d").date()
+                if date_str
+                else timezone.localdate()
+            )
+        except ValueError:
+            return Response({"detail": "Invalid date format"}, status=400)
+
+        # 404 before touching the cache, so made-up ids can't fill it
+        pk = get_object_or_404(Salon.objects.only("pk"), pk=pk).pk
+        version = salon_version(pk)
+        etag = f'"{pk}-{date.isoformat()}-{version}"'
+        if request.headers.get("If-None-Match") == etag:
+            CACHE_REQUESTS.labels("salon_page", "not_modified").inc()
+            return Response(status=304, headers={"ETag": etag})
+
+        key = f"salon-page:{pk}:{date.isoformat()}:{version}"
+        data = cache.get(key)
+        CACHE_REQUESTS.labels("salon_page", "miss" if data is None else "hit").inc()
+        if data is None:
+            salon = self.get_object()
+            bookings = day_bookings(salon, date)
+            open_dt, close_dt = day_window(salon, date)
+            resources = [r for r in salon.resources.all() if r.is_active]
+            services = []
+            for service in salon.services.all():
+                eligible = None
+                if salon.capacity:
+                    eligible = {
+                        r.pk for r in resources
+                        if not r.services.all() or service in r.services.all()
+                    }
+                busy, capacity = busy_for(bookings, eligible)
+                services.append({
+                    **ServiceSerializer(service).data,
+                    "slots": slot_list(
+                        open_dt, close_dt, service.duration_minutes, busy, capacity
+                    ),
+                })
+            data = {
+                "date": date.isoformat(),
+                "salon": SalonSerializer(salon).data,
+                "services": services,
+            }
+            cache.set(key, data, SALON_PAGE_TTL)
+
+        return Response(data, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
 # -------------------------
 # Service CRUD
 # -------------------------
@@ -71,3 +210,63 @@ class ServiceViewSet(viewsets.ModelViewSet):
         if self.action in ["create", "update", "partial_update", "destroy"]:
             return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
+
+# -------------------------
+# Resource (chair/staff) CRUD
+# -------------------------
+class ResourceViewSet(viewsets.ModelViewSet):
+    serializer_class = ResourceSerializer
+    queryset = Resource.objects.all()
+    WRITE_ACTIONS = ("update", "partial_update", "destroy")
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = Resource.objects.prefetch_related("services")
+
+        if user.is_authenticated and user.role == "salon_owner":
+            qs = qs.filter(salon__owner=user)
+        elif self.action in self.WRITE_ACTIONS:
+            # only the salon's owner changes its chairs and staff
+            return qs.none()
+
+        if self.action == "list":
+            salon_id = self.request.query_params.get("salon")
+            if salon_id:
+                qs = qs.filter(salon_id=salon_id)
+            else:
+                qs = qs.none()
+
+        return qs
+
+    def perform_create(self, serializer):
+        salon_id = self.request.data.get("salon")
+        if not salon_id:
+            raise PermissionDenied("Salon ID is required")
+
+        try:
+            salon = Salon.objects.get(pk=salon_id)
+        except Salon.DoesNotExist:
+            raise PermissionDenied("Salon does not exist")
+
+        if salon.owner != self.request.user:
+            raise PermissionDenied("You do not own this salon")
+
+        serializer.save(salon=salon)
+
+    def _check_owner(self, resource):
+        user = self.request.user
+        if user.role != "salon_owner" or resource.salon.owner_id != user.pk:
+            raise PermissionDenied("You do not own this salon")
+
+    def perform_update(self, serializer):
+        self._check_owner(serializer.instance)
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        self._check_owner(instance)
+        instance.delete()
+
+    def get_permissions(self):
+        if self.action in ["create", "update", "partial_update", "destroy"]:
+            return [permissions.IsAuthenticated()]
+        return [permissions.AllowAny()]